@@ -0,0 +1,145 @@
+"""Circuit breaker and adaptive timeouts for Home Assistant requests."""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Fails fast while Home Assistant is unreachable.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    requests are rejected immediately. Once ``reset_timeout`` seconds have
+    passed, up to ``half_open_max_calls`` probe requests are let through; a
+    successful probe closes the circuit, a failed one re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1):
+        """Initialize the breaker in the closed state."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self):
+        """Current state, moving from open to half-open once the reset timeout expires."""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+
+    def allow_request(self):
+        """Check whether a request may be sent now."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """Record a successful request."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Home Assistant reachable again - closing circuit")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def release(self):
+        """Give back a half-open probe slot taken by a request that ended without an outcome."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self):
+        """Record a failed request, opening the circuit when the threshold is reached."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning(
+                    f"Home Assistant unavailable after {self._failures} failures - "
+                    f"failing fast for {self.reset_timeout}s"
+                )
+
+    def get_stats(self):
+        """Get breaker state and counters."""
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+class AdaptiveTimeout:
+    """Read timeout that follows measured request latency.
+
+    Uses the TCP retransmission-timeout estimator (smoothed latency plus four
+    times its mean deviation), clamped to [minimum, maximum]. A timeout doubles
+    the estimate so a slow-but-alive server is not cut off repeatedly.
+    """
+
+    def __init__(self, minimum=2.0, maximum=10.0, alpha=0.125, beta=0.25):
+        """Initialize with the maximum timeout until latency has been measured."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.alpha = alpha
+        self.beta = beta
+        self._srtt = None
+        self._rttvar = None
+        self._value = maximum
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        """Current timeout in seconds."""
+        return self._value
+
+    def observe(self, latency):
+        """Update the estimate with a measured request latency in seconds."""
+        with self._lock:
+            if self._srtt is None:
+                self._srtt = latency
+                self._rttvar = latency / 2
+            else:
+                self._rttvar = (1 - self.beta) * self._rttvar + self.beta * abs(self._srtt - latency)
+                self._srtt = (1 - self.alpha) * self._srtt + self.alpha * latency
+            self._value = min(self.maximum, max(self.minimum, self._srtt + 4 * self._rttvar))
+
+    def observe_timeout(self):
+        """Back off after a request timed out."""
+        with self._lock:
+            self._value = min(self.maximum, self._value * 2)
+            if self._srtt is not None:
+                self._srtt = min(self.maximum, self._srtt * 2)
+
+    def get_stats(self):
+        """Get the current estimate."""
+        return {"timeout": self._value, "smoothed_latency": self._srtt}
@@ -0,0 +1,206 @@
+"""Forecasts parsed once into columns and cached until their sensor changes."""
+
+import logging
+import math
+import statistics
+import threading
+from array import array
+from datetime import datetime
+
+from metrics import registry
+from slots import SlotFinder
+
+logger = logging.getLogger(__name__)
+
+FORECAST_LOOKUPS = registry.counter("sec_forecast_cache_total", "Parsed forecast cache lookups", ("result",))
+
+# How a forecast's value varies between its points
+STEP = "step"  # held until the next point, like tariff prices
+LINEAR = "linear"  # interpolated between points, like sampled solar power
+
+
+class ParsedForecast:
+    """A forecast's points as columns: epoch seconds, values and normalized ISO start times.
+
+    Points without a parseable timestamp or value are skipped and the rest
+    are put in time order. ``points`` is the raw list the forecast was parsed
+    from, for the forecast API.
+    """
+
+    def __init__(self, points, value_key, last_updated=None, interpolation=STEP):
+        """Parse a list of {"timestamp": ISO time, value_key: number} points."""
+        self.points = points
+        self.value_key = value_key
+        self.last_updated = last_updated
+        self.interpolation = interpolation
+        self.skipped = 0
+        parsed = []
+        for point in points:
+            try:
+                when = datetime.fromisoformat(point["timestamp"])
+                parsed.append((when.timestamp(), float(point[value_key]), when))
+            except (KeyError, TypeError, ValueError):
+                self.skipped += 1
+        if self.skipped:
+            logger.warning(f"Skipped {self.skipped} malformed {value_key} forecast points")
+        parsed.sort(key=lambda item: item[0])
+        self.times = array("d", [item[0] for item in parsed])
+        self.values = array("d", [item[1] for item in parsed])
+        self.labels = [item[2].isoformat() for item in parsed]
+        self.tz = parsed[0][2].tzinfo if parsed else None
+        self._grids = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def label(self, i):
+        """ISO start time of point i."""
+        return self.labels[i]
+
+    def on_grid(self, step):
+        """This forecast resampled onto a uniform grid of step seconds, cached per step."""
+        grid = self._grids.get(step)
+        if grid is None:
+            grid = self._grids[step] = ForecastGrid.resample(self, step)
+        return grid
+
+
+class ForecastGrid:
+    """A forecast resampled onto uniform cells of ``step`` seconds.
+
+    Each cell holds the forecast's mean over the cell: the integral of the
+    value, held between points (STEP) or interpolated between them (LINEAR,
+    which keeps solar energy), divided by the time covered. The last point
+    holds for the forecast's typical spacing, so windows are measured in
+    real time whatever the source resolution.
+    """
+
+    def __init__(self, start, step, values, tz=None):
+        """Initialize from the first cell's epoch start, the step and the cell means."""
+        self.start = start
+        self.step = step
+        self.values = values
+        self.tz = tz
+        self._finder = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def label(self, i):
+        """ISO start time of cell i, in the source forecast's timezone."""
+        return datetime.fromtimestamp(self.start + i * self.step, self.tz).isoformat()
+
+    def cells(self, minutes):
+        """Number of cells covering a duration in minutes (at least one)."""
+        return max(1, math.ceil(minutes * 60 / self.step))
+
+    @property
+    def end(self):
+        """Epoch end of the last cell."""
+        return self.start + len(self.values) * self.step
+
+    def clip(self, start, end):
+        """The cells from start to end (epoch seconds, on this grid's cell boundaries) as a new grid."""
+        first = max(0, int((start - self.start) // self.step))
+        last = max(first, int((end - self.start) // self.step))
+        return ForecastGrid(self.start + first * self.step, self.step, self.values[first:last], self.tz)
+
+    @property
+    def finder(self):
+        """SlotFinder over the cell means, offering only runs that end on the grid, built on first use."""
+        if self._finder is None:
+            self._finder = SlotFinder(self.values, full_windows=True)
+        return self._finder
+
+    @classmethod
+    def resample(cls, forecast, step):
+        """Resample a ParsedForecast onto cells of step seconds, aligned to multiples of step."""
+        times, values = forecast.times, forecast.values
+        if not times:
+            return cls(0.0, step, array("d"), forecast.tz)
+        spacing = statistics.median(b - a for a, b in zip(times, times[1:])) if len(times) > 1 else step
+        # Segment k runs from point k to the next point; the last one holds its value for one spacing
+        bounds = list(times) + [times[-1] + spacing]
+        linear = forecast.interpolation == LINEAR
+
+        def mean(k, a, b):
+            """Mean value of segment k over [a, b)."""
+            if not linear or k + 1 == len(values):
+                return values[k]
+            fraction = ((a + b) / 2 - bounds[k]) / (bounds[k + 1] - bounds[k])
+            return values[k] + (values[k + 1] - values[k]) * fraction
+
+        start = math.floor(times[0] / step) * step
+        cells = array("d")
+        k = 0
+        cell = start
+        while cell < bounds[-1]:
+            # Sum the pieces of every segment overlapping [cell, cell + step); one piece is taken as is
+            pieces = []
+            while k < len(values):
+                a, b = max(cell, bounds[k]), min(cell + step, bounds[k + 1])
+                if b > a:
+                    pieces.append((mean(k, a, b), b - a))
+                if bounds[k + 1] > cell + step:
+                    break
+                k += 1
+            if len(pieces) == 1:
+                cells.append(pieces[0][0])
+            else:
+                cells.append(sum(value * width for value, width in pieces) / sum(width for _, width in pieces))
+            cell += step
+        return cls(start, step, cells, forecast.tz)
+
+
+class ForecastCache:
+    """Parsed forecasts per sensor, reparsed only when the sensor's ``last_updated`` changes.
+
+    States without ``last_updated`` cannot be told apart, so they are parsed
+    on every lookup.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache."""
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, entity_id, state, value_key, interpolation=STEP):
+        """Return the ParsedForecast for a sensor state's ``forecast`` attribute, or None if it has none."""
+        points = ((state or {}).get("attributes") or {}).get("forecast")
+        if not points:
+            return None
+        last_updated = state.get("last_updated")
+        key = (entity_id, value_key)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and last_updated is not None and cached.last_updated == last_updated:
+                self.hits += 1
+                FORECAST_LOOKUPS.inc(result="hit")
+                return cached
+            self.misses += 1
+        FORECAST_LOOKUPS.inc(result="miss")
+
+        parsed = ParsedForecast(points, value_key, last_updated, interpolation)
+        with self._lock:
+            self._entries[key] = parsed
+        return parsed
+
+    def invalidate(self, entity_id=None):
+        """Drop the cached forecasts of one sensor, or of all of them."""
+        with self._lock:
+            for key in [key for key in self._entries if entity_id is None or key[0] == entity_id]:
+                del self._entries[key]
+
+    def get_stats(self):
+        """Return hit/miss counts and the forecasts held."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "forecasts": {
+                    entity_id: {"points": len(parsed), "last_updated": parsed.last_updated}
+                    for (entity_id, _), parsed in self._entries.items()
+                },
+            }
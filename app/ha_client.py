@@ -1,63 +1,353 @@
 """Home Assistant API client."""
 
+import asyncio
 import logging
+import time
 
 import requests
+from circuit_breaker import AdaptiveTimeout, CircuitBreaker
+from device_index import DeviceIndex, iter_json_array
+from metrics import registry
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_BASE_URL = "http://supervisor/core/api"
+
+
+class HomeAssistantUnavailable(Exception):
+    """Raised when Home Assistant cannot be reached (as opposed to a real reading)."""
+
+
+HA_REQUEST_SECONDS = registry.histogram(
+    "sec_ha_request_duration_seconds", "Home Assistant API request latency", ("endpoint",)
+)
+HA_REQUEST_ERRORS = registry.counter(
+    "sec_ha_request_errors_total", "Home Assistant API requests that failed", ("endpoint",)
+)
+
+
+def endpoint_name(method, path):
+    """Name the HA API endpoint a request targets, for metrics labels."""
+    if path.startswith("/services/"):
+        return "call_service"
+    if path == "/states":
+        return "get_states"
+    if path.startswith("/states/"):
+        return "get_state" if method == "GET" else "set_state"
+    return path.strip("/") or "api"
+
+
+def sensor_value_from_state(state, entity_id=None):
+    """Convert an entity state object to a float sensor value."""
+    if state:
+        try:
+            return float(state.get("state", 0))
+        except (ValueError, TypeError):
+            logger.warning(f"Could not convert sensor value to float: {entity_id or state.get('entity_id')}")
+            return 0.0
+    return 0.0
+
+
+class StateSnapshot:
+    """Point-in-time view of Home Assistant states built from one bulk read.
+
+    Lets a whole automation cycle resolve every sensor and device lookup
+    against the same consistent state with a single ``GET /states``.
+    """
+
+    def __init__(self, states):
+        """Index the given list of state objects by entity_id."""
+        self.states = {state["entity_id"]: state for state in states if state.get("entity_id")}
+
+    @classmethod
+    def from_client(cls, ha_client):
+        """Take a snapshot using the client's bulk state read.
+
+        Raises HomeAssistantUnavailable if the read fails.
+        """
+        return cls(ha_client.get_states(strict=True))
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.states
+
+    def get_state(self, entity_id):
+        """Get state of a specific entity."""
+        return self.states.get(entity_id)
+
+    def get_sensor_value(self, entity_id):
+        """Get numeric value from a sensor."""
+        return sensor_value_from_state(self.states.get(entity_id), entity_id)
+
+
+class ServiceCallBatch:
+    """Collects device actions and sends one service call per domain and service.
+
+    Home Assistant accepts a list of ``entity_id``s, so switching 20 switches
+    off becomes a single ``switch.turn_off`` call. Results are reported per
+    entity; every entity in a group shares the outcome of its group's call.
+    """
+
+    def __init__(self):
+        """Initialize an empty batch."""
+        self._groups = {}
+
+    def __len__(self):
+        return sum(len(entity_ids) for entity_ids in self._groups.values())
+
+    def add(self, entity_id, service):
+        """Queue a service call for an entity."""
+        domain = entity_id.split(".")[0]
+        entity_ids = self._groups.setdefault((domain, service), [])
+        if entity_id not in entity_ids:
+            entity_ids.append(entity_id)
+
+    def turn_on(self, entity_id):
+        """Queue turning on a device."""
+        self.add(entity_id, "turn_on")
+
+    def turn_off(self, entity_id):
+        """Queue turning off a device."""
+        self.add(entity_id, "turn_off")
+
+    def groups(self):
+        """Get queued entity_ids keyed by (domain, service)."""
+        return {key: list(entity_ids) for key, entity_ids in self._groups.items()}
+
+    @staticmethod
+    def _target(entity_ids):
+        return entity_ids[0] if len(entity_ids) == 1 else list(entity_ids)
+
+    def execute(self, ha_client):
+        """Send the queued calls with a synchronous client; returns {entity_id: success}."""
+        results = {}
+        for (domain, service), entity_ids in self._groups.items():
+            success = ha_client.call_service(domain, service, self._target(entity_ids))
+            results.update(dict.fromkeys(entity_ids, success))
+        return results
+
+    async def execute_async(self, async_client):
+        """Send the queued calls concurrently with an async client; returns {entity_id: success}."""
+        groups = list(self._groups.items())
+        outcomes = await asyncio.gather(
+            *(
+                async_client.call_service(domain, service, self._target(entity_ids))
+                for (domain, service), entity_ids in groups
+            )
+        )
+        results = {}
+        for ((_, _), entity_ids), success in zip(groups, outcomes):
+            results.update(dict.fromkeys(entity_ids, success))
+        return results
+
 
 class HomeAssistantClient:
     """Client for communicating with Home Assistant API."""
 
-    def __init__(self, token):
-        """Initialize the client."""
+    def __init__(
+        self,
+        token,
+        base_url=None,
+        pool_size=10,
+        max_retries=2,
+        backoff_factor=0.2,
+        connect_timeout=3.05,
+        read_timeout=10,
+        breaker=None,
+        adaptive_timeout=None,
+        state_cache=None,
+        device_index_max_age=300,
+    ):
+        """Initialize the client.
+
+        All requests share one pooled keep-alive session, so an automation cycle
+        reuses a handful of TCP connections instead of opening one per call.
+        ``breaker`` and ``adaptive_timeout`` may be shared with other clients
+        talking to the same HA instance. ``state_cache`` is an optional TTLCache
+        for single-entity reads. The device list is rebuilt from ``/states`` at
+        most every ``device_index_max_age`` seconds.
+        """
         self.token = token
-        self.base_url = "http://supervisor/core/api"
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
         self.headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.adaptive_timeout = adaptive_timeout or AdaptiveTimeout(maximum=read_timeout)
+        self.state_cache = state_cache
+        self.device_index = DeviceIndex(max_age=device_index_max_age)
+        self.session = self._create_session(pool_size, max_retries, backoff_factor)
+
+    def _create_session(self, pool_size, max_retries, backoff_factor):
+        """Create a pooled session with bounded retries."""
+        # Service calls include automation.trigger, script.turn_on and button presses, which are
+        # not idempotent: a POST is only retried when it never reached HA (connect errors).
+        # Read and status retries are limited to GETs by allowed_methods.
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        """Close pooled connections."""
+        self.session.close()
 
-    def get_states(self):
-        """Get all states from Home Assistant."""
+    def is_available(self):
+        """Whether Home Assistant is currently considered reachable."""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def _request(self, method, path, **kwargs):
+        """Send a request through the circuit breaker with an adaptive read timeout.
+
+        Service calls only return once the service has finished, so they keep
+        the configured read timeout and are not fed to the latency estimate.
+        Raises HomeAssistantUnavailable when the circuit is open, on connection
+        errors and timeouts, and on 5xx responses.
+        """
+        if not self.breaker.allow_request():
+            raise HomeAssistantUnavailable("circuit open - Home Assistant recently unreachable")
+
+        send = self.session.get if method == "GET" else self.session.post
+        adaptive = not path.startswith("/services/")
+        timeout = (self.timeout[0], self.adaptive_timeout.value if adaptive else self.timeout[1])
+        endpoint = endpoint_name(method, path)
+        start = time.monotonic()
         try:
-            response = requests.get(f"{self.base_url}/states", headers=self.headers, timeout=10)
+            response = send(f"{self.base_url}{path}", timeout=timeout, **kwargs)
             response.raise_for_status()
-            return response.json()
+        except requests.HTTPError as e:
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            if e.response is not None and e.response.status_code >= 500:
+                self.breaker.record_failure()
+                raise HomeAssistantUnavailable(str(e)) from e
+            self.breaker.record_success()
+            raise
+        except requests.Timeout as e:
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            if adaptive:
+                self.adaptive_timeout.observe_timeout()
+            self.breaker.record_failure()
+            raise HomeAssistantUnavailable(str(e)) from e
+        except requests.RequestException as e:
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            self.breaker.record_failure()
+            raise HomeAssistantUnavailable(str(e)) from e
+        except BaseException:
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            self.breaker.release()
+            raise
+        finally:
+            HA_REQUEST_SECONDS.observe(time.monotonic() - start, endpoint=endpoint)
+
+        self.breaker.record_success()
+        if adaptive:
+            self.adaptive_timeout.observe(time.monotonic() - start)
+        return response
+
+    def get_states(self, strict=False):
+        """Get all states from Home Assistant.
+
+        With ``strict`` any failed read - an unreachable HA, a rejected token or
+        an unreadable body - raises HomeAssistantUnavailable instead of
+        returning an empty list.
+        """
+        try:
+            return self._request("GET", "/states").json()
+        except HomeAssistantUnavailable as e:
+            if strict:
+                raise
+            logger.error(f"Error getting states: {e}")
+            return []
         except Exception as e:
+            if strict:
+                raise HomeAssistantUnavailable(f"states read failed: {e}") from e
             logger.error(f"Error getting states: {e}")
             return []
 
-    def get_state(self, entity_id):
-        """Get state of a specific entity."""
+    def get_state(self, entity_id, strict=False):
+        """Get state of a specific entity.
+
+        Served from the state cache when one is configured. With ``strict`` a
+        failed read raises HomeAssistantUnavailable instead of returning None;
+        an entity HA does not know still returns None.
+        """
         try:
-            response = requests.get(f"{self.base_url}/states/{entity_id}", headers=self.headers, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            if self.state_cache is not None:
+                return self.state_cache.get_or_load(entity_id, lambda: self._fetch_state(entity_id))
+            return self._fetch_state(entity_id)
+        except HomeAssistantUnavailable as e:
+            if strict:
+                raise
+            logger.error(f"Error getting state for {entity_id}: {e}")
+            return None
         except Exception as e:
+            not_found = isinstance(e, requests.HTTPError) and getattr(e.response, "status_code", None) == 404
+            if strict and not not_found:
+                raise HomeAssistantUnavailable(f"state read for {entity_id} failed: {e}") from e
             logger.error(f"Error getting state for {entity_id}: {e}")
             return None
 
-    def get_devices(self):
-        """Get all controllable devices (switches, lights, buttons)."""
-        states = self.get_states()
-        devices = []
-
-        for state in states:
-            entity_id = state.get("entity_id", "")
-            domain = entity_id.split(".")[0] if "." in entity_id else ""
-
-            # Filter for controllable devices
-            if domain in ["switch", "light", "button", "input_boolean"]:
-                devices.append(
-                    {
-                        "entity_id": entity_id,
-                        "name": state.get("attributes", {}).get("friendly_name", entity_id),
-                        "state": state.get("state"),
-                        "domain": domain,
-                        "attributes": state.get("attributes", {}),
-                    }
-                )
-
-        return devices
+    def _fetch_state(self, entity_id):
+        return self._request("GET", f"/states/{entity_id}").json()
+
+    def get_devices(self, refresh=False):
+        """Get all controllable devices (switches, lights, buttons).
+
+        Served from the device index. A stale index is rebuilt from a streamed
+        ``/states`` read that keeps only controllable entities; otherwise only
+        entities switched through this client since the last read are re-fetched.
+        """
+        try:
+            if refresh or self.device_index.is_stale():
+                self.device_index.replace(self._stream_states())
+            else:
+                self._refresh_dirty_devices()
+        except Exception as e:
+            logger.error(f"Error getting devices: {e}")
+            if not self.device_index.is_loaded:
+                return []
+        return self.device_index.devices()
+
+    def _stream_states(self):
+        """Yield states from ``/states`` as they are decoded from the response."""
+        response = self._request("GET", "/states", stream=True)
+        try:
+            yield from iter_json_array(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+        finally:
+            response.close()
+
+    def _refresh_dirty_devices(self):
+        """Re-read indexed devices whose state changed through this client."""
+        dirty = list(self.device_index.pop_dirty())
+        for position, entity_id in enumerate(dirty):
+            try:
+                self.device_index.apply(entity_id, self._fetch_state(entity_id))
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    self.device_index.mark_dirty(dirty[position:])
+                    raise
+                self.device_index.apply(entity_id, None)
+            except Exception:
+                # Everything not yet re-read stays dirty for the next lookup
+                self.device_index.mark_dirty(dirty[position:])
+                raise
 
     def call_service(self, domain, service, entity_id=None, service_data=None):
         """Call a Home Assistant service."""
@@ -66,15 +356,27 @@ class HomeAssistantClient:
             if entity_id:
                 data["entity_id"] = entity_id
 
-            response = requests.post(
-                f"{self.base_url}/services/{domain}/{service}", headers=self.headers, json=data, timeout=10
-            )
-            response.raise_for_status()
+            self._request("POST", f"/services/{domain}/{service}", json=data)
+            self.invalidate(entity_id)
             return True
         except Exception as e:
             logger.error(f"Error calling service {domain}.{service}: {e}")
             return False
 
+    def invalidate(self, entity_ids):
+        """Drop cached state for entities changed by a write, including writes by other clients."""
+        if not entity_ids:
+            return
+        entity_ids = [entity_ids] if isinstance(entity_ids, str) else entity_ids
+        self.device_index.mark_dirty(entity_ids)
+        if self.state_cache is not None:
+            for entity_id in entity_ids:
+                self.state_cache.invalidate(entity_id)
+
+    def call_service_batch(self, batch):
+        """Send a ServiceCallBatch, one request per domain and service."""
+        return batch.execute(self)
+
     def turn_on(self, entity_id):
         """Turn on a device."""
         domain = entity_id.split(".")[0]
@@ -85,24 +387,19 @@ class HomeAssistantClient:
         domain = entity_id.split(".")[0]
         return self.call_service(domain, "turn_off", entity_id)
 
-    def get_sensor_value(self, entity_id):
-        """Get numeric value from a sensor."""
-        state = self.get_state(entity_id)
-        if state:
-            try:
-                return float(state.get("state", 0))
-            except (ValueError, TypeError):
-                logger.warning(f"Could not convert sensor value to float: {entity_id}")
-                return 0.0
-        return 0.0
+    def get_sensor_value(self, entity_id, strict=False):
+        """Get numeric value from a sensor.
+
+        Returns 0.0 for missing or non-numeric sensors. With ``strict`` an
+        unreachable HA raises HomeAssistantUnavailable rather than reading as 0.
+        """
+        return sensor_value_from_state(self.get_state(entity_id, strict=strict), entity_id)
 
     def set_state(self, entity_id, state_data):
         """Set state of an entity (for publishing sensors)."""
         try:
-            response = requests.post(
-                f"{self.base_url}/states/{entity_id}", headers=self.headers, json=state_data, timeout=10
-            )
-            response.raise_for_status()
+            self._request("POST", f"/states/{entity_id}", json=state_data)
+            self.invalidate(entity_id)
             return True
         except Exception as e:
             logger.error(f"Error setting state for {entity_id}: {e}")
@@ -0,0 +1,268 @@
+"""WebSocket state mirror for the Home Assistant client."""
+
+import asyncio
+import itertools
+import logging
+import threading
+
+import aiohttp
+from ha_client import DEFAULT_BASE_URL, HomeAssistantClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WS_URL = "ws://supervisor/core/websocket"
+
+# Largest WebSocket message accepted, in bytes; 0 is unlimited. get_states returns every
+# entity in one message, which passes aiohttp's 4 MB default on large installations.
+DEFAULT_MAX_MESSAGE_SIZE = 0
+
+
+def websocket_url_for(base_url):
+    """Derive the WebSocket API URL from a REST base URL."""
+    if not base_url or base_url.rstrip("/") == DEFAULT_BASE_URL:
+        return DEFAULT_WS_URL
+    base_url = base_url.rstrip("/")
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://") :] + "/websocket"
+    return "ws://" + base_url[len("http://") :] + "/websocket"
+
+
+class MirroredHomeAssistantClient(HomeAssistantClient):
+    """Home Assistant client answering state reads from a live WebSocket mirror.
+
+    A background thread connects to the WebSocket API, subscribes to
+    ``state_changed`` events and keeps an in-memory copy of entity states.
+    Reads are served from that copy once the initial sync has completed and
+    fall back to REST while the mirror is (re)connecting. Writes and service
+    calls still go through the pooled REST session. Reconnects back off from
+    ``reconnect_min_delay`` to ``reconnect_max_delay`` until a sync succeeds.
+    """
+
+    def __init__(
+        self,
+        token,
+        base_url=None,
+        ws_url=None,
+        tracked_entities=None,
+        reconnect_min_delay=1.0,
+        reconnect_max_delay=60.0,
+        max_message_size=DEFAULT_MAX_MESSAGE_SIZE,
+        **kwargs,
+    ):
+        """Initialize the client."""
+        super().__init__(token, base_url=base_url, **kwargs)
+        self.ws_url = ws_url or websocket_url_for(base_url)
+        self.tracked_entities = set(tracked_entities) if tracked_entities else None
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.max_message_size = max_message_size
+
+        self._states = {}
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopping = threading.Event()
+        self._loop = None
+        self._task = None
+        self._thread = None
+        self._pending = None
+        self._subscription_id = None
+        self._sync_id = None
+        self._message_ids = itertools.count(1)
+        self._listeners = []
+        self.reconnect_count = 0
+
+    # Lifecycle
+
+    def start(self):
+        """Start the mirror in a background thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self._connection_loop())
+        self._thread = threading.Thread(target=self._run_loop, name="ha-state-mirror", daemon=True)
+        self._thread.start()
+        logger.info(f"State mirror started ({self.ws_url})")
+
+    def stop(self, timeout=5):
+        """Stop the mirror and wait for the background thread."""
+        self._stopping.set()
+        if self._thread and self._thread.is_alive():
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass  # loop already closed
+            self._thread.join(timeout)
+        self._synced.clear()
+
+    def close(self):
+        """Stop the mirror and close pooled connections."""
+        self.stop()
+        super().close()
+
+    def wait_until_synced(self, timeout=None):
+        """Block until the initial state sync has completed."""
+        return self._synced.wait(timeout)
+
+    @property
+    def is_synced(self):
+        """Whether reads are currently served from the mirror."""
+        return self._synced.is_set()
+
+    def add_listener(self, callback):
+        """Call callback(entity_id, old_state, new_state) for every state change.
+
+        Runs on the mirror thread, so callbacks must return quickly. After a
+        (re)sync the callback receives entity_id None, as changes may have been missed.
+        """
+        self._listeners.append(callback)
+
+    def _notify_listeners(self, entity_id, old_state, new_state):
+        for callback in self._listeners:
+            try:
+                callback(entity_id, old_state, new_state)
+            except Exception as e:
+                logger.error(f"Error in state listener: {e}")
+
+    # Reads
+
+    def _is_tracked(self, entity_id):
+        return self.tracked_entities is None or entity_id in self.tracked_entities
+
+    def is_available(self):
+        """Whether state is available, from the mirror or over REST."""
+        return self._synced.is_set() or super().is_available()
+
+    def get_state(self, entity_id, strict=False):
+        """Get state of a specific entity, from the mirror when synced."""
+        if self._synced.is_set() and self._is_tracked(entity_id):
+            return self._states.get(entity_id)
+        return super().get_state(entity_id, strict=strict)
+
+    def get_states(self, strict=False):
+        """Get all states, from the mirror when it holds every entity."""
+        if self._synced.is_set() and self.tracked_entities is None:
+            with self._lock:
+                return list(self._states.values())
+        return super().get_states(strict=strict)
+
+    def get_devices(self, refresh=False):
+        """Get all controllable devices, from the event-fed index when synced."""
+        if self._synced.is_set() and not refresh:
+            return self.device_index.devices()
+        return super().get_devices(refresh=refresh)
+
+    # WebSocket handling
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    async def _connection_loop(self):
+        delay = self.reconnect_min_delay
+        while not self._stopping.is_set():
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.ws_url, heartbeat=30, max_msg_size=self.max_message_size) as ws:
+                        await self._authenticate(ws)
+                        await self._subscribe_and_sync(ws)
+                        await self._receive(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"State mirror connection error: {e}")
+
+            # Only a connection that synced resets the backoff; failing before that (after
+            # authenticating, say) would otherwise re-download every state once a second
+            if self._synced.is_set():
+                delay = self.reconnect_min_delay
+            self._synced.clear()
+            if self._stopping.is_set():
+                break
+            self.reconnect_count += 1
+            logger.info(f"State mirror reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    async def _authenticate(self, ws):
+        message = await ws.receive_json()
+        if message.get("type") != "auth_required":
+            raise ConnectionError(f"Unexpected handshake message: {message.get('type')}")
+        await ws.send_json({"type": "auth", "access_token": self.token})
+        message = await ws.receive_json()
+        if message.get("type") != "auth_ok":
+            raise PermissionError(f"WebSocket authentication failed: {message.get('message', message.get('type'))}")
+
+    async def _subscribe_and_sync(self, ws):
+        # Subscribe before fetching states so no change between the two is lost;
+        # events arriving before the snapshot are buffered and replayed over it
+        self._pending = {}
+        self._subscription_id = next(self._message_ids)
+        await ws.send_json({"id": self._subscription_id, "type": "subscribe_events", "event_type": "state_changed"})
+        self._sync_id = next(self._message_ids)
+        await ws.send_json({"id": self._sync_id, "type": "get_states"})
+
+    async def _receive(self, ws):
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self._handle_message(msg.json())
+            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                break
+        raise ConnectionError("WebSocket connection closed")
+
+    def _handle_message(self, message):
+        message_type = message.get("type")
+        if message_type == "event" and message.get("id") == self._subscription_id:
+            data = message.get("event", {}).get("data", {})
+            self._apply_change(data.get("entity_id"), data.get("new_state"))
+            self._notify_listeners(data.get("entity_id"), data.get("old_state"), data.get("new_state"))
+        elif message_type == "result" and message.get("id") == self._sync_id:
+            if not message.get("success"):
+                raise ConnectionError(f"get_states failed: {message.get('error')}")
+            self._apply_snapshot(message.get("result") or [])
+        elif message_type == "result" and not message.get("success"):
+            raise ConnectionError(f"Subscription failed: {message.get('error')}")
+
+    def _apply_snapshot(self, states):
+        self.device_index.replace(states)
+        snapshot = {}
+        for state in states:
+            entity_id = state.get("entity_id")
+            if entity_id and self._is_tracked(entity_id):
+                snapshot[entity_id] = state
+        for entity_id, new_state in self._pending.items():
+            self.device_index.apply(entity_id, new_state)
+            if not self._is_tracked(entity_id):
+                continue
+            if new_state is None:
+                snapshot.pop(entity_id, None)
+            else:
+                snapshot[entity_id] = new_state
+        self._pending = None
+
+        with self._lock:
+            self._states = snapshot
+        self._synced.set()
+        logger.info(f"State mirror synced ({len(snapshot)} entities)")
+        self._notify_listeners(None, None, None)
+
+    def _apply_change(self, entity_id, new_state):
+        if not entity_id:
+            return
+        if self._pending is not None:
+            # Buffered for every entity so the device index also sees changes made during a resync
+            self._pending[entity_id] = new_state
+            return
+        self.device_index.apply(entity_id, new_state)
+        if not self._is_tracked(entity_id):
+            return
+        with self._lock:
+            if new_state is None:
+                self._states.pop(entity_id, None)
+            else:
+                self._states[entity_id] = new_state
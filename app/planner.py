@@ -0,0 +1,345 @@
+"""Pure control planning: decide device actions from an immutable snapshot."""
+
+import bisect
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+from allocator import allocate, priority_weight
+from schedule import CompiledSchedule, compile_schedule, minute_of_week
+
+MODE_SAVING_SESSION = "saving_session"
+MODE_FREE_SESSION = "free_session"
+MODE_SMART = "smart"
+
+ON_STATES = ("on", "true")
+OFF_STATES = ("off", "false")
+
+# Smart-control thresholds
+SOLAR_EXCESS_THRESHOLD = 1000  # W
+SOLAR_EXCESS_THRESHOLD_BATTERY_FULL = 500  # W, when the battery is charging above 80%
+HIGH_COST_THRESHOLD = 0.30
+HIGH_COST_THRESHOLD_BATTERY = 0.25  # when the battery is above 50%
+BATTERY_FULL_LEVEL = 80  # %
+BATTERY_AVAILABLE_LEVEL = 50  # %
+
+# Values at which a smart-control decision can change, per input
+SOLAR_THRESHOLDS = (SOLAR_EXCESS_THRESHOLD_BATTERY_FULL, SOLAR_EXCESS_THRESHOLD)
+COST_THRESHOLDS = (HIGH_COST_THRESHOLD_BATTERY, HIGH_COST_THRESHOLD)
+BATTERY_LEVEL_THRESHOLDS = (BATTERY_AVAILABLE_LEVEL, BATTERY_FULL_LEVEL)
+BATTERY_POWER_THRESHOLDS = (0,)
+
+# A device the controller switched this recently may not show its new state yet
+SELF_SWITCH_GRACE = 10  # seconds
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceSnapshot:
+    """A managed device's configuration and current HA state."""
+
+    entity_id: str
+    state: Optional[str]
+    priority: int = 5
+    enabled: bool = True
+    allow_direct_control: bool = True
+    schedule: Optional[CompiledSchedule] = None  # None: no schedule restriction
+    last_heating_change: Optional[str] = None
+    heating: Optional[bool] = None  # derived from entity_id when not given
+    power: float = 0  # W drawn when on; 0 if not configured
+    last_controlled: Optional[str] = None
+
+    def __post_init__(self):
+        if self.heating is None:
+            object.__setattr__(self, "heating", is_heating_device(self.entity_id))
+
+    @classmethod
+    def from_config(cls, entity_id, device_info, state=None):
+        """Build from a managed-device config dict and an HA state dict."""
+        return cls(
+            entity_id=entity_id,
+            state=state.get("state") if state else None,
+            priority=device_info.get("priority", 5),
+            enabled=device_info.get("enabled", True),
+            allow_direct_control=device_info.get("allow_direct_control", True),
+            schedule=compile_schedule(device_info.get("schedule")),
+            last_heating_change=device_info.get("last_heating_change"),
+            power=device_info.get("power_consumption", 0) or 0,
+            last_controlled=device_info.get("last_controlled"),
+        )
+
+
+@dataclass(frozen=True)
+class ControlSnapshot:
+    """Everything a control decision depends on, captured at one instant.
+
+    ``devices`` are in priority order (lower number first), as the device
+    registry keeps them; the planner does not sort.
+    """
+
+    now: datetime
+    solar_generation: float
+    electricity_cost: float
+    devices: Tuple[DeviceSnapshot, ...] = ()
+    is_free_session: bool = False
+    is_saving_session: bool = False
+    battery_level: Optional[float] = None
+    battery_power: Optional[float] = None
+    house_load: Optional[float] = None  # W, excluding battery charging
+    heating_min_change_interval: float = 900
+
+    def to_dict(self):
+        """Summarize the inputs for the preview API."""
+        return {
+            "now": self.now.isoformat(),
+            "solar_generation": self.solar_generation,
+            "electricity_cost": self.electricity_cost,
+            "is_free_session": self.is_free_session,
+            "is_saving_session": self.is_saving_session,
+            "battery_level": self.battery_level,
+            "battery_power": self.battery_power,
+            "house_load": self.house_load,
+            "devices": len(self.devices),
+        }
+
+
+@dataclass(frozen=True)
+class PlannedAction:
+    """Switch one device on or off, and why."""
+
+    entity_id: str
+    turn_on: bool
+    reason: str
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Ordered actions for one cycle, with devices held back and notes for the log."""
+
+    mode: str
+    actions: Tuple[PlannedAction, ...] = ()
+    skipped: Tuple[Tuple[str, str], ...] = ()
+    notes: Tuple[str, ...] = ()
+
+    def to_dict(self):
+        """Serialize for the preview API."""
+        return {
+            "mode": self.mode,
+            "actions": [
+                {"entity_id": action.entity_id, "turn_on": action.turn_on, "reason": action.reason}
+                for action in self.actions
+            ],
+            "skipped": [{"entity_id": entity_id, "reason": reason} for entity_id, reason in self.skipped],
+            "notes": list(self.notes),
+        }
+
+
+def threshold_band(value, thresholds):
+    """Number of (sorted) thresholds that value exceeds; decisions only change when this does."""
+    return bisect.bisect_left(thresholds, value)
+
+
+def is_heating_device(entity_id):
+    """Check if a device is a heating device (subject to min change interval)."""
+    return "heat" in entity_id.lower() or "thermostat" in entity_id.lower()
+
+
+def device_allowed(device, now):
+    """Check if a device may be controlled now, based on its schedule and settings."""
+    return _allowed_at(device, minute_of_week(now))
+
+
+def _allowed_at(device, minute):
+    if not device.allow_direct_control:
+        return False
+    return device.schedule is None or device.schedule.allows(minute)
+
+
+def next_allowed_window(device, now):
+    """Return (start, end) of the window in which the device may next be controlled.
+
+    The window may already have started; end is None when the device has no
+    schedule. Returns None if it may never be controlled directly.
+    """
+    if not device.allow_direct_control:
+        return None
+    if device.schedule is None:
+        return now, None
+    return device.schedule.next_window(now)
+
+
+def recently_switched(device, now):
+    """Check whether the controller switched a device within SELF_SWITCH_GRACE of now."""
+    if not device.last_controlled:
+        return False
+    try:
+        return (now - datetime.fromisoformat(device.last_controlled)).total_seconds() < SELF_SWITCH_GRACE
+    except ValueError:
+        return False
+
+
+def available_surplus(snapshot, battery_full):
+    """Watts that newly started devices may draw without importing from the grid.
+
+    With a house load reading this is solar minus load, less what the battery
+    is charging at unless it is near full (then devices get that power first).
+    Without one, the solar threshold in force stands in for the rest of the
+    house, and managed devices that are on, or were switched so recently that
+    they may be starting, are subtracted too so later cycles do not start more
+    than the solar covers.
+    """
+    if snapshot.house_load is None:
+        threshold = SOLAR_EXCESS_THRESHOLD_BATTERY_FULL if battery_full else SOLAR_EXCESS_THRESHOLD
+        running = sum(
+            device.power
+            for device in snapshot.devices
+            if device.state in ON_STATES or recently_switched(device, snapshot.now)
+        )
+        return snapshot.solar_generation - threshold - running
+    surplus = snapshot.solar_generation - snapshot.house_load
+    if not battery_full and snapshot.battery_power is not None and snapshot.battery_power > 0:
+        surplus -= snapshot.battery_power
+    return surplus
+
+
+def battery_near_full(snapshot):
+    """Check whether the battery is charging above BATTERY_FULL_LEVEL, so devices get its power first."""
+    if snapshot.battery_level is None or snapshot.battery_power is None:
+        return False
+    return snapshot.battery_level > BATTERY_FULL_LEVEL and snapshot.battery_power > 0
+
+
+def smallest_start(snapshot):
+    """Power (W) of the smallest device smart control could start now, or None if there is none.
+
+    The surplus reaching this is the point at which one more device fits.
+    """
+    eligible, _ = _startable(snapshot, minute_of_week(snapshot.now))
+    return min((device.power for device in eligible if device.power > 0), default=None)
+
+
+def _startable(snapshot, minute):
+    """Devices smart control may start, in snapshot order, and (entity_id, reason) for those held back."""
+    eligible = []
+    skipped = []
+    for device in snapshot.devices:
+        if device.enabled and _allowed_at(device, minute) and device.state in OFF_STATES:
+            if _held_back(device, snapshot):
+                skipped.append((device.entity_id, "minimum heating change interval not met"))
+            elif recently_switched(device, snapshot.now):
+                skipped.append((device.entity_id, "switched moments ago"))
+            else:
+                eligible.append(device)
+    return eligible, skipped
+
+
+def _held_back(device, snapshot):
+    return device.heating and not heating_change_allowed(
+        device.last_heating_change, snapshot.now, snapshot.heating_min_change_interval
+    )
+
+
+def heating_change_allowed(last_change, now, min_interval):
+    """Check if enough time has passed since the last heating change."""
+    if not last_change:
+        return True
+    try:
+        return (now - datetime.fromisoformat(last_change)).total_seconds() >= min_interval
+    except Exception:
+        return True
+
+
+def plan_actions(snapshot):
+    """Decide the actions for one automation cycle."""
+    if snapshot.is_saving_session:
+        return plan_saving_session(snapshot)
+    if snapshot.is_free_session:
+        return plan_free_session(snapshot)
+    return plan_smart_control(snapshot)
+
+
+def plan_saving_session(snapshot):
+    """Turn off lower-priority devices (priority > 3) that are on."""
+    actions = tuple(
+        PlannedAction(device.entity_id, False, MODE_SAVING_SESSION)
+        for device in snapshot.devices
+        if device.enabled and device.priority > 3 and device.state in ON_STATES
+    )
+    return Plan(MODE_SAVING_SESSION, actions, notes=("Saving session active - turning off non-essential devices",))
+
+
+def plan_free_session(snapshot):
+    """Turn on every enabled device that is off."""
+    actions = tuple(
+        PlannedAction(device.entity_id, True, MODE_FREE_SESSION)
+        for device in snapshot.devices
+        if device.enabled and device.state in OFF_STATES
+    )
+    return Plan(MODE_FREE_SESSION, actions, notes=("Free electric session active - turning on devices",))
+
+
+def plan_smart_control(snapshot):
+    """Turn devices on for solar excess and lower-priority devices off at high cost.
+
+    Devices are considered in snapshot (priority) order. Devices to turn on
+    must fit the surplus power together; the most valuable set by priority
+    is chosen (see allocator.allocate). Heating devices changed more
+    recently than the minimum interval are held back.
+    """
+    minute = minute_of_week(snapshot.now)
+    devices = snapshot.devices
+    notes = []
+    candidates = []
+    skipped = []
+
+    # Battery charging and near full: prefer running devices over charging
+    solar_threshold = SOLAR_EXCESS_THRESHOLD
+    battery_full = battery_near_full(snapshot)
+    if battery_full:
+        solar_threshold = SOLAR_EXCESS_THRESHOLD_BATTERY_FULL
+        notes.append("Battery near full, lowering threshold for device activation")
+
+    if snapshot.solar_generation > solar_threshold:
+        notes.append("High solar generation - enabling devices")
+        eligible, skipped = _startable(snapshot, minute)
+
+        surplus = available_surplus(snapshot, battery_full)
+        allocation = allocate(
+            [(device.entity_id, device.power, priority_weight(device.priority)) for device in eligible], surplus
+        )
+        chosen = set(allocation.chosen)
+        candidates.extend(
+            (device, PlannedAction(device.entity_id, True, "solar_excess"))
+            for device in eligible
+            if device.entity_id in chosen
+        )
+        skipped.extend(
+            (device.entity_id, f"needs {device.power:.0f}W, surplus {surplus:.0f}W")
+            for device in eligible
+            if device.entity_id not in chosen
+        )
+        notes.append(
+            f"Surplus {surplus:.0f}W: starting {len(chosen)} of {len(eligible)} devices ({allocation.power:.0f}W)"
+        )
+
+    # A charged battery can cover the load, so shed devices at a lower price
+    cost_threshold = HIGH_COST_THRESHOLD
+    if snapshot.battery_level is not None and snapshot.battery_level > BATTERY_AVAILABLE_LEVEL:
+        cost_threshold = HIGH_COST_THRESHOLD_BATTERY
+        notes.append(f"Battery available ({snapshot.battery_level}%), lowering cost threshold")
+
+    if snapshot.electricity_cost > cost_threshold:
+        notes.append("High electricity cost - disabling lower priority devices")
+        candidates.extend(
+            (device, PlannedAction(device.entity_id, False, "high_cost"))
+            for device in devices
+            if device.enabled and device.priority > 5 and _allowed_at(device, minute) and device.state in ON_STATES
+        )
+
+    actions = []
+    for device, action in candidates:
+        if _held_back(device, snapshot):
+            skipped.append((action.entity_id, "minimum heating change interval not met"))
+        else:
+            actions.append(action)
+
+    return Plan(MODE_SMART, tuple(actions), tuple(skipped), tuple(notes))
@@ -0,0 +1,152 @@
+"""Device schedules compiled to minute-of-week bitmaps."""
+
+import re
+from bisect import bisect_right
+from datetime import timedelta
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+ALL_DAYS = tuple(range(7))
+
+_CLOCK = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def minute_of_week(now):
+    """Minutes since Monday 00:00 for a datetime."""
+    return now.weekday() * MINUTES_PER_DAY + now.hour * 60 + now.minute
+
+
+def _parse_clock(value, key):
+    match = _CLOCK.match(str(value).strip())
+    if not match:
+        raise ValueError(f"schedule {key} must be HH:MM")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def _parse_days(days):
+    days = ALL_DAYS if days is None else tuple(days)
+    if any(not isinstance(day, int) or isinstance(day, bool) or not 0 <= day <= 6 for day in days):
+        raise ValueError("schedule days must be integers 0-6")
+    return days
+
+
+class CompiledSchedule:
+    """The minutes of the week in which a device may be controlled.
+
+    ``allows()`` is a single bit lookup. The allowed minutes are also kept as
+    sorted runs so the next allowed window can be found with a binary search.
+    """
+
+    __slots__ = ("_bits", "_runs", "_starts")
+
+    def __init__(self, bits):
+        """Initialize from a MINUTES_PER_WEEK-bit little-endian bitmap."""
+        self._bits = bytes(bits)
+        self._runs = self._find_runs()
+        self._starts = [start for start, _ in self._runs]
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledSchedule) and self._bits == other._bits
+
+    def __hash__(self):
+        return hash(self._bits)
+
+    def __repr__(self):
+        return f"CompiledSchedule({len(self._runs)} windows)"
+
+    def allows(self, minute):
+        """Check whether a minute of the week is inside the schedule."""
+        return bool(self._bits[minute >> 3] >> (minute & 7) & 1)
+
+    def _find_runs(self):
+        runs = []
+        mask = int.from_bytes(self._bits, "little")
+        while mask:
+            start = (mask & -mask).bit_length() - 1  # lowest set bit
+            shifted = mask >> start
+            length = (~shifted & (shifted + 1)).bit_length() - 1  # lowest clear bit
+            runs.append((start, start + length))
+            mask &= ~(((1 << length) - 1) << start)
+        # A run reaching Sunday 23:59 continues into one starting Monday 00:00
+        if len(runs) > 1 and runs[0][0] == 0 and runs[-1][1] == MINUTES_PER_WEEK:
+            first = runs.pop(0)
+            runs[-1] = (runs[-1][0], MINUTES_PER_WEEK + first[1])
+        return runs
+
+    def window_at(self, minute):
+        """Return (start, end) minutes of the window containing minute, or of the next one.
+
+        Values are relative to the start of minute's week and may fall outside
+        it; end is exclusive. Returns None if the schedule allows nothing.
+        """
+        if not self._runs:
+            return None
+        last_start, last_end = self._runs[-1]
+        if last_end > MINUTES_PER_WEEK and minute < last_end - MINUTES_PER_WEEK:
+            return last_start - MINUTES_PER_WEEK, last_end - MINUTES_PER_WEEK
+        i = bisect_right(self._starts, minute) - 1
+        if i >= 0 and self._runs[i][1] > minute:
+            return self._runs[i]
+        if i + 1 < len(self._runs):
+            return self._runs[i + 1]
+        first_start, first_end = self._runs[0]
+        return first_start + MINUTES_PER_WEEK, first_end + MINUTES_PER_WEEK
+
+    def minutes_until_allowed(self, minute):
+        """Minutes until the schedule next allows control (0 if it does now), or None if never."""
+        window = self.window_at(minute)
+        return None if window is None else max(0, window[0] - minute)
+
+    def next_window(self, now):
+        """Return (start, end) datetimes of the window containing now or the next one, or None."""
+        minute = minute_of_week(now)
+        window = self.window_at(minute)
+        if window is None:
+            return None
+        week_start = now.replace(second=0, microsecond=0) - timedelta(minutes=minute)
+        return week_start + timedelta(minutes=window[0]), week_start + timedelta(minutes=window[1])
+
+
+def compile_schedule(schedule, strict=False):
+    """Compile a schedule dict; returns None when it does not restrict anything.
+
+    Either a single window, ``{"start": "08:00", "end": "22:00", "days": [0, 1]}``,
+    or several, ``{"windows": [{"start": "22:00", "end": "06:00", "days": [4]}, ...]}``.
+    Times are inclusive, and H:MM is read as 0H:MM; a window whose end is before
+    its start runs overnight into the next day. Days (0 = Monday) are the days a
+    window starts on and default to every day; a window without times covers its
+    whole days. A window with only one of start and end is read the same way, as
+    stored schedules always were, unless ``strict`` (for new settings from the
+    API), which rejects it. Raises ValueError for an invalid schedule.
+    """
+    if not schedule:
+        return None
+    if not isinstance(schedule, dict):
+        raise ValueError("schedule must be an object")
+
+    windows = schedule.get("windows")
+    if windows is None:
+        if not any(schedule.get(key) for key in ("start", "end", "days")):
+            return None
+        windows = [schedule]
+    elif not isinstance(windows, list) or not all(isinstance(window, dict) for window in windows):
+        raise ValueError("schedule windows must be a list of objects")
+
+    mask = 0
+    for window in windows:
+        days = _parse_days(window.get("days") or None)
+        start, end = window.get("start"), window.get("end")
+        if strict and bool(start) != bool(end):
+            raise ValueError("schedule start and end must be given together")
+        if start and end:
+            start, end = _parse_clock(start, "start"), _parse_clock(end, "end")
+            if end < start:
+                end += MINUTES_PER_DAY  # overnight
+        else:
+            start, end = 0, MINUTES_PER_DAY - 1
+        span = (1 << (end - start + 1)) - 1
+        for day in days:
+            mask |= span << (day * MINUTES_PER_DAY + start)
+    # Sunday's overnight windows wrap round to Monday morning
+    mask = (mask | mask >> MINUTES_PER_WEEK) & ((1 << MINUTES_PER_WEEK) - 1)
+    return CompiledSchedule(mask.to_bytes(MINUTES_PER_WEEK // 8, "little"))
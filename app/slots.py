@@ -0,0 +1,122 @@
+"""Forecast slot search: sliding-window means with top-k selection."""
+
+import heapq
+from bisect import bisect_left
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # optional; the pure-Python path gives the same results
+    np = None
+
+# Slots returned per request
+DEFAULT_SLOT_COUNT = 10
+
+
+def window_means(values, width, prefix=None):
+    """Mean of the ``width`` values starting at each index, from prefix sums in O(n).
+
+    Windows running past the end are cut short and averaged over the values
+    they do hold. ``prefix`` may pass in the prefix sums of values.
+    """
+    count = len(values)
+    if prefix is None:
+        prefix = list(accumulate(values, initial=0))
+    return [(prefix[min(i + width, count)] - prefix[i]) / (min(i + width, count) - i) for i in range(count)]
+
+
+def top_windows(means, count=DEFAULT_SLOT_COUNT, highest=True, separation=0):
+    """Return the indexes of the best ``count`` windows, best first.
+
+    Ties keep index order. With ``separation``, a window is only taken if its
+    start is at least that far from every window already taken (pass the
+    window width for non-overlapping slots). Without it this is a heap
+    selection in O(n log count); with it, a heap is popped lazily until
+    enough windows are found.
+    """
+    if count <= 0:
+        return []
+    if separation <= 1:
+        select = heapq.nlargest if highest else heapq.nsmallest
+        return select(count, range(len(means)), key=means.__getitem__)
+
+    sign = -1 if highest else 1
+    heap = [(sign * mean, i) for i, mean in enumerate(means)]
+    heapq.heapify(heap)
+    return spread((heapq.heappop(heap)[1] for _ in range(len(heap))), count, separation)
+
+
+def spread(ranked, count, separation):
+    """Take indexes from ranked (best first) at least ``separation`` from every one taken, up to count."""
+    chosen = []
+    taken = []  # sorted
+    for i in ranked:
+        position = bisect_left(taken, i)
+        if position > 0 and i - taken[position - 1] < separation:
+            continue
+        if position < len(taken) and taken[position] - i < separation:
+            continue
+        taken.insert(position, i)
+        chosen.append(i)
+        if len(chosen) == count:
+            break
+    return chosen
+
+
+class SlotFinder:
+    """Best run windows of one forecast series, for any number of run durations.
+
+    Prefix sums are built once, so each distinct width then costs one O(n)
+    pass, vectorized with NumPy when it is installed. Windows start at every
+    value but the last, as the slot endpoints always have, cut short at the
+    end; with ``full_windows`` they only start where all ``width`` values fit,
+    as runs on a forecast grid must.
+    """
+
+    def __init__(self, values, use_numpy=None, full_windows=False):
+        """Initialize from the forecast values; use_numpy=None uses NumPy if available."""
+        self.use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+        self.full_windows = full_windows
+        self.size = len(values)
+        if self.use_numpy:
+            self._values = np.asarray(values, dtype=float)
+            self._prefix = np.concatenate(([0.0], np.cumsum(self._values)))
+        else:
+            self._values = list(values)
+            self._prefix = list(accumulate(self._values, initial=0))
+        self._means = {}
+        self._best = {}
+
+    def means(self, width):
+        """Window means for each start (see the class docstring for which), cached per width."""
+        means = self._means.get(width)
+        if means is None:
+            starts = max(0, self.size - width + 1) if self.full_windows else max(0, self.size - 1)
+            if self.use_numpy:
+                starts = np.arange(starts)
+                ends = np.minimum(starts + width, self.size)
+                means = (self._prefix[ends] - self._prefix[starts]) / (ends - starts)
+            else:
+                means = window_means(self._values, width, self._prefix)[:starts]
+            self._means[width] = means
+        return means
+
+    def best(self, width, count=DEFAULT_SLOT_COUNT, highest=True, non_overlapping=False):
+        """Return (start index, window mean) for the best windows of ``width`` values, cached."""
+        if self.size == 0 or width <= 0 or count <= 0:
+            return []
+        key = (width, count, highest, non_overlapping)
+        if key not in self._best:
+            self._best[key] = self._select(width, count, highest, non_overlapping)
+        return list(self._best[key])
+
+    def _select(self, width, count, highest, non_overlapping):
+        means = self.means(width)
+        if not self.use_numpy:
+            chosen = top_windows(means, count, highest, width if non_overlapping else 0)
+            return [(i, means[i]) for i in chosen]
+
+        # A stable sort keeps ties in index order, like the heap selection
+        order = np.argsort(-means if highest else means, kind="stable")
+        chosen = spread(order.tolist(), count, width) if non_overlapping else order[:count].tolist()
+        return [(i, float(means[i])) for i in chosen]
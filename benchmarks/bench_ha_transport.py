@@ -0,0 +1,134 @@
+"""Benchmark pooled vs. per-call HTTP transport against a local stand-in HA server.
+
+Simulates the REST traffic of one automation cycle (sensor reads, one state
+read per managed device, a few service calls and sensor publishes) and
+compares bare ``requests.get/post`` calls with the pooled keep-alive session
+used by ``HomeAssistantClient``.
+
+Usage:
+    python benchmarks/bench_ha_transport.py [--devices 40] [--cycles 20] [--handshake-ms 1.0]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from ha_client import HomeAssistantClient  # noqa: E402
+
+SENSORS = ["sensor.solar", "sensor.cost", "sensor.gas", "sensor.battery_level", "sensor.battery_power"]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal HA REST handler speaking HTTP/1.1 keep-alive."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    handshake_delay = 0.0
+
+    def setup(self):
+        # Emulate connection set-up cost (TCP handshake through the supervisor proxy)
+        time.sleep(self.handshake_delay)
+        super().setup()
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        entity_id = self.path.rsplit("/", 1)[-1]
+        self._reply({"entity_id": entity_id, "state": "on" if entity_id.startswith("switch.") else "1200"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self._reply([])
+
+
+def start_server(handshake_ms):
+    """Start the stand-in server on an ephemeral port."""
+    StandInHandler.handshake_delay = handshake_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api"
+
+
+class UnpooledClient(HomeAssistantClient):
+    """Baseline client that opens a fresh connection per call, as before pooling."""
+
+    def __init__(self, token, base_url):
+        super().__init__(token, base_url=base_url)
+        self.session = requests  # module-level get/post create a new session each call
+
+
+def run_cycle(client, devices):
+    """Issue the REST calls made by one automation cycle."""
+    for sensor in SENSORS * 2:  # status publish + control decision read the sensors twice
+        client.get_sensor_value(sensor)
+    for entity_id in devices:
+        client.get_state(entity_id)
+    for entity_id in devices[:5]:
+        client.turn_off(entity_id)
+    for sensor in SENSORS + ["sensor.sec_automation_status"]:
+        client.set_state(f"{sensor}_published", {"state": "1"})
+
+
+def measure(client, devices, cycles):
+    """Return per-cycle latencies in milliseconds."""
+    timings = []
+    for _ in range(cycles):
+        start = time.perf_counter()
+        run_cycle(client, devices)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=40)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--handshake-ms", type=float, default=1.0, help="simulated per-connection set-up cost")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.handshake_ms)
+    devices = [f"switch.device_{i}" for i in range(args.devices)]
+    calls = len(SENSORS) * 2 + args.devices + 5 + len(SENSORS) + 1
+
+    try:
+        results = {}
+        for name, client in (
+            ("per-call", UnpooledClient("token", base_url)),
+            ("pooled", HomeAssistantClient("token", base_url=base_url)),
+        ):
+            run_cycle(client, devices)  # warm-up
+            results[name] = measure(client, devices, args.cycles)
+
+        print(f"{calls} HTTP calls per cycle, {args.cycles} cycles, {args.handshake_ms} ms connection set-up")
+        for name, timings in results.items():
+            print(
+                f"{name:>9}: median {statistics.median(timings):7.2f} ms/cycle, "
+                f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.2f} ms/cycle"
+            )
+        speedup = statistics.median(results["per-call"]) / statistics.median(results["pooled"])
+        print(f"connection reuse speedup: {speedup:.2f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark the pure control planner.
+
+Builds a ControlSnapshot with many managed devices and times ``plan_actions``
+for smart control (solar excess and high cost at once) and saving sessions,
+compares building the per-cycle device snapshots from stored dicts with
+building them from the device registry, and times the power-budget
+allocator for 1,000 devices (target: under 1 ms per decision).
+
+Usage:
+    python benchmarks/bench_planner.py [--devices 200] [--iterations 2000] [--allocation-devices 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from allocator import allocate, priority_weight  # noqa: E402
+from device_registry import DeviceRegistry  # noqa: E402
+from planner import ControlSnapshot, DeviceSnapshot, plan_actions  # noqa: E402
+from schedule import compile_schedule  # noqa: E402
+
+
+def build_snapshot(count, seed=0, **kwargs):
+    """Build a snapshot with a mix of schedules, heating devices and states."""
+    rng = random.Random(seed)
+    now = datetime(2024, 11, 4, 12, 0)
+    devices = []
+    for i in range(count):
+        heating = i % 10 == 0
+        devices.append(
+            DeviceSnapshot(
+                entity_id=f"switch.{'heater' if heating else 'device'}_{i}",
+                state=rng.choice(["on", "off"]),
+                priority=rng.randint(1, 10),
+                schedule=compile_schedule(
+                    {
+                        "days": [0, 1, 2, 3, 4] if i % 3 == 0 else [],
+                        "start": "08:00" if i % 4 == 0 else None,
+                        "end": "20:00" if i % 4 == 0 else None,
+                    }
+                ),
+                last_heating_change=(now - timedelta(minutes=rng.randint(0, 60))).isoformat() if heating else None,
+                power=rng.choice([0, 100, 500, 1000, 2000, 3000]),
+            )
+        )
+    devices.sort(key=lambda device: device.priority)  # as the device registry supplies them
+    return ControlSnapshot(now=now, devices=tuple(devices), battery_level=70, battery_power=200, **kwargs)
+
+
+def bench(label, snapshot, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        plan = plan_actions(snapshot)
+    elapsed = (time.perf_counter() - start) / iterations
+    print(f"  {label:<16} {elapsed * 1e6:9.1f} us/plan  ({len(plan.actions)} actions, {len(plan.skipped)} skipped)")
+
+
+def bench_device_snapshots(count, iterations):
+    stored = {
+        f"switch.device_{i}": {"priority": i % 10, "enabled": i % 7 != 0, "schedule": {"days": [0, 1, 2, 3, 4]}}
+        for i in range(count)
+    }
+    states = {entity_id: {"state": "off"} for entity_id in stored}
+    registry = DeviceRegistry(stored)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        devices = [DeviceSnapshot.from_config(e, info, states[e]) for e, info in stored.items()]
+        devices.sort(key=lambda device: device.priority)
+    from_dicts = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        tuple(device.snapshot(states[device.entity_id]) for device in registry.enabled)
+    from_registry = (time.perf_counter() - start) / iterations
+
+    print(f"device snapshots for {count} devices:")
+    print(f"  {'dicts + sort':<16} {from_dicts * 1e6:9.1f} us/cycle")
+    print(f"  {'registry':<16} {from_registry * 1e6:9.1f} us/cycle")
+
+
+def bench_allocation(count, iterations, budget):
+    """Time allocate() for count devices; the target is under 1 ms per decision."""
+    rng = random.Random(1)
+    items = [(f"switch.device_{i}", rng.uniform(50, 3000), priority_weight(rng.randint(1, 10))) for i in range(count)]
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        allocation = allocate(items, budget)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    median, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+    print(f"allocate {count} devices into {budget:.0f} W:")
+    print(
+        f"  {'allocation':<16} {median * 1e6:9.1f} us median, {p99 * 1e6:.1f} us p99"
+        f"  ({len(allocation.chosen)} chosen, optimal={allocation.optimal})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--allocation-devices", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"plan_actions with {args.devices} devices:")
+    bench("smart control", build_snapshot(args.devices, solar_generation=2500, electricity_cost=0.35), args.iterations)
+    saving = build_snapshot(args.devices, solar_generation=2500, electricity_cost=0.35, is_saving_session=True)
+    bench("saving session", saving, args.iterations)
+    bench_device_snapshots(args.devices, args.iterations)
+    for budget in (3000, 30000, 300000):
+        bench_allocation(args.allocation_devices, args.iterations, budget)
+
+
+if __name__ == "__main__":
+    main()
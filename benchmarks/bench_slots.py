@@ -0,0 +1,235 @@
+"""Benchmark the forecast slot finders against the previous nested-loop implementation.
+
+Builds a minute-resolution solar and cost forecast (48 hours by default) and
+times ``calculate_optimal_solar_slots`` and ``calculate_cheapest_cost_slots``
+for a few run durations, next to the O(n*k) version they replaced. On a
+one-minute grid the stepped prices give the same slots as the old loops
+(solar differs, being interpolated between points). Then sweeps the
+resampling grid resolution, showing search time against the best window
+found, and times one planning pass over many managed
+devices, with the forecasts already parsed and cached:
+``get_all_device_schedules`` against calling ``get_device_optimal_schedule``
+per device, and (extrapolated from a sample) the old nested loops per device.
+Finally plans the same devices jointly under a site import limit, comparing
+the greedy placement alone with greedy plus local search.
+
+Usage:
+    python benchmarks/bench_slots.py [--hours 48] [--durations 30 180] [--iterations 5] [--devices 200]
+                                     [--resolutions 1 5 15 30 60] [--import-limit 7000]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from device_registry import ManagedDevice  # noqa: E402
+from energy_manager import EnergyManager  # noqa: E402
+from run_planner import Run, plan_runs  # noqa: E402
+from slots import np  # noqa: E402
+
+RUN_DURATIONS = (30, 60, 90, 120, 180, 240)
+
+
+def legacy_solar_slots(solar_forecast_data, required_duration_minutes):
+    """The nested-loop solar slot finder, kept for comparison."""
+    if not solar_forecast_data or required_duration_minutes <= 0:
+        return []
+    optimal_slots = []
+    for i in range(len(solar_forecast_data) - 1):
+        start_time = datetime.fromisoformat(solar_forecast_data[i]["timestamp"])
+        total_power = 0
+        slot_count = 0
+        for j in range(i, min(i + required_duration_minutes, len(solar_forecast_data))):
+            total_power += solar_forecast_data[j]["power"]
+            slot_count += 1
+        if slot_count > 0:
+            avg_power = total_power / slot_count
+            optimal_slots.append(
+                {
+                    "start_time": start_time.isoformat(),
+                    "duration_minutes": required_duration_minutes,
+                    "avg_solar_power": avg_power,
+                    "total_energy_kwh": (avg_power * required_duration_minutes) / 60000,
+                }
+            )
+    optimal_slots.sort(key=lambda x: x["avg_solar_power"], reverse=True)
+    return optimal_slots[:10]
+
+
+def legacy_cost_slots(cost_forecast_data, required_duration_minutes):
+    """The nested-loop cost slot finder, kept for comparison."""
+    if not cost_forecast_data or required_duration_minutes <= 0:
+        return []
+    cheapest_slots = []
+    for i in range(len(cost_forecast_data) - 1):
+        start_time = datetime.fromisoformat(cost_forecast_data[i]["timestamp"])
+        total_cost = 0
+        slot_count = 0
+        for j in range(i, min(i + required_duration_minutes, len(cost_forecast_data))):
+            total_cost += cost_forecast_data[j]["cost_per_kwh"]
+            slot_count += 1
+        if slot_count > 0:
+            avg_cost = total_cost / slot_count
+            cheapest_slots.append(
+                {
+                    "start_time": start_time.isoformat(),
+                    "duration_minutes": required_duration_minutes,
+                    "avg_cost_per_kwh": avg_cost,
+                    "estimated_total_cost": avg_cost * required_duration_minutes / 60,
+                }
+            )
+    cheapest_slots.sort(key=lambda x: x["avg_cost_per_kwh"])
+    return cheapest_slots[:10]
+
+
+def build_forecasts(hours, seed=0):
+    """Minute-resolution solar (a daily bell curve with noise) and half-hourly stepped prices."""
+    rng = random.Random(seed)
+    start = datetime(2024, 11, 4)
+    solar, cost = [], []
+    for minute in range(hours * 60):
+        when = start + timedelta(minutes=minute)
+        hour = when.hour + when.minute / 60
+        daylight = max(0.0, math.sin(math.pi * (hour - 6) / 12))
+        solar.append({"timestamp": when.isoformat(), "power": round(4000 * daylight * rng.uniform(0.6, 1.0), 1)})
+        if minute % 30 == 0:
+            price = round(rng.uniform(0.05, 0.40), 4)
+        cost.append({"timestamp": when.isoformat(), "cost_per_kwh": price})
+    return solar, cost
+
+
+def timed(function, iterations, *args):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = function(*args)
+    return (time.perf_counter() - start) / iterations, result
+
+
+def same_slots(a, b, key):
+    """Equal starts, and means equal up to float rounding of the summation order."""
+    return [slot["start_time"] for slot in a] == [slot["start_time"] for slot in b] and all(
+        math.isclose(x[key], y[key], rel_tol=1e-9, abs_tol=1e-9) for x, y in zip(a, b)
+    )
+
+
+def bench_resolutions(manager, solar, cost, resolutions, duration, iterations):
+    """Time the slot search per grid resolution, with the best window it finds."""
+    print(f"grid resolution, {duration} min runs (forecasts parsed per call):")
+    for minutes in resolutions:
+        manager.forecast_step = minutes * 60
+        solar_time, solar_slots = timed(manager.calculate_optimal_solar_slots, iterations, solar, duration)
+        cost_time, cost_slots = timed(manager.calculate_cheapest_cost_slots, iterations, cost, duration)
+        print(
+            f"  {minutes:>3} min  solar {solar_time * 1e3:7.2f} ms (best {solar_slots[0]['avg_solar_power']:7.1f} W)"
+            f"  cost {cost_time * 1e3:7.2f} ms (best {cost_slots[0]['avg_cost_per_kwh']:.4f}/kWh)"
+        )
+
+
+def bench_batch(manager, solar, cost, count, iterations):
+    """Time one schedule pass over count devices, batched and per device."""
+    for i in range(count):
+        manager.managed_devices.add(
+            ManagedDevice(f"switch.device_{i}", priority=i % 10 + 1, required_run_duration=RUN_DURATIONS[i % 6])
+        )
+    manager.config.update(
+        solar_forecast_sensor="sensor.solar_forecast",
+        electricity_forecast_sensor="sensor.cost_forecast",
+        enable_solar_forecast_optimization=True,
+        enable_cost_forecast_optimization=True,
+    )
+    states = {
+        "sensor.solar_forecast": {"attributes": {"forecast": solar}, "last_updated": "2024-11-04T00:00:00+00:00"},
+        "sensor.cost_forecast": {"attributes": {"forecast": cost}, "last_updated": "2024-11-04T00:00:00+00:00"},
+    }
+    manager.ha_client.get_state = states.get
+    manager.get_all_device_schedules()  # first pass parses the forecasts
+    ids = list(manager.managed_devices)
+
+    batch, schedules = timed(manager.get_all_device_schedules, iterations)
+    per_device, _ = timed(lambda: [manager.get_device_optimal_schedule(e) for e in ids], 1)
+    sample = ids[:6]
+    start = time.perf_counter()
+    for entity_id in sample:
+        duration = manager.managed_devices.device(entity_id).required_run_duration
+        legacy_solar_slots(solar, duration)
+        legacy_cost_slots(cost, duration)
+    legacy = (time.perf_counter() - start) / len(sample) * count
+
+    slots = sum(len(schedule["cheapest_cost_slots"]) for schedule in schedules.values())
+    print(f"schedules for {count} devices ({slots} cost slots, NumPy {'on' if np is not None else 'off'}):")
+    print(f"  {'batched':<22} {batch * 1e3:9.2f} ms")
+    print(f"  {'per device':<22} {per_device * 1e3:9.2f} ms")
+    print(f"  {'legacy loops (est.)':<22} {legacy * 1e3:9.2f} ms")
+
+
+def bench_joint(manager, import_limit):
+    """Plan the benchmark devices' runs together, greedy alone and with local search."""
+    grid = manager.get_parsed_forecast("cost").on_grid(manager.forecast_step)
+    solar = manager.get_parsed_forecast("solar").on_grid(manager.forecast_step).clip(grid.start, grid.end)
+    rng = random.Random(1)
+    runs = [
+        Run(device.entity_id, rng.choice((500, 1000, 2000, 3000)), grid.cells(device.required_run_duration))
+        for device in manager.managed_devices.by_priority
+    ]
+    hours = manager.forecast_step / 3600
+    print(f"joint plan for {len(runs)} runs over {len(grid)} cells, import limit {import_limit} W:")
+    for label, budget in (("greedy", 0), ("greedy + local search", 10.0)):
+        start = time.perf_counter()
+        plan = plan_runs(runs, grid.values, solar.values, import_limit, hours, time_budget=budget)
+        elapsed = time.perf_counter() - start
+        placed = sum(begin is not None for begin in plan.starts.values())
+        print(
+            f"  {label:<22} {elapsed * 1e3:9.2f} ms  cost {plan.cost:8.2f}  import {plan.grid_import:7.1f} kWh"
+            f"  peak {plan.peak_import:6.0f} W  placed {placed}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=int, default=48)
+    parser.add_argument("--durations", type=int, nargs="+", default=[30, 180])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[1, 5, 15, 30, 60])
+    parser.add_argument("--import-limit", type=int, default=7000)
+    args = parser.parse_args()
+
+    manager = EnergyManager(Mock(), {"publish_ha_entities": False, "forecast_resolution": 1})
+    solar, cost = build_forecasts(args.hours)
+    print(f"slot search over {len(solar)} forecast points:")
+    for duration in args.durations:
+        cases = [
+            ("solar", legacy_solar_slots, manager.calculate_optimal_solar_slots, solar, "avg_solar_power"),
+            ("cost", legacy_cost_slots, manager.calculate_cheapest_cost_slots, cost, "avg_cost_per_kwh"),
+        ]
+        for label, legacy, current, forecast, key in cases:
+            old, expected = timed(legacy, args.iterations, forecast, duration)
+            new, result = timed(current, args.iterations, forecast, duration)
+            match = (
+                "same slots"
+                if same_slots(expected, result, key)
+                else "interpolated"
+                if key == "avg_solar_power"
+                else "DIFFERENT slots"
+            )
+            print(
+                f"  {label:<5} {duration:>4} min  legacy {old * 1e3:8.2f} ms  "
+                f"windowed {new * 1e3:6.2f} ms  ({old / new:5.0f}x, {match})"
+            )
+        spread, _ = timed(manager.calculate_cheapest_cost_slots, args.iterations, cost, duration, True)
+        print(f"  cost  {duration:>4} min  non-overlapping {spread * 1e3:6.2f} ms")
+    bench_resolutions(manager, solar, cost, args.resolutions, args.durations[-1], args.iterations)
+    manager.forecast_step = 15 * 60
+    bench_batch(manager, solar, cost, args.devices, args.iterations)
+    bench_joint(manager, args.import_limit)
+
+
+if __name__ == "__main__":
+    main()
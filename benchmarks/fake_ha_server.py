@@ -0,0 +1,345 @@
+"""Fake Home Assistant server for benchmarking the add-on against real sockets.
+
+Implements the parts of the HA API the add-on uses:
+
+- ``GET /api/states`` and ``GET/POST /api/states/<entity_id>``
+- ``POST /api/services/<domain>/<service>`` (``turn_on``/``turn_off``/``toggle``
+  update the target entities and emit ``state_changed`` events)
+- ``GET /api/websocket`` (auth, ``subscribe_events`` and ``get_states``)
+
+Latency, jitter, error injection and the number of entities are configurable,
+and request counts are available at ``GET /fake/stats``.
+
+Usage:
+    python benchmarks/fake_ha_server.py [--port 8123] [--switches 500] [--sensors 2000]
+                                        [--latency-ms 5] [--error-rate 0.01] [--drift-interval 1]
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from aiohttp import WSMsgType, web
+
+TOKEN = "benchmark_token"
+
+# Sensors the EnergyManager reads; see SENSOR_CONFIG for matching add-on options
+CORE_SENSORS = {
+    "sensor.solar": "1500",
+    "sensor.cost": "0.28",
+    "sensor.gas": "0.07",
+    "sensor.battery_level": "65",
+    "sensor.battery_power": "200",
+    "sensor.battery_capacity": "10",
+}
+
+SENSOR_CONFIG = {
+    "solar_sensor": "sensor.solar",
+    "electricity_cost_sensor": "sensor.cost",
+    "gas_cost_sensor": "sensor.gas",
+    "battery_level_sensor": "sensor.battery_level",
+    "battery_power_sensor": "sensor.battery_power",
+    "battery_capacity_sensor": "sensor.battery_capacity",
+}
+
+SERVICE_STATES = {"turn_on": "on", "turn_off": "off"}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def build_states(switches=100, lights=20, sensors=500, seed=0):
+    """Build a realistic entity population, keyed by entity_id."""
+    rng = random.Random(seed)
+    states = {}
+
+    def add(entity_id, state, **attributes):
+        attributes.setdefault("friendly_name", entity_id.split(".", 1)[1].replace("_", " ").title())
+        states[entity_id] = {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": attributes,
+            "last_changed": _now(),
+            "last_updated": _now(),
+            "context": {"id": f"{rng.getrandbits(64):016x}", "parent_id": None, "user_id": None},
+        }
+
+    for entity_id, state in CORE_SENSORS.items():
+        add(entity_id, state, unit_of_measurement="W", state_class="measurement")
+    for i in range(switches):
+        add(f"switch.device_{i}", rng.choice(["on", "off"]), icon="mdi:power-socket")
+    for i in range(lights):
+        add(f"light.lamp_{i}", rng.choice(["on", "off"]), brightness=rng.randint(0, 255), color_mode="brightness")
+    for i in range(sensors):
+        add(
+            f"sensor.filler_{i}",
+            f"{rng.uniform(0, 100):.2f}",
+            unit_of_measurement="kWh",
+            device_class="energy",
+            state_class="total_increasing",
+        )
+    return states
+
+
+class FakeHomeAssistant:
+    """aiohttp application emulating the Home Assistant REST and WebSocket APIs."""
+
+    def __init__(self, states, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, token=TOKEN, seed=0):
+        self.states = states
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.token = token
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.errors = 0
+        self._subscribers = []
+
+    def build_app(self):
+        """Create the aiohttp application."""
+        app = web.Application(middlewares=[self._simulate])
+        app.router.add_get("/api/states", self._get_states)
+        app.router.add_get("/api/states/{entity_id}", self._get_state)
+        app.router.add_post("/api/states/{entity_id}", self._set_state)
+        app.router.add_post("/api/services/{domain}/{service}", self._call_service)
+        app.router.add_get("/api/websocket", self._websocket)
+        app.router.add_get("/fake/stats", self._stats)
+        return app
+
+    @web.middleware
+    async def _simulate(self, request, handler):
+        """Apply simulated latency and error injection to API requests."""
+        if not request.path.startswith("/api/") or request.path == "/api/websocket":
+            return await handler(request)
+        if request.headers.get("Authorization") != f"Bearer {self.token}":
+            raise web.HTTPUnauthorized()
+
+        resource = request.match_info.route.resource
+        self.requests[f"{request.method} {resource.canonical if resource else request.path}"] += 1
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise web.HTTPServiceUnavailable()
+        return await handler(request)
+
+    async def _get_states(self, request):
+        return web.json_response(list(self.states.values()))
+
+    async def _get_state(self, request):
+        state = self.states.get(request.match_info["entity_id"])
+        if state is None:
+            raise web.HTTPNotFound()
+        return web.json_response(state)
+
+    async def _set_state(self, request):
+        entity_id = request.match_info["entity_id"]
+        data = await request.json()
+        created = entity_id not in self.states
+        state = self.update_state(entity_id, str(data.get("state")), data.get("attributes", {}))
+        return web.json_response(state, status=201 if created else 200)
+
+    async def _call_service(self, request):
+        service = request.match_info["service"]
+        data = await request.json() if request.can_read_body else {}
+        entity_ids = data.get("entity_id") or []
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        changed = []
+        for entity_id in entity_ids:
+            current = self.states.get(entity_id)
+            if current is None:
+                continue
+            if service == "toggle":
+                new_state = "off" if current["state"] == "on" else "on"
+            else:
+                new_state = SERVICE_STATES.get(service)
+            if new_state is not None and new_state != current["state"]:
+                changed.append(self.update_state(entity_id, new_state, current["attributes"]))
+        return web.json_response(changed)
+
+    async def _stats(self, request):
+        return web.json_response(
+            {"requests": dict(self.requests), "errors": self.errors, "subscribers": len(self._subscribers)}
+        )
+
+    def update_state(self, entity_id, state, attributes):
+        """Change an entity and notify WebSocket subscribers."""
+        old_state = self.states.get(entity_id)
+        now = _now()
+        new_state = {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": attributes,
+            "last_changed": now if old_state is None or old_state["state"] != state else old_state["last_changed"],
+            "last_updated": now,
+            "context": {"id": f"{self.rng.getrandbits(64):016x}", "parent_id": None, "user_id": None},
+        }
+        self.states[entity_id] = new_state
+        event = {
+            "event_type": "state_changed",
+            "data": {"entity_id": entity_id, "old_state": old_state, "new_state": new_state},
+            "origin": "LOCAL",
+            "time_fired": now,
+        }
+        for ws, subscription_id in list(self._subscribers):
+            if not ws.closed:
+                asyncio.ensure_future(ws.send_json({"id": subscription_id, "type": "event", "event": event}))
+        return new_state
+
+    def drift_sensors(self):
+        """Random-walk the numeric sensors, as live power readings would."""
+        solar = float(self.states["sensor.solar"]["state"])
+        solar = min(4000.0, max(0.0, solar + self.rng.uniform(-300, 300)))
+        self.update_state("sensor.solar", f"{solar:.0f}", self.states["sensor.solar"]["attributes"])
+        cost = min(0.45, max(0.05, float(self.states["sensor.cost"]["state"]) + self.rng.uniform(-0.03, 0.03)))
+        self.update_state("sensor.cost", f"{cost:.2f}", self.states["sensor.cost"]["attributes"])
+
+    async def _websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"type": "auth_required", "ha_version": "2024.1.0"})
+        auth = await ws.receive_json()
+        if auth.get("access_token") != self.token:
+            await ws.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "auth_ok", "ha_version": "2024.1.0"})
+
+        subscription = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                message = msg.json()
+                if message.get("type") == "subscribe_events":
+                    subscription = (ws, message["id"])
+                    self._subscribers.append(subscription)
+                    await ws.send_json({"id": message["id"], "type": "result", "success": True, "result": None})
+                elif message.get("type") == "get_states":
+                    result = list(self.states.values())
+                    await ws.send_json({"id": message["id"], "type": "result", "success": True, "result": result})
+                else:
+                    await ws.send_json(
+                        {
+                            "id": message.get("id"),
+                            "type": "result",
+                            "success": False,
+                            "error": {"code": "unknown_command", "message": "Unknown command."},
+                        }
+                    )
+        finally:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+        return ws
+
+
+class FakeHomeAssistantServer:
+    """Runs a FakeHomeAssistant on its own event loop thread."""
+
+    def __init__(self, fake, host="127.0.0.1", port=0, drift_interval=0.0):
+        self.fake = fake
+        self.host = host
+        self.port = port
+        self.drift_interval = drift_interval
+        self.loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def base_url(self):
+        """REST API base URL, as passed to the add-on clients."""
+        return f"http://{self.host}:{self.port}/api"
+
+    @property
+    def ws_url(self):
+        """WebSocket API URL."""
+        return f"ws://{self.host}:{self.port}/api/websocket"
+
+    def start(self):
+        """Start serving and wait until the port is bound."""
+        self._thread.start()
+        self._started.wait(10)
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(10)
+
+    def call(self, function, *args):
+        """Run function on the server loop (for example ``fake.update_state``)."""
+
+        async def run():
+            return function(*args)
+
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result(10)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self._runner = web.AppRunner(self.fake.build_app(), access_log=None)
+        self.loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        if self.drift_interval:
+            self.loop.create_task(self._drift())
+        self._started.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _drift(self):
+        while True:
+            await asyncio.sleep(self.drift_interval)
+            self.fake.drift_sensors()
+
+
+def add_server_arguments(parser):
+    """Add the fake server options to an argument parser."""
+    parser.add_argument("--switches", type=int, default=100, help="number of switch entities")
+    parser.add_argument("--lights", type=int, default=20, help="number of light entities")
+    parser.add_argument("--sensors", type=int, default=500, help="number of filler sensor entities")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="added latency per REST request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra latency per REST request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of REST requests answered with 503")
+    parser.add_argument("--drift-interval", type=float, default=0.0, help="seconds between sensor updates (0 = off)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def server_from_args(args, port=0):
+    """Build a FakeHomeAssistantServer from parsed arguments."""
+    states = build_states(args.switches, args.lights, args.sensors, seed=args.seed)
+    fake = FakeHomeAssistant(
+        states, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=args.seed
+    )
+    return FakeHomeAssistantServer(fake, port=port, drift_interval=args.drift_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, port=args.port)
+    server.host = args.host
+    server.start()
+    print(f"Fake Home Assistant with {len(server.fake.states)} entities at {server.base_url} (token: {TOKEN})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
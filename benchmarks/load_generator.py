@@ -0,0 +1,192 @@
+"""Drive the add-on against the fake Home Assistant server and report latencies.
+
+Two workloads, run against one in-process fake HA (see ``fake_ha_server.py``):
+
+- ``cycle``: repeated ``EnergyManager.update_and_control`` runs, reporting cycle
+  latency percentiles, per-phase time and HA requests per cycle
+- ``api``: concurrent clients hitting the Flask API served on a local port,
+  reporting throughput and latency per route
+
+Usage:
+    python benchmarks/load_generator.py [--workload cycle|api|all] [--managed 50] [--cycles 30]
+                                        [--client-mode rest|websocket] [--switches 500] [--latency-ms 2]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from fake_ha_server import SENSOR_CONFIG, TOKEN, add_server_arguments, server_from_args
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import main as addon  # noqa: E402
+from device_registry import DeviceRegistry  # noqa: E402
+from energy_manager import CYCLE_PHASE_SECONDS, EnergyManager  # noqa: E402
+from ha_async_client import AsyncHomeAssistantClient  # noqa: E402
+from ha_client import HomeAssistantClient  # noqa: E402
+from ha_mirror import MirroredHomeAssistantClient  # noqa: E402
+
+API_ROUTES = [
+    "/api/energy/status",
+    "/api/devices",
+    "/api/devices/managed",
+    "/api/heating/comparison",
+    "/api/automation/status",
+    "/api/metrics",
+]
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(label, samples_ms):
+    """Print latency percentiles for a list of millisecond samples."""
+    print(
+        f"  {label:<28} n={len(samples_ms):<5} p50={percentile(samples_ms, 0.50):8.2f} ms  "
+        f"p95={percentile(samples_ms, 0.95):8.2f} ms  max={max(samples_ms):8.2f} ms  "
+        f"mean={statistics.mean(samples_ms):8.2f} ms"
+    )
+
+
+def build_manager(server, args):
+    """Create the add-on clients and an EnergyManager pointed at the fake server."""
+    options = {"base_url": server.base_url, "pool_size": args.pool_size}
+    if args.client_mode == "websocket":
+        ha_client = MirroredHomeAssistantClient(TOKEN, ws_url=server.ws_url, **options)
+        ha_client.start()
+        ha_client.wait_until_synced(10)
+    else:
+        ha_client = HomeAssistantClient(TOKEN, **options)
+    async_client = AsyncHomeAssistantClient(TOKEN, **options)
+
+    config = dict(SENSOR_CONFIG, automation_enabled=True, enable_battery_management=True)
+    manager = EnergyManager(ha_client, config, async_client=async_client)
+    if not args.persist:
+        # Keep benchmark runs from touching /data; use --persist to include storage writes
+        manager.save_managed_devices = lambda *args, **kwargs: None
+    manager.managed_devices = DeviceRegistry()
+
+    entity_ids = sorted(
+        entity_id for entity_id in server.fake.states if entity_id.split(".")[0] in ("switch", "light")
+    )[: args.managed]
+    for index, entity_id in enumerate(entity_ids):
+        manager.add_device(entity_id, priority=index % 10 + 1, power_consumption=500)
+    return ha_client, async_client, manager
+
+
+def run_cycles(server, manager, cycles):
+    """Benchmark update_and_control and report latency and HA traffic per cycle."""
+    loop = asyncio.new_event_loop()
+    phases = ("read", "publish", "decide", "actuate")
+    phase_before = {phase: CYCLE_PHASE_SECONDS.get_sum(phase=phase) for phase in phases}
+    requests_before = Counter(server.fake.requests)
+
+    samples = []
+    for _ in range(cycles):
+        start = time.perf_counter()
+        loop.run_until_complete(manager.update_and_control())
+        samples.append((time.perf_counter() - start) * 1000)
+        if server.drift_interval == 0:
+            # Keep decisions non-trivial without the drift task
+            server.call(server.fake.drift_sensors)
+    loop.run_until_complete(manager.async_client.close())
+    loop.close()
+
+    print(f"update_and_control over {cycles} cycles:")
+    summarize("cycle", samples)
+    for phase in phases:
+        spent = (CYCLE_PHASE_SECONDS.get_sum(phase=phase) - phase_before[phase]) * 1000 / cycles
+        print(f"  phase {phase:<22} mean={spent:8.2f} ms/cycle")
+    traffic = Counter(server.fake.requests)
+    traffic.subtract(requests_before)
+    for route, count in sorted(traffic.items()):
+        if count:
+            print(f"  HA {route:<37} {count / cycles:8.2f} req/cycle")
+
+
+def run_api(ha_client, manager, clients, duration):
+    """Serve the Flask API locally and hit it from concurrent clients."""
+    addon.ha_client = ha_client
+    addon.energy_manager = manager
+    http_server = make_server("127.0.0.1", 0, addon.app, threaded=True)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{http_server.server_port}"
+
+    latencies = {route: [] for route in API_ROUTES}
+    failures = Counter()
+    deadline = time.monotonic() + duration
+
+    def client(worker):
+        session = requests.Session()
+        index = worker
+        while time.monotonic() < deadline:
+            route = API_ROUTES[index % len(API_ROUTES)]
+            index += 1
+            start = time.perf_counter()
+            response = session.get(f"{base}{route}", timeout=30)
+            latencies[route].append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                failures[route] += 1
+        session.close()
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    http_server.shutdown()
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"Flask API with {clients} clients for {duration:.0f}s: {total / duration:.1f} req/s")
+    for route, samples in latencies.items():
+        if samples:
+            summarize(route, samples)
+        if failures[route]:
+            print(f"    {failures[route]} non-200 responses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workload", choices=["cycle", "api", "all"], default="all")
+    parser.add_argument("--client-mode", choices=["rest", "websocket"], default="rest")
+    parser.add_argument("--managed", type=int, default=50, help="number of managed devices")
+    parser.add_argument("--cycles", type=int, default=30)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent API clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of API load")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--persist", action="store_true", help="include managed-device writes to /data")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    # main.py configures INFO logging on import; per-request logs would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = server_from_args(args).start()
+    print(
+        f"Fake HA: {len(server.fake.states)} entities, latency {args.latency_ms} ms, "
+        f"error rate {args.error_rate:.1%}, client mode {args.client_mode}"
+    )
+    ha_client, _, manager = build_manager(server, args)
+    try:
+        if args.workload in ("cycle", "all"):
+            run_cycles(server, manager, args.cycles)
+        if args.workload in ("api", "all"):
+            run_api(ha_client, manager, args.clients, args.duration)
+    finally:
+        ha_client.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
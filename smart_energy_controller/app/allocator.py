@@ -0,0 +1,106 @@
+"""Fit devices into a power budget: a 0/1 knapsack with a bounded search."""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Tuple
+
+# Search nodes for one allocation; the greedy pass always completes, the search stops.
+# A count rather than a deadline keeps the chosen set the same on every run and machine.
+DEFAULT_NODE_BUDGET = 200
+
+
+@dataclass(frozen=True)
+class Allocation:
+    """The keys chosen to run, the power and value they add up to, and whether that is the best fit."""
+
+    chosen: Tuple = ()
+    power: float = 0.0
+    value: float = 0.0
+    optimal: bool = True
+
+
+def priority_weight(priority):
+    """Value of running a device: each priority step (1 highest, 10 lowest) halves it."""
+    return 2 ** (10 - min(max(int(priority), 1), 10))
+
+
+def allocate(items, budget, node_budget=DEFAULT_NODE_BUDGET):
+    """Choose the most valuable set of (key, power, value) items whose power fits budget.
+
+    Items with no power (not configured) always fit. The rest are packed
+    greedily by value per watt, which is O(n log n) and always completes,
+    then a branch-and-bound search of at most ``node_budget`` nodes replaces
+    the greedy set whenever it finds a more valuable one. ``optimal`` is
+    False when the search was cut short. The result depends only on the
+    inputs. Chosen keys keep the order of items.
+    """
+    keys, powers, values = zip(*items) if items else ((), (), ())
+    free = [i for i, power in enumerate(powers) if power <= 0]
+    # Negated so an ascending sort (stable: ties keep index order) puts the best value per watt first
+    density = [-value / power if 0 < power <= budget else 0.0 for power, value in zip(powers, values)]
+    order = sorted((i for i, power in enumerate(powers) if 0 < power <= budget), key=density.__getitem__)
+
+    taken, optimal = _pack([powers[i] for i in order], [values[i] for i in order], budget, node_budget)
+    picked = [order[i] for i in taken]
+    chosen = sorted(free + picked)
+    return Allocation(
+        chosen=tuple(keys[i] for i in chosen),
+        power=sum(powers[i] for i in picked),
+        value=sum(values[i] for i in chosen),
+        optimal=optimal,
+    )
+
+
+def _pack(powers, values, budget, node_budget):
+    """Return (indexes, optimal) for items sorted by decreasing value per watt."""
+    # Greedy: take every item that still fits, best value per watt first, until none can
+    best, best_value, room = None, 0, budget
+    smallest = min(powers, default=0)
+    for i, power in enumerate(powers):
+        if power <= room:
+            room -= power
+            best_value += values[i]
+            best = (i, best)
+            if room < smallest:
+                break
+    # Greedy alone can be arbitrarily bad when one large valuable item is crowded out
+    if values and max(values) > best_value:
+        best_value = max(values)
+        best = (values.index(best_value), None)
+
+    # Prefix sums give the fractional (LP) upper bound of any node in O(log n)
+    count = len(powers)
+    power_sums = list(accumulate(powers, initial=0))
+    value_sums = list(accumulate(values, initial=0))
+
+    # Depth-first, taking each item before skipping it; taken items are a linked list
+    stack = [(0, budget, 0, None)]
+    nodes = 0
+    while stack:
+        nodes += 1
+        if nodes > node_budget:
+            return _unlink(best), False
+        i, room, value, taken = stack.pop()
+        if value > best_value:
+            best, best_value = taken, value
+        if i == count:
+            continue
+        end = bisect_right(power_sums, power_sums[i] + room) - 1
+        bound = value + value_sums[end] - value_sums[i]
+        if end < count:
+            bound += (room - power_sums[end] + power_sums[i]) * values[end] / powers[end]
+        if bound <= best_value:
+            continue
+        stack.append((i + 1, room, value, taken))
+        if powers[i] <= room:
+            stack.append((i + 1, room - powers[i], value + values[i], (i, taken)))
+    return _unlink(best), True
+
+
+def _unlink(taken):
+    indexes = []
+    while taken is not None:
+        i, taken = taken
+        indexes.append(i)
+    return indexes
@@ -0,0 +1,156 @@
+"""Index of controllable Home Assistant devices, built from streamed state lists."""
+
+import codecs
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONTROLLABLE_DOMAINS = ("switch", "light", "button", "input_boolean")
+
+# Attributes kept for device listings; large blobs (effect lists, color data) are dropped
+DEVICE_ATTRIBUTES = ("friendly_name", "icon", "device_class", "supported_features", "assumed_state")
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(chunks, encoding="utf-8"):
+    """Yield the elements of a JSON array decoded incrementally from byte chunks.
+
+    Only the element being decoded and the unread part of the current chunk are
+    held in memory, so a large ``/states`` response never becomes one big list.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ""
+    started = False
+    finished = False
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        pos = 0
+        length = len(buffer)
+        while not finished:
+            while pos < length and (buffer[pos] in _WHITESPACE or (started and buffer[pos] == ",")):
+                pos += 1
+            if pos >= length:
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                break
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            if end >= length and isinstance(element, (int, float)):
+                break  # a number at the end of the buffer may continue in the next chunk
+            pos = end
+            yield element
+        buffer = buffer[pos:]
+        if finished:
+            return
+
+    if not finished:
+        raise ValueError("Truncated JSON array")
+
+
+def device_from_state(state):
+    """Build a device listing entry from an entity state, or None if not controllable."""
+    entity_id = state.get("entity_id", "")
+    domain = entity_id.split(".")[0] if "." in entity_id else ""
+    if domain not in CONTROLLABLE_DOMAINS:
+        return None
+    attributes = state.get("attributes") or {}
+    return {
+        "entity_id": entity_id,
+        "name": attributes.get("friendly_name", entity_id),
+        "state": state.get("state"),
+        "domain": domain,
+        "attributes": {key: attributes[key] for key in DEVICE_ATTRIBUTES if key in attributes},
+    }
+
+
+class DeviceIndex:
+    """Controllable devices grouped by domain.
+
+    Rebuilt from a full state list when older than ``max_age`` seconds and
+    otherwise kept current one entity at a time, either from state_changed
+    events or by re-reading entities marked dirty after a write.
+    """
+
+    def __init__(self, max_age=300.0):
+        """Initialize an empty index."""
+        self.max_age = max_age
+        self._by_domain = {domain: {} for domain in CONTROLLABLE_DOMAINS}
+        self._dirty = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tracks(entity_id):
+        """Whether an entity belongs in the index."""
+        return entity_id.split(".")[0] in CONTROLLABLE_DOMAINS
+
+    @property
+    def is_loaded(self):
+        """Whether the index has been built at least once."""
+        return self._loaded_at is not None
+
+    def is_stale(self):
+        """Whether the index needs a full rebuild."""
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+
+    def replace(self, states):
+        """Rebuild the index from an iterable of entity states."""
+        by_domain = {domain: {} for domain in CONTROLLABLE_DOMAINS}
+        for state in states:
+            device = device_from_state(state)
+            if device is not None:
+                by_domain[device["domain"]][device["entity_id"]] = device
+        with self._lock:
+            self._by_domain = by_domain
+            self._dirty.clear()
+            self._loaded_at = time.monotonic()
+        logger.debug(f"Device index rebuilt ({sum(len(devices) for devices in by_domain.values())} devices)")
+
+    def apply(self, entity_id, state):
+        """Update one entity; a state of None removes it."""
+        if not entity_id or not self.tracks(entity_id):
+            return
+        device = device_from_state(state) if state is not None else None
+        with self._lock:
+            devices = self._by_domain[entity_id.split(".")[0]]
+            if device is None:
+                devices.pop(entity_id, None)
+            else:
+                devices[entity_id] = device
+            self._dirty.discard(entity_id)
+
+    def mark_dirty(self, entity_ids):
+        """Flag indexed entities whose state is known to have changed."""
+        with self._lock:
+            self._dirty.update(entity_id for entity_id in entity_ids if self.tracks(entity_id))
+
+    def pop_dirty(self):
+        """Take the set of entities waiting to be re-read."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def devices(self, domain=None):
+        """List indexed devices, optionally for one domain."""
+        with self._lock:
+            if domain is not None:
+                return list(self._by_domain.get(domain, {}).values())
+            return [device for devices in self._by_domain.values() for device in devices.values()]
+
+    def __len__(self):
+        return sum(len(devices) for devices in self._by_domain.values())
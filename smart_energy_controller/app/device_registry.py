@@ -0,0 +1,181 @@
+"""Typed managed-device model and a registry with maintained indexes."""
+
+import logging
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Optional
+
+from planner import DeviceSnapshot, is_heating_device
+from schedule import CompiledSchedule, compile_schedule
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ManagedDevice:
+    """A managed device's validated settings and control history."""
+
+    entity_id: str
+    priority: int = 5
+    power_consumption: float = 0
+    enabled: bool = True
+    allow_direct_control: bool = True
+    schedule: dict = field(default_factory=dict)  # stored form, see schedule.compile_schedule
+    auto_start_automation: Optional[str] = None
+    required_run_duration: int = 0
+    last_controlled: Optional[str] = None
+    last_heating_change: Optional[str] = None
+    extra: dict = field(default_factory=dict)  # unknown stored keys, kept for round-tripping
+    heating: bool = field(init=False)
+    compiled_schedule: Optional[CompiledSchedule] = field(init=False)
+
+    def __post_init__(self):
+        """Derive the heating flag and compile the schedule; raises ValueError if it is invalid."""
+        self.heating = is_heating_device(self.entity_id)
+        try:
+            self.compiled_schedule = compile_schedule(self.schedule)
+        except ValueError as e:
+            raise ValueError(f"{self.entity_id}: {e}") from e
+
+    @classmethod
+    def from_dict(cls, entity_id, info):
+        """Parse a stored or API device dict; raises ValueError if a field is invalid."""
+        info = dict(info)
+        try:
+            priority = int(info.pop("priority", 5))
+            power_consumption = float(info.pop("power_consumption", 0) or 0)
+            required_run_duration = int(info.pop("required_run_duration", 0) or 0)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{entity_id}: {e}") from e
+        if power_consumption < 0 or required_run_duration < 0:
+            raise ValueError(f"{entity_id}: power and run duration cannot be negative")
+
+        return cls(
+            entity_id=entity_id,
+            priority=priority,
+            power_consumption=power_consumption,
+            enabled=bool(info.pop("enabled", True)),
+            allow_direct_control=bool(info.pop("allow_direct_control", True)),
+            schedule=info.pop("schedule", None) or {},
+            auto_start_automation=info.pop("auto_start_automation", None),
+            required_run_duration=required_run_duration,
+            last_controlled=info.pop("last_controlled", None),
+            last_heating_change=info.pop("last_heating_change", None),
+            extra=info,
+        )
+
+    def to_dict(self):
+        """Serialize to the stored dict format."""
+        return {
+            **self.extra,
+            "priority": self.priority,
+            "power_consumption": self.power_consumption,
+            "enabled": self.enabled,
+            "last_controlled": self.last_controlled,
+            "last_heating_change": self.last_heating_change,
+            "schedule": dict(self.schedule),
+            "allow_direct_control": self.allow_direct_control,
+            "auto_start_automation": self.auto_start_automation,
+            "required_run_duration": self.required_run_duration,
+        }
+
+    def snapshot(self, state=None):
+        """Freeze the fields the planner needs, with the device's current HA state."""
+        return DeviceSnapshot(
+            entity_id=self.entity_id,
+            state=state.get("state") if state else None,
+            priority=self.priority,
+            enabled=self.enabled,
+            allow_direct_control=self.allow_direct_control,
+            schedule=self.compiled_schedule,
+            last_heating_change=self.last_heating_change,
+            heating=self.heating,
+            power=self.power_consumption,
+            last_controlled=self.last_controlled,
+        )
+
+
+class DeviceRegistry(Mapping):
+    """Managed devices by entity_id, with priority-ordered indexes kept up to date.
+
+    As a Mapping it yields each device's stored dict (a fresh copy), which is
+    what the persistence layer and the API consume; change devices through
+    add(), update(), remove() and the mark_* methods. The index tuples are
+    rebuilt only when settings change, so a control cycle iterates them as is.
+
+    Stored entries that fail validation are kept as they were in ``rejected``:
+    they are saved back unchanged and can be fixed with update(), but are left
+    out of device() and the indexes, so they are never controlled.
+    """
+
+    def __init__(self, devices=None):
+        """Initialize from a {entity_id: dict} mapping, setting aside invalid entries."""
+        self._devices = {}
+        self.rejected = {}
+        for entity_id, info in (devices or {}).items():
+            try:
+                self._devices[entity_id] = ManagedDevice.from_dict(entity_id, info)
+            except ValueError as e:
+                logger.error(f"Not controlling invalid managed device (kept in storage): {e}")
+                self.rejected[entity_id] = info
+        self._reindex()
+
+    def __getitem__(self, entity_id):
+        device = self._devices.get(entity_id)
+        if device is None:
+            return dict(self.rejected[entity_id])
+        return device.to_dict()
+
+    def __iter__(self):
+        return chain(self._devices, self.rejected)
+
+    def __len__(self):
+        return len(self._devices) + len(self.rejected)
+
+    def __contains__(self, entity_id):
+        return entity_id in self._devices or entity_id in self.rejected
+
+    def device(self, entity_id):
+        """Return the ManagedDevice for entity_id, or None."""
+        return self._devices.get(entity_id)
+
+    def devices(self):
+        """Return all devices in insertion order."""
+        return list(self._devices.values())
+
+    def add(self, device):
+        """Add or replace a device."""
+        self.rejected.pop(device.entity_id, None)
+        self._devices[device.entity_id] = device
+        self._reindex()
+
+    def update(self, entity_id, **changes):
+        """Change stored fields of a device (validated like from_dict); returns the new device.
+
+        A rejected entry that validates after the change becomes a device again.
+        """
+        device = ManagedDevice.from_dict(entity_id, {**self[entity_id], **changes})
+        self.add(device)
+        return device
+
+    def remove(self, entity_id):
+        """Remove a device; returns False if it was not managed."""
+        if self._devices.pop(entity_id, None) is None and self.rejected.pop(entity_id, None) is None:
+            return False
+        self._reindex()
+        return True
+
+    def mark_controlled(self, entity_id, when):
+        """Record when the controller last switched a device."""
+        self._devices[entity_id].last_controlled = when
+
+    def mark_heating_change(self, entity_id, when):
+        """Record when a heating device last changed state."""
+        self._devices[entity_id].last_heating_change = when
+
+    def _reindex(self):
+        # Stable sort: equal priorities keep the order devices were added in
+        self.by_priority = tuple(sorted(self._devices.values(), key=lambda device: device.priority))
+        self.enabled = tuple(device for device in self.by_priority if device.enabled)
+        self.controllable = tuple(device for device in self.enabled if device.allow_direct_control)
@@ -0,0 +1,174 @@
+"""Crash-safe, write-coalescing storage for the managed-devices file."""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PERSIST_SECONDS = registry.histogram("sec_persist_duration_seconds", "Time to save managed devices to storage")
+PERSIST_SAVES = registry.counter("sec_persist_saves_total", "Managed device save requests by outcome", ("result",))
+
+
+def write_json_atomic(path, data):
+    """Write data as JSON so that path holds either the old or the new content, never a mix.
+
+    The JSON goes to a temporary file in the same directory, which is fsynced
+    and renamed over path; the directory is fsynced so the rename survives a
+    power cut.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass  # not supported on every filesystem
+    finally:
+        os.close(dir_fd)
+
+
+class DeviceStore:
+    """Persists the managed-devices mapping with dirty tracking and coalesced writes.
+
+    Changes are recorded with mark_dirty(). save() writes immediately when
+    forced and otherwise at most once per ``flush_interval`` seconds, with a
+    timer writing whatever is still pending at the end of the interval. Nothing
+    is written when nothing changed. close() writes pending changes on shutdown.
+    """
+
+    def __init__(self, path, flush_interval=30.0):
+        """Initialize the store for the JSON file at path."""
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._dirty = set()
+        self._devices = None
+        self._last_write = None
+        self._timer = None
+        self.writes = 0
+        self.failures = 0
+
+    def load(self):
+        """Read the stored devices, or an empty mapping if there are none."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading managed devices: {e}")
+        return {}
+
+    @property
+    def dirty(self):
+        """Whether there are changes that have not been written yet."""
+        return bool(self._dirty)
+
+    def mark_dirty(self, entity_id=None):
+        """Record that a device (or, with None, the mapping as a whole) changed."""
+        with self._lock:
+            self._dirty.add(entity_id)
+
+    def save(self, devices, force=False):
+        """Write devices if they changed; returns True if the file was written.
+
+        ``devices`` is a mapping of entity_id to the device's stored dict; it is
+        kept and read again when a deferred write happens.
+
+        Unforced saves within ``flush_interval`` of the previous write are
+        deferred to a timer.
+        """
+        with self._lock:
+            self._devices = devices
+            if not self._dirty:
+                PERSIST_SAVES.inc(result="clean")
+                return False
+            if not force and self._last_write is not None:
+                wait = self._last_write + self.flush_interval - time.monotonic()
+                if wait > 0:
+                    PERSIST_SAVES.inc(result="deferred")
+                    self._schedule(wait)
+                    return False
+            return self._write()
+
+    def flush(self):
+        """Write pending changes now; returns True if the file was written."""
+        with self._lock:
+            if not self._dirty or self._devices is None:
+                return False
+            return self._write()
+
+    def close(self, devices=None):
+        """Cancel the flush timer and write pending changes."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if devices is not None:
+                self._devices = devices
+            return self.flush()
+
+    def get_stats(self):
+        """Return write statistics."""
+        with self._lock:
+            return {
+                "writes": self.writes,
+                "failures": self.failures,
+                "pending": len(self._dirty),
+                "flush_interval": self.flush_interval,
+            }
+
+    def _schedule(self, wait):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(wait, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self.flush()
+
+    def _write(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        changed = len(self._dirty)
+        try:
+            with PERSIST_SECONDS.time():
+                self._persist(self._devices, self._dirty)
+        except Exception as e:
+            self.failures += 1
+            PERSIST_SAVES.inc(result="failed")
+            logger.error(f"Error saving managed devices: {e}")
+            return False
+        self._dirty.clear()
+        self._last_write = time.monotonic()
+        self.writes += 1
+        PERSIST_SAVES.inc(result="written")
+        logger.debug(f"Saved managed devices ({changed} changes)")
+        return True
+
+    def _persist(self, devices, dirty):
+        """Write the changed devices; the JSON file is always rewritten whole."""
+        write_json_atomic(self.path, dict(devices))
@@ -1,43 +1,150 @@
 """Energy management logic."""
 
-import json
+import asyncio
+import dataclasses
 import logging
-import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from device_registry import DeviceRegistry, ManagedDevice
+from device_store import DeviceStore
+from forecast import LINEAR, STEP, ForecastCache, ParsedForecast
+from ha_client import HomeAssistantUnavailable, ServiceCallBatch, StateSnapshot
+from metrics import registry
+from planner import (
+    BATTERY_LEVEL_THRESHOLDS,
+    BATTERY_POWER_THRESHOLDS,
+    COST_THRESHOLDS,
+    MODE_SMART,
+    SOLAR_THRESHOLDS,
+    ControlSnapshot,
+    available_surplus,
+    battery_near_full,
+    next_allowed_window,
+    plan_actions,
+    plan_free_session,
+    plan_saving_session,
+    plan_smart_control,
+    recently_switched,
+    smallest_start,
+    threshold_band,
+)
+from publisher import StatePublisher
+from run_planner import Run, plan_runs
+from schedule import compile_schedule, minute_of_week
+from sqlite_store import SQLiteDeviceStore
+from timeseries import TimeSeriesStore
+
 logger = logging.getLogger(__name__)
 
+MANAGED_DEVICES_FILE = "/data/managed_devices.json"
+MANAGED_DEVICES_DB = "/data/smart_energy.db"
+
+SESSION_ACTIVE_STATES = ("on", "true", "active")
+
+# Sensors the surplus is computed from, by the ControlSnapshot field they are read into
+SURPLUS_INPUTS = {
+    "solar_sensor": "solar_generation",
+    "house_load_sensor": "house_load",
+    "battery_power_sensor": "battery_power",
+}
+
+# Forecast kinds: (config key of the sensor, key of the value in each forecast point)
+FORECASTS = {
+    "solar": ("solar_forecast_sensor", "power", LINEAR),
+    "cost": ("electricity_forecast_sensor", "cost_per_kwh", STEP),
+}
+
+CYCLE_SECONDS = registry.histogram("sec_cycle_duration_seconds", "Duration of one automation cycle")
+CYCLE_PHASE_SECONDS = registry.histogram(
+    "sec_cycle_phase_duration_seconds", "Duration of each automation cycle phase", ("phase",)
+)
+CYCLES_SKIPPED = registry.counter("sec_cycles_skipped_total", "Automation cycles skipped while HA was unavailable")
+CONTROL_DECISIONS = registry.counter(
+    "sec_control_decisions_total", "Device switch decisions made by the automation", ("reason",)
+)
+
 
 class EnergyManager:
     """Manages energy automation and device control."""
 
-    def __init__(self, ha_client, config):
-        """Initialize the energy manager."""
+    def __init__(self, ha_client, config, async_client=None):
+        """Initialize the energy manager.
+
+        ``async_client`` is an optional AsyncHomeAssistantClient used by the
+        automation loop to actuate devices concurrently.
+        """
         self.ha_client = ha_client
+        self.async_client = async_client
         self.config = config
-        self.managed_devices = self.load_managed_devices()
+        self.store = self._create_store(config)
+        # Control and sensor history is only kept by the SQLite backend
+        self.history = self.store if isinstance(self.store, SQLiteDeviceStore) else None
+        self.managed_devices = DeviceRegistry(self.load_managed_devices())
         self.automation_enabled = config.get("automation_enabled", True)
+        # Forecasts are resampled onto cells of this many seconds before slot search
+        self.forecast_step = max(1, int(config.get("forecast_resolution", 15))) * 60
+        self._cycle = threading.local()
+        self.trigger_thresholds = self._trigger_thresholds()
+        self.surplus_sensors = {
+            self.config[key]: field
+            for key, field in SURPLUS_INPUTS.items()
+            if self.config.get(key) and self.config[key] in self.trigger_thresholds
+        }
+        self.timeseries = TimeSeriesStore(
+            raw_capacity=config.get("timeseries_raw_points", 2880),
+            tiers=((60, 86400), (900, config.get("timeseries_retention_days", 30) * 86400)),
+        )
+        self.last_control = None
+        self.forecasts = ForecastCache()
+        self.publisher = StatePublisher(
+            ha_client,
+            deadbands=self._parse_deadbands(config.get("publish_deadbands")),
+            refresh_interval=config.get("publish_refresh_interval", 300),
+        )
+
+    @staticmethod
+    def _parse_deadbands(deadbands):
+        """Normalize publish deadbands from a mapping or a list of {'entity_id', 'deadband'} options."""
+        if not deadbands:
+            return {}
+        if isinstance(deadbands, dict):
+            return {entity_id: float(value) for entity_id, value in deadbands.items()}
+        return {item["entity_id"]: float(item["deadband"]) for item in deadbands}
+
+    @staticmethod
+    def _create_store(config):
+        """Create the managed-device store for the configured storage backend."""
+        flush_interval = config.get("persist_flush_interval", 30)
+        if config.get("storage_backend", "json") == "sqlite":
+            return SQLiteDeviceStore(
+                MANAGED_DEVICES_DB,
+                json_path=MANAGED_DEVICES_FILE,
+                flush_interval=flush_interval,
+                retention_days=config.get("history_retention_days", 30),
+            )
+        return DeviceStore(MANAGED_DEVICES_FILE, flush_interval=flush_interval)
 
     def load_managed_devices(self):
         """Load managed devices from storage."""
-        devices_file = "/data/managed_devices.json"
-        if os.path.exists(devices_file):
-            try:
-                with open(devices_file, "r") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error loading managed devices: {e}")
-        return {}
-
-    def save_managed_devices(self):
-        """Save managed devices to storage."""
-        devices_file = "/data/managed_devices.json"
-        try:
-            os.makedirs("/data", exist_ok=True)
-            with open(devices_file, "w") as f:
-                json.dump(self.managed_devices, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving managed devices: {e}")
+        return self.store.load()
+
+    def save_managed_devices(self, entity_id=None, deferred=False):
+        """Save managed devices to storage.
+
+        Immediate saves mark ``entity_id`` (or, with None, every device) as
+        changed. Deferred saves only write devices already marked dirty, at most
+        once per ``persist_flush_interval``.
+        """
+        if not deferred:
+            self.store.mark_dirty(entity_id)
+        self.store.save(self.managed_devices, force=not deferred)
+
+    def close(self):
+        """Write pending changes before shutdown."""
+        self.store.close(self.managed_devices)
 
     def add_device(
         self,
@@ -49,66 +156,118 @@ class EnergyManager:
         auto_start_automation=None,
         required_run_duration=0,
     ):
-        """Add a device to energy management."""
-        self.managed_devices[entity_id] = {
-            "priority": priority,
-            "power_consumption": power_consumption,
-            "enabled": True,
-            "last_controlled": None,
-            "last_heating_change": None,
-            "schedule": schedule or {},  # {'start': '08:00', 'end': '22:00', 'days': [0,1,2,3,4,5,6]}
-            "allow_direct_control": allow_direct_control,
-            "auto_start_automation": auto_start_automation,  # HA automation/script to trigger
-            "required_run_duration": required_run_duration,  # Minutes needed for device
-        }
-        self.save_managed_devices()
+        """Add a device to energy management; raises ValueError for invalid settings."""
+        compile_schedule(schedule, strict=True)
+        device = ManagedDevice.from_dict(
+            entity_id,
+            {
+                "priority": priority,
+                "power_consumption": power_consumption,
+                "schedule": schedule or {},  # {'start': '08:00', 'end': '22:00', 'days': [0,1,2,3,4,5,6]}
+                "allow_direct_control": allow_direct_control,
+                "auto_start_automation": auto_start_automation,  # HA automation/script to trigger
+                "required_run_duration": required_run_duration,  # Minutes needed for device
+            },
+        )
+        self.managed_devices.add(device)
+        self.save_managed_devices(entity_id)
         logger.info(f"Added device {entity_id} to energy management")
         self._publish_device_entity(entity_id)
 
     def remove_device(self, entity_id):
         """Remove a device from energy management."""
-        if entity_id in self.managed_devices:
-            del self.managed_devices[entity_id]
-            self.save_managed_devices()
+        if self.managed_devices.remove(entity_id):
+            self.save_managed_devices(entity_id)
+            self.publisher.forget(f"sensor.sec_{entity_id.replace('.', '_')}_config")
             logger.info(f"Removed device {entity_id} from energy management")
 
+    def update_device(self, entity_id, **changes):
+        """Change a managed device's settings; returns False if it is not managed.
+
+        Raises ValueError for invalid settings.
+        """
+        if entity_id not in self.managed_devices:
+            return False
+        if "schedule" in changes:
+            compile_schedule(changes["schedule"], strict=True)
+        self.managed_devices.update(entity_id, **changes)
+        self.save_managed_devices(entity_id)
+        self._publish_device_entity(entity_id)
+        return True
+
     def get_managed_devices(self):
         """Get all managed devices with current state."""
         devices = []
-        for entity_id, device_info in self.managed_devices.items():
-            state = self.ha_client.get_state(entity_id)
+        for device in self.managed_devices.devices():
+            state = self.ha_client.get_state(device.entity_id)
             if state:
                 devices.append(
                     {
-                        "entity_id": entity_id,
-                        "name": state.get("attributes", {}).get("friendly_name", entity_id),
+                        "entity_id": device.entity_id,
+                        "name": state.get("attributes", {}).get("friendly_name", device.entity_id),
                         "state": state.get("state"),
-                        "priority": device_info["priority"],
-                        "power_consumption": device_info["power_consumption"],
-                        "enabled": device_info["enabled"],
+                        "priority": device.priority,
+                        "power_consumption": device.power_consumption,
+                        "enabled": device.enabled,
                     }
                 )
         return devices
 
+    @contextmanager
+    def state_snapshot(self):
+        """Resolve all state reads in this block against one bulk snapshot."""
+        snapshot = getattr(self._cycle, "snapshot", None)
+        if snapshot is not None:
+            yield snapshot
+            return
+
+        snapshot = StateSnapshot.from_client(self.ha_client)
+        self._cycle.snapshot = snapshot
+        try:
+            yield snapshot
+        finally:
+            self._cycle.snapshot = None
+
+    def _get_state(self, entity_id):
+        """Get entity state from the active snapshot, or from HA directly."""
+        snapshot = getattr(self._cycle, "snapshot", None)
+        if snapshot is not None:
+            return snapshot.get_state(entity_id)
+        return self.ha_client.get_state(entity_id)
+
+    def _get_sensor_value(self, entity_id):
+        """Get sensor value from the active snapshot, or from HA directly."""
+        snapshot = getattr(self._cycle, "snapshot", None)
+        if snapshot is not None:
+            return snapshot.get_sensor_value(entity_id)
+        return self.ha_client.get_sensor_value(entity_id)
+
     def get_solar_generation(self):
         """Get current solar generation."""
         sensor = self.config.get("solar_sensor")
         if sensor:
-            return self.ha_client.get_sensor_value(sensor)
+            return self._get_sensor_value(sensor)
         return 0.0
 
+    def get_house_load(self):
+        """Get current household consumption in Watts, or None if not configured."""
+        sensor = self.config.get("house_load_sensor")
+        if sensor:
+            return self._get_sensor_value(sensor)
+        return None
+
     def get_electricity_cost(self):
         """Get current electricity cost."""
         sensor = self.config.get("electricity_cost_sensor")
         if sensor:
-            return self.ha_client.get_sensor_value(sensor)
+            return self._get_sensor_value(sensor)
         return 0.0
 
     def get_gas_cost(self):
         """Get current gas cost."""
         sensor = self.config.get("gas_cost_sensor")
         if sensor:
-            return self.ha_client.get_sensor_value(sensor)
+            return self._get_sensor_value(sensor)
         return 0.0
 
     def get_battery_level(self):
@@ -117,7 +276,7 @@ class EnergyManager:
             return None
         sensor = self.config.get("battery_level_sensor")
         if sensor:
-            return self.ha_client.get_sensor_value(sensor)
+            return self._get_sensor_value(sensor)
         return None
 
     def get_battery_power(self):
@@ -126,7 +285,7 @@ class EnergyManager:
             return None
         sensor = self.config.get("battery_power_sensor")
         if sensor:
-            return self.ha_client.get_sensor_value(sensor)
+            return self._get_sensor_value(sensor)
         return None
 
     def get_battery_capacity(self):
@@ -139,7 +298,7 @@ class EnergyManager:
         """Check if currently in a free electric session."""
         sensors = self.config.get("free_session_sensors", [])
         for sensor in sensors:
-            state = self.ha_client.get_state(sensor)
+            state = self._get_state(sensor)
             if state and state.get("state") in ["on", "true", "active"]:
                 return True
         return False
@@ -148,7 +307,7 @@ class EnergyManager:
         """Check if currently in a saving session (should turn off devices)."""
         sensors = self.config.get("saving_session_sensors", [])
         for sensor in sensors:
-            state = self.ha_client.get_state(sensor)
+            state = self._get_state(sensor)
             if state and state.get("state") in ["on", "true", "active"]:
                 return True
         return False
@@ -207,6 +366,8 @@ class EnergyManager:
             "is_saving_session": self.is_saving_session(),
             "automation_enabled": self.automation_enabled,
             "managed_device_count": len(self.managed_devices),
+            "enabled_device_count": len(self.managed_devices.enabled),
+            "controllable_device_count": len(self.managed_devices.controllable),
             "timestamp": datetime.now().isoformat(),
         }
 
@@ -234,7 +395,7 @@ class EnergyManager:
 
             # Publish solar generation sensor
             if status.get("solar_generation") is not None:
-                self.ha_client.set_state(
+                self.publisher.publish(
                     "sensor.sec_solar_generation",
                     {
                         "state": status["solar_generation"],
@@ -249,7 +410,7 @@ class EnergyManager:
 
             # Publish electricity cost sensor
             if status.get("electricity_cost") is not None:
-                self.ha_client.set_state(
+                self.publisher.publish(
                     "sensor.sec_electricity_cost",
                     {
                         "state": status["electricity_cost"],
@@ -263,7 +424,7 @@ class EnergyManager:
 
             # Publish gas cost sensor
             if status.get("gas_cost") is not None:
-                self.ha_client.set_state(
+                self.publisher.publish(
                     "sensor.sec_gas_cost",
                     {
                         "state": status["gas_cost"],
@@ -278,7 +439,7 @@ class EnergyManager:
             # Publish battery sensors if enabled
             if self.config.get("enable_battery_management", False):
                 if status.get("battery_level") is not None:
-                    self.ha_client.set_state(
+                    self.publisher.publish(
                         "sensor.sec_battery_level",
                         {
                             "state": status["battery_level"],
@@ -292,7 +453,7 @@ class EnergyManager:
                     )
 
                 if status.get("battery_power") is not None:
-                    self.ha_client.set_state(
+                    self.publisher.publish(
                         "sensor.sec_battery_power",
                         {
                             "state": status["battery_power"],
@@ -307,7 +468,7 @@ class EnergyManager:
                     )
 
             # Publish automation status sensor
-            self.ha_client.set_state(
+            self.publisher.publish(
                 "sensor.sec_automation_status",
                 {
                     "state": "enabled" if status["automation_enabled"] else "disabled",
@@ -336,6 +497,91 @@ class EnergyManager:
         """Check if automation is enabled."""
         return self.automation_enabled
 
+    def _trigger_thresholds(self):
+        """Map decision-input sensors to the thresholds their changes are compared against."""
+        thresholds = {}
+        for sensor in self.config.get("free_session_sensors", []) + self.config.get("saving_session_sensors", []):
+            thresholds[sensor] = None  # session sensors trigger on start/end
+        # The house load has no fixed thresholds; it counts through the surplus (see is_trigger)
+        inputs = [
+            ("solar_sensor", SOLAR_THRESHOLDS),
+            ("electricity_cost_sensor", COST_THRESHOLDS),
+            ("house_load_sensor", ()),
+        ]
+        if self.config.get("enable_battery_management", False):
+            inputs += [
+                ("battery_level_sensor", BATTERY_LEVEL_THRESHOLDS),
+                ("battery_power_sensor", BATTERY_POWER_THRESHOLDS),
+            ]
+        for key, values in inputs:
+            if self.config.get(key):
+                thresholds[self.config[key]] = values
+        return thresholds
+
+    def is_trigger(self, entity_id, old_state, new_state):
+        """Check whether a state change could change the next control decision.
+
+        Numeric inputs only count when they cross a decision threshold, or for
+        the inputs of the surplus, when they move last cycle's surplus across
+        the power of the smallest device that could start. Session sensors count
+        when a session starts or ends, and managed devices when their on/off
+        state changes other than by the controller's own recent action. An
+        entity_id of None (for example after a state resync) always counts.
+        """
+        if entity_id is None:
+            return True
+        thresholds = self.trigger_thresholds
+        if entity_id in thresholds:
+            if thresholds[entity_id] is None:
+                return (_state_of(old_state) in SESSION_ACTIVE_STATES) != (
+                    _state_of(new_state) in SESSION_ACTIVE_STATES
+                )
+            values = thresholds[entity_id]
+            return _band(old_state, values) != _band(new_state, values) or self._moves_surplus(entity_id, new_state)
+
+        device = self.managed_devices.device(entity_id)
+        if device is None or _state_of(old_state) == _state_of(new_state):
+            return False
+        return not recently_switched(device, datetime.now())
+
+    def _moves_surplus(self, entity_id, new_state):
+        """Check whether a surplus input's new reading moves last cycle's surplus across smallest_start."""
+        field = self.surplus_sensors.get(entity_id)
+        control = self.last_control
+        if field is None or control is None:
+            return False
+        step = smallest_start(control)
+        if step is None:
+            return False
+        try:
+            updated = dataclasses.replace(control, **{field: float(_state_of(new_state))})
+        except (TypeError, ValueError):
+            return False
+        before = available_surplus(control, battery_near_full(control))
+        after = available_surplus(updated, battery_near_full(updated))
+        return (before >= step) != (after >= step)
+
+    def cadence_inputs(self):
+        """Readings from the last cycle with the thresholds they are decided against.
+
+        The surplus (from solar, house load and battery) is decided against the
+        power of the smallest device that could start. Empty when there is
+        nothing to control, so the loop can back off.
+        """
+        control = self.last_control
+        if control is None or not self.managed_devices:
+            return {}
+        inputs = {
+            "solar": (control.solar_generation, SOLAR_THRESHOLDS),
+            "cost": (control.electricity_cost, COST_THRESHOLDS),
+        }
+        if control.battery_level is not None:
+            inputs["battery_level"] = (control.battery_level, BATTERY_LEVEL_THRESHOLDS)
+        step = smallest_start(control)
+        if step is not None:
+            inputs["surplus"] = (available_surplus(control, battery_near_full(control)), (step,))
+        return inputs
+
     async def update_and_control(self):
         """Main automation logic to control devices based on energy conditions."""
         if not self.automation_enabled:
@@ -343,190 +589,195 @@ class EnergyManager:
 
         logger.info("Running automation update...")
 
-        # Publish system sensors to Home Assistant
-        self.publish_system_sensors()
-
-        # Get current conditions
-        solar_generation = self.get_solar_generation()
-        electricity_cost = self.get_electricity_cost()
-        is_free_session = self.is_free_electric_session()
-        is_saving_session = self.is_saving_session()
+        try:
+            with CYCLE_SECONDS.time():
+                await self._run_cycle()
+        except HomeAssistantUnavailable as e:
+            # Acting on fake zero readings could switch everything off; wait for HA instead
+            CYCLES_SKIPPED.inc()
+            logger.warning(f"Home Assistant unavailable - skipping automation cycle: {e}")
+
+    async def _run_cycle(self):
+        """Read state, decide and act for one automation cycle."""
+        read_start = time.perf_counter()
+        # Every read in this cycle resolves against one consistent bulk snapshot
+        with self.state_snapshot() as snapshot:
+            logger.debug(f"Cycle snapshot holds {len(snapshot)} entities")
+
+            # Capture current conditions and device states
+            control = self.build_control_snapshot()
+            self.last_control = control
+            samples = self._sample_values(control)
+            self.timeseries.record_many(samples)
+            if self.history is not None:
+                self.history.record_samples(samples)
+            # Reparse forecasts that changed while this snapshot is at hand; the API reuses them
+            self._enabled_forecasts()
+            CYCLE_PHASE_SECONDS.observe(time.perf_counter() - read_start, phase="read")
+
+            # Publish system sensors to Home Assistant
+            with CYCLE_PHASE_SECONDS.time(phase="publish"):
+                self.publish_system_sensors()
+
+            logger.info(
+                f"Solar: {control.solar_generation}W, Cost: {control.electricity_cost}, "
+                f"Free: {control.is_free_session}, Saving: {control.is_saving_session}"
+            )
 
-        logger.info(
-            f"Solar: {solar_generation}W, Cost: {electricity_cost}, "
-            f"Free: {is_free_session}, Saving: {is_saving_session}"
+            # Saving sessions shed load, free sessions run everything, otherwise smart control
+            await self.apply_plan(self._plan(plan_actions, control))
+
+    def build_control_snapshot(self, solar_generation=None, electricity_cost=None):
+        """Capture everything the planner needs from current state."""
+        return ControlSnapshot(
+            now=datetime.now(),
+            solar_generation=self.get_solar_generation() if solar_generation is None else solar_generation,
+            electricity_cost=self.get_electricity_cost() if electricity_cost is None else electricity_cost,
+            # Disabled devices never act, so neither their state nor their settings are captured
+            devices=tuple(
+                device.snapshot(self._get_state(device.entity_id)) for device in self.managed_devices.enabled
+            ),
+            is_free_session=self.is_free_electric_session(),
+            is_saving_session=self.is_saving_session(),
+            battery_level=self.get_battery_level(),
+            battery_power=self.get_battery_power(),
+            house_load=self.get_house_load(),
+            heating_min_change_interval=self.config.get("heating_min_change_interval", 900),
         )
 
-        # During saving sessions, turn off non-essential devices
-        if is_saving_session:
-            await self.handle_saving_session()
-            return
-
-        # During free sessions, turn on all devices
-        if is_free_session:
-            await self.handle_free_session()
-            return
-
-        # Smart control based on solar and pricing
-        await self.handle_smart_control(solar_generation, electricity_cost)
+    def _sample_values(self, control):
+        """Map configured input sensors to the readings captured in a snapshot."""
+        readings = [
+            ("solar_sensor", control.solar_generation),
+            ("electricity_cost_sensor", control.electricity_cost),
+            ("battery_level_sensor", control.battery_level),
+            ("battery_power_sensor", control.battery_power),
+            ("house_load_sensor", control.house_load),
+        ]
+        return {self.config[key]: value for key, value in readings if self.config.get(key)}
+
+    def preview_plan(self):
+        """Plan the next cycle from current state without switching anything."""
+        with self.state_snapshot():
+            control = self.build_control_snapshot()
+        return {"snapshot": control.to_dict(), "plan": plan_actions(control).to_dict()}
+
+    @staticmethod
+    def _plan(planner, control):
+        """Run a planner, recording decide-phase time and decisions by reason."""
+        decide_start = time.perf_counter()
+        plan = planner(control)
+        CYCLE_PHASE_SECONDS.observe(time.perf_counter() - decide_start, phase="decide")
+        for action in plan.actions:
+            CONTROL_DECISIONS.inc(reason=action.reason)
+        return plan
 
     async def handle_saving_session(self):
         """Turn off devices during saving sessions."""
-        logger.info("Saving session active - turning off non-essential devices")
-
-        for entity_id, device_info in self.managed_devices.items():
-            if device_info["enabled"] and device_info["priority"] > 3:
-                # Turn off lower priority devices (priority > 3)
-                state = self.ha_client.get_state(entity_id)
-                if state and state.get("state") in ["on", "true"]:
-                    logger.info(f"Turning off {entity_id} for saving session")
-                    self.ha_client.turn_off(entity_id)
-                    device_info["last_controlled"] = datetime.now().isoformat()
-
-        self.save_managed_devices()
+        await self.apply_plan(self._plan(plan_saving_session, self.build_control_snapshot()))
 
     async def handle_free_session(self):
         """Turn on devices during free electric sessions."""
-        logger.info("Free electric session active - turning on devices")
-
-        for entity_id, device_info in self.managed_devices.items():
-            if device_info["enabled"]:
-                state = self.ha_client.get_state(entity_id)
-                if state and state.get("state") in ["off", "false"]:
-                    logger.info(f"Turning on {entity_id} for free session")
-                    self.ha_client.turn_on(entity_id)
-                    device_info["last_controlled"] = datetime.now().isoformat()
-
-        self.save_managed_devices()
+        await self.apply_plan(self._plan(plan_free_session, self.build_control_snapshot()))
 
     async def handle_smart_control(self, solar_generation, electricity_cost):
         """Smart control based on solar generation and electricity cost."""
-        # Sort devices by priority (lower number = higher priority)
-        sorted_devices = sorted(self.managed_devices.items(), key=lambda x: x[1]["priority"])
-
-        # Get battery status if enabled
-        battery_level = None
-        battery_power = None
-        if self.config.get("enable_battery_management", False):
-            battery_level = self.get_battery_level()
-            battery_power = self.get_battery_power()
-            if battery_level is not None and battery_power is not None:
-                logger.info(f"Battery: {battery_level}%, Power: {battery_power}W")
-
-        # High solar generation - turn on devices
-        # Consider battery: if battery charging and near full, prioritize device usage
-        should_enable_devices = solar_generation > 1000
-        if battery_level is not None and battery_power is not None:
-            # If battery is charging and above 80%, prioritize devices over battery
-            if battery_level > 80 and battery_power > 0:
-                should_enable_devices = solar_generation > 500  # Lower threshold
-                logger.info("Battery near full, lowering threshold for device activation")
-
-        if should_enable_devices:
-            logger.info("High solar generation - enabling devices")
-            for entity_id, device_info in sorted_devices:
-                if device_info["enabled"] and self._can_control_device(entity_id, device_info):
-                    state = self.ha_client.get_state(entity_id)
-                    if state and state.get("state") in ["off", "false"]:
-                        logger.info(f"Turning on {entity_id} due to solar generation")
-                        self._control_device(entity_id, True, "solar_excess")
-                        device_info["last_controlled"] = datetime.now().isoformat()
-
-        # High electricity cost - turn off lower priority devices
-        # Consider battery: if battery available and charged, be more aggressive
-        cost_threshold = 0.30
-        if battery_level is not None and battery_level > 50:
-            # Can be more aggressive with high costs if battery available
-            cost_threshold = 0.25
-            logger.info(f"Battery available ({battery_level}%), lowering cost threshold")
-
-        if electricity_cost > cost_threshold:
-            logger.info("High electricity cost - disabling lower priority devices")
-            for entity_id, device_info in sorted_devices:
-                if (
-                    device_info["enabled"]
-                    and device_info["priority"] > 5
-                    and self._can_control_device(entity_id, device_info)
-                ):
-                    state = self.ha_client.get_state(entity_id)
-                    if state and state.get("state") in ["on", "true"]:
-                        logger.info(f"Turning off {entity_id} due to high cost")
-                        self._control_device(entity_id, False, "high_cost")
-                        device_info["last_controlled"] = datetime.now().isoformat()
-
-        self.save_managed_devices()
-
-    def _can_control_device(self, entity_id, device_info):
-        """Check if device can be controlled based on schedule and settings."""
-        # Check if direct control is allowed
-        if not device_info.get("allow_direct_control", True):
-            return False
+        control = self.build_control_snapshot(solar_generation, electricity_cost)
+        await self.apply_plan(self._plan(plan_smart_control, control))
 
-        # Check schedule
-        schedule = device_info.get("schedule", {})
-        if schedule:
-            now = datetime.now()
-            current_day = now.weekday()
-            current_time = now.strftime("%H:%M")
-
-            # Check if current day is in allowed days
-            allowed_days = schedule.get("days", [])
-            if allowed_days and current_day not in allowed_days:
-                return False
-
-            # Check if current time is outside the scheduled window
-            start_time = schedule.get("start")
-            end_time = schedule.get("end")
-            if start_time and end_time:
-                # If we're outside the schedule window, don't control
-                if not (start_time <= current_time <= end_time):
-                    logger.debug(f"Device {entity_id} outside schedule window")
-                    return False
-
-        return True
+    async def apply_plan(self, plan):
+        """Execute a plan: switch its devices in one batch, then record and publish the results.
 
-    def _can_change_heating(self, device_info):
-        """Check if enough time has passed since last heating change."""
-        min_interval = self.config.get("heating_min_change_interval", 900)  # Default 15 minutes
-        last_change = device_info.get("last_heating_change")
-
-        if not last_change:
-            return True
+        Returns {entity_id: success}.
+        """
+        for note in plan.notes:
+            logger.info(note)
+        for entity_id, reason in plan.skipped:
+            logger.info(f"Skipping {entity_id} - {reason}")
+        for action in plan.actions:
+            logger.info(f"Turning {'on' if action.turn_on else 'off'} {action.entity_id} ({action.reason})")
+
+        results = await self._switch_devices([(action.entity_id, action.turn_on) for action in plan.actions])
+        self._mark_controlled(entity_id for entity_id, success in results.items() if success)
+
+        # Smart-control decisions also start follow-up automations and are published to HA
+        if plan.mode == MODE_SMART:
+            await asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        self._after_control,
+                        action.entity_id,
+                        action.turn_on,
+                        action.reason,
+                        results.get(action.entity_id, False),
+                    )
+                    for action in plan.actions
+                )
+            )
 
-        try:
-            last_change_dt = datetime.fromisoformat(last_change)
-            elapsed = (datetime.now() - last_change_dt).total_seconds()
-            return elapsed >= min_interval
-        except Exception:
-            return True
+        self.timeseries.record_many(
+            {
+                f"decision:{action.entity_id}": 1.0 if action.turn_on else 0.0
+                for action in plan.actions
+                if results.get(action.entity_id)
+            }
+        )
+        if self.history is not None:
+            self.history.record_decisions(
+                (action.entity_id, action.turn_on, action.reason, results.get(action.entity_id, False))
+                for action in plan.actions
+            )
+        self.save_managed_devices(deferred=True)
+        return results
 
-    def _control_device(self, entity_id, turn_on, reason):
-        """Control device and publish decision to HA."""
-        # Check if it's a heating device and respect min change interval
-        is_heating = "heat" in entity_id.lower() or "thermostat" in entity_id.lower()
-        device_info = self.managed_devices.get(entity_id, {})
+    async def _switch_devices(self, actions):
+        """Switch devices with one service call per domain and service.
 
-        if is_heating and not self._can_change_heating(device_info):
-            logger.info(f"Skipping {entity_id} - minimum heating change interval not met")
+        ``actions`` is a list of (entity_id, turn_on); returns {entity_id: success}.
+        """
+        if not actions:
+            return {}
+
+        batch = ServiceCallBatch()
+        for entity_id, turn_on in actions:
+            if turn_on:
+                batch.turn_on(entity_id)
+            else:
+                batch.turn_off(entity_id)
+
+        with CYCLE_PHASE_SECONDS.time(phase="actuate"):
+            if self.async_client is not None:
+                results = await self.async_client.call_service_batch(batch)
+                # Switched outside ha_client, so drop its cached view of these entities
+                self.ha_client.invalidate(list(results))
+                return results
+            return await asyncio.to_thread(batch.execute, self.ha_client)
+
+    def _mark_controlled(self, entity_ids):
+        """Record the control time for devices that were switched."""
+        now = datetime.now().isoformat()
+        for entity_id in entity_ids:
+            self.managed_devices.mark_controlled(entity_id, now)
+            self.store.mark_dirty(entity_id)
+
+    def _after_control(self, entity_id, turn_on, reason, success):
+        """Trigger follow-up automation and publish the decision after a control action."""
+        if not success:
             return
 
-        # Control the device
-        if turn_on:
-            success = self.ha_client.turn_on(entity_id)
-            # Trigger auto-start automation if configured
-            auto_start = device_info.get("auto_start_automation")
-            if success and auto_start:
-                self._trigger_automation(auto_start, entity_id, reason)
-        else:
-            success = self.ha_client.turn_off(entity_id)
+        device = self.managed_devices.device(entity_id)
+
+        # Trigger auto-start automation if configured
+        if turn_on and device and device.auto_start_automation:
+            self._trigger_automation(device.auto_start_automation, entity_id, reason)
 
-        if success:
-            # Update last change time for heating devices
-            if is_heating:
-                device_info["last_heating_change"] = datetime.now().isoformat()
+        # Update last change time for heating devices
+        if device and device.heating:
+            self.managed_devices.mark_heating_change(entity_id, datetime.now().isoformat())
+            self.store.mark_dirty(entity_id)
 
-            # Publish decision to Home Assistant
-            self._publish_control_decision(entity_id, turn_on, reason)
+        # Publish decision to Home Assistant
+        self._publish_control_decision(entity_id, turn_on, reason)
 
     def _trigger_automation(self, automation_id, device_id, reason):
         """Trigger a Home Assistant automation or script."""
@@ -561,7 +812,7 @@ class EnergyManager:
                     "friendly_name": f"Smart Energy Decision: {entity_id}",
                 },
             }
-            self.ha_client.set_state(sensor_id, state_data)
+            self.publisher.publish(sensor_id, state_data)
         except Exception as e:
             logger.error(f"Error publishing decision for {entity_id}: {e}")
 
@@ -584,150 +835,251 @@ class EnergyManager:
                     "friendly_name": f"Smart Energy Config: {entity_id}",
                 },
             }
-            self.ha_client.set_state(sensor_id, state_data)
+            self.publisher.publish(sensor_id, state_data)
         except Exception as e:
             logger.error(f"Error publishing config for {entity_id}: {e}")
 
-    def calculate_optimal_solar_slots(self, solar_forecast_data, required_duration_minutes):
+    def calculate_optimal_solar_slots(self, solar_forecast_data, required_duration_minutes, non_overlapping=False):
         """
         Calculate optimal time slots based on solar forecast.
 
         Args:
-            solar_forecast_data: List of {'timestamp': ISO time, 'power': watts}
+            solar_forecast_data: List of {'timestamp': ISO time, 'power': watts}, or a ParsedForecast
             required_duration_minutes: How long device needs to run
+            non_overlapping: Only return slots that do not overlap each other
+
+        The forecast is resampled onto the forecast_resolution grid, with power
+        interpolated between points so each cell holds its mean power. Only
+        runs that end within the forecast are offered, and none for a duration
+        of zero or less.
 
         Returns:
             List of optimal time slots with expected solar generation
         """
-        if not solar_forecast_data or required_duration_minutes <= 0:
+        if required_duration_minutes <= 0:
             return []
+        grid = _parsed(solar_forecast_data, "power", FORECASTS["solar"][2]).on_grid(self.forecast_step)
+        return [
+            {
+                "start_time": grid.label(i),
+                "duration_minutes": required_duration_minutes,
+                "avg_solar_power": avg_power,
+                "total_energy_kwh": (avg_power * required_duration_minutes) / 60000,
+            }
+            for i, avg_power in grid.finder.best(
+                grid.cells(required_duration_minutes), highest=True, non_overlapping=non_overlapping
+            )
+        ]
 
-        optimal_slots = []
-
-        # Group forecast data into contiguous slots of required duration
-        for i in range(len(solar_forecast_data) - 1):
-            start_time = datetime.fromisoformat(solar_forecast_data[i]["timestamp"])
-            total_power = 0
-            slot_count = 0
-
-            # Calculate average power for this slot
-            for j in range(i, min(i + required_duration_minutes, len(solar_forecast_data))):
-                total_power += solar_forecast_data[j]["power"]
-                slot_count += 1
-
-            if slot_count > 0:
-                avg_power = total_power / slot_count
-                optimal_slots.append(
-                    {
-                        "start_time": start_time.isoformat(),
-                        "duration_minutes": required_duration_minutes,
-                        "avg_solar_power": avg_power,
-                        "total_energy_kwh": (avg_power * required_duration_minutes) / 60000,
-                    }
-                )
-
-        # Sort by average solar power (highest first)
-        optimal_slots.sort(key=lambda x: x["avg_solar_power"], reverse=True)
-        return optimal_slots[:10]  # Return top 10 slots
-
-    def calculate_cheapest_cost_slots(self, cost_forecast_data, required_duration_minutes):
+    def calculate_cheapest_cost_slots(self, cost_forecast_data, required_duration_minutes, non_overlapping=False):
         """
         Calculate cheapest time slots based on energy cost forecast.
 
         Args:
-            cost_forecast_data: List of {'timestamp': ISO time, 'cost_per_kwh': float}
+            cost_forecast_data: List of {'timestamp': ISO time, 'cost_per_kwh': float}, or a ParsedForecast
             required_duration_minutes: How long device needs to run
+            non_overlapping: Only return slots that do not overlap each other
+
+        The forecast is resampled onto the forecast_resolution grid, with each
+        price held until the next one. Only runs that end within the forecast
+        are offered, and none for a duration of zero or less.
 
         Returns:
             List of cheapest time slots with expected costs
         """
-        if not cost_forecast_data or required_duration_minutes <= 0:
+        if required_duration_minutes <= 0:
             return []
+        grid = _parsed(cost_forecast_data, "cost_per_kwh", FORECASTS["cost"][2]).on_grid(self.forecast_step)
+        return [
+            {
+                "start_time": grid.label(i),
+                "duration_minutes": required_duration_minutes,
+                "avg_cost_per_kwh": avg_cost,
+                "estimated_total_cost": avg_cost * required_duration_minutes / 60,
+            }
+            for i, avg_cost in grid.finder.best(
+                grid.cells(required_duration_minutes), highest=False, non_overlapping=non_overlapping
+            )
+        ]
 
-        cheapest_slots = []
-
-        # Group forecast data into contiguous slots of required duration
-        for i in range(len(cost_forecast_data) - 1):
-            start_time = datetime.fromisoformat(cost_forecast_data[i]["timestamp"])
-            total_cost = 0
-            slot_count = 0
-
-            # Calculate average cost for this slot
-            for j in range(i, min(i + required_duration_minutes, len(cost_forecast_data))):
-                total_cost += cost_forecast_data[j]["cost_per_kwh"]
-                slot_count += 1
-
-            if slot_count > 0:
-                avg_cost = total_cost / slot_count
-                cheapest_slots.append(
-                    {
-                        "start_time": start_time.isoformat(),
-                        "duration_minutes": required_duration_minutes,
-                        "avg_cost_per_kwh": avg_cost,
-                        "estimated_total_cost": avg_cost * required_duration_minutes / 60,
-                    }
-                )
-
-        # Sort by average cost (lowest first)
-        cheapest_slots.sort(key=lambda x: x["avg_cost_per_kwh"])
-        return cheapest_slots[:10]  # Return top 10 cheapest slots
+    def get_parsed_forecast(self, kind):
+        """Get the "solar" or "cost" forecast parsed into columns, or None if there is none.
 
-    def get_solar_forecast(self):
-        """Get solar generation forecast from configured sensor."""
-        sensor = self.config.get("solar_forecast_sensor")
+        The parsed forecast is cached until the sensor's last_updated changes,
+        so the automation loop, the forecast API and the slot finders share it.
+        """
+        sensor_key, value_key, interpolation = FORECASTS[kind]
+        sensor = self.config.get(sensor_key)
         if not sensor:
-            return []
+            return None
 
         try:
-            state = self.ha_client.get_state(sensor)
-            if state:
-                # Assume forecast data is in attributes
-                forecast = state.get("attributes", {}).get("forecast", [])
-                return forecast
+            return self.forecasts.get(sensor, self._get_state(sensor), value_key, interpolation)
         except Exception as e:
-            logger.error(f"Error getting solar forecast: {e}")
+            logger.error(f"Error getting {kind} forecast: {e}")
+        return None
 
-        return []
+    def get_solar_forecast(self):
+        """Get solar generation forecast from configured sensor."""
+        forecast = self.get_parsed_forecast("solar")
+        return forecast.points if forecast else []
 
     def get_cost_forecast(self):
         """Get energy cost forecast from configured sensor."""
-        sensor = self.config.get("electricity_forecast_sensor")
-        if not sensor:
-            return []
-
-        try:
-            state = self.ha_client.get_state(sensor)
-            if state:
-                # Assume forecast data is in attributes
-                forecast = state.get("attributes", {}).get("forecast", [])
-                return forecast
-        except Exception as e:
-            logger.error(f"Error getting cost forecast: {e}")
-
-        return []
+        forecast = self.get_parsed_forecast("cost")
+        return forecast.points if forecast else []
+
+    def _enabled_forecasts(self):
+        """Get the parsed forecasts whose optimization is enabled: {"solar"|"cost": ParsedForecast}."""
+        forecasts = {}
+        for kind, option in (
+            ("solar", "enable_solar_forecast_optimization"),
+            ("cost", "enable_cost_forecast_optimization"),
+        ):
+            if self.config.get(option, False):
+                forecast = self.get_parsed_forecast(kind)
+                if forecast:
+                    forecasts[kind] = forecast
+        return forecasts
+
+    def _device_schedule(self, device, forecasts, now, non_overlapping=False):
+        """Build one device's schedule from the forecasts returned by _enabled_forecasts."""
+        duration = device.required_run_duration
+        result = {"entity_id": device.entity_id, "required_duration_minutes": duration}
+
+        # When the device's own schedule next lets the controller switch it
+        window = next_allowed_window(device.snapshot(), now)
+        if window is not None:
+            start, end = window
+            result["next_allowed_window"] = {"start": start.isoformat(), "end": end.isoformat() if end else None}
+
+        if "solar" in forecasts:
+            result["optimal_solar_slots"] = self.calculate_optimal_solar_slots(
+                forecasts["solar"], duration, non_overlapping
+            )
+        if "cost" in forecasts:
+            result["cheapest_cost_slots"] = self.calculate_cheapest_cost_slots(
+                forecasts["cost"], duration, non_overlapping
+            )
+        return result
 
-    def get_device_optimal_schedule(self, entity_id):
+    def get_device_optimal_schedule(self, entity_id, non_overlapping=False):
         """Get optimal schedule for a device based on solar and cost forecasts."""
-        device_info = self.managed_devices.get(entity_id)
-        if not device_info:
+        device = self.managed_devices.device(entity_id)
+        if device is None or device.required_run_duration <= 0:
             return None
+        return self._device_schedule(device, self._enabled_forecasts(), datetime.now(), non_overlapping)
 
-        required_duration = device_info.get("required_run_duration", 0)
-        if required_duration <= 0:
-            return None
+    def get_all_device_schedules(self, non_overlapping=False):
+        """Get optimal schedules for every managed device with a required run duration.
 
-        result = {"entity_id": entity_id, "required_duration_minutes": required_duration}
+        Forecasts are read once (and parsed only when they changed); window means are computed once
+        per distinct run duration and shared by the devices that have it.
+        """
+        forecasts = self._enabled_forecasts()
+        now = datetime.now()
+        return {
+            device.entity_id: self._device_schedule(device, forecasts, now, non_overlapping)
+            for device in self.managed_devices.by_priority
+            if device.required_run_duration > 0
+        }
 
-        # Get solar forecast optimization if enabled
-        if self.config.get("enable_solar_forecast_optimization", False):
-            solar_forecast = self.get_solar_forecast()
-            if solar_forecast:
-                result["optimal_solar_slots"] = self.calculate_optimal_solar_slots(solar_forecast, required_duration)
+    def get_joint_schedule(self, objective=None, now=None):
+        """Plan the runs of every enabled device with a run duration together, across the forecast horizon.
 
-        # Get cost forecast optimization if enabled
-        if self.config.get("enable_cost_forecast_optimization", False):
-            cost_forecast = self.get_cost_forecast()
-            if cost_forecast:
-                result["cheapest_cost_slots"] = self.calculate_cheapest_cost_slots(cost_forecast, required_duration)
+        Unlike get_all_device_schedules, devices do not all get the same cheapest
+        slot: each run's power counts against the others'. ``objective`` is
+        "cost" (cheapest grid import) or "solar" (least grid import, i.e. most
+        solar self-consumption), defaulting to cost when its forecast is enabled.
+        Solar offsets the runs' draw under either objective, and no forecast cell
+        may import more than site_import_limit W. Runs start no earlier than now.
 
+        Returns None when no forecast is enabled; raises ValueError for an
+        objective whose forecast is not enabled.
+        """
+        forecasts = self._enabled_forecasts()
+        if not forecasts:
+            return None
+        objective = objective or ("cost" if "cost" in forecasts else "solar")
+        if objective not in FORECASTS:
+            raise ValueError(f"Unknown objective: {objective}")
+        if objective not in forecasts:
+            raise ValueError(f"The {objective} forecast is not enabled")
+
+        # Both grids start on multiples of the step, so clipping them to their overlap lines them up
+        step = self.forecast_step
+        grids = {kind: forecast.on_grid(step) for kind, forecast in forecasts.items()}
+        now = (now or datetime.now()).timestamp()
+        start = max([now // step * step] + [grid.start for grid in grids.values()])
+        end = min(grid.end for grid in grids.values())
+        grids = {kind: grid.clip(start, end) for kind, grid in grids.items()}
+        horizon = grids[objective]
+        prices = grids["cost"].values if objective == "cost" else [1.0] * len(horizon)
+        limit = self.config.get("site_import_limit", 0) or 0
+
+        # Higher priority first, then the largest energy, so big runs get the cheap cells first;
+        # disabled devices are never started, so their runs must not take cells or import headroom
+        devices = sorted(
+            (device for device in self.managed_devices.enabled if device.required_run_duration > 0),
+            key=lambda device: (device.priority, -device.power_consumption * device.required_run_duration),
+        )
+        allowed = {}
+        runs = []
+        for device in devices:
+            schedule = device.compiled_schedule
+            if schedule is not None and schedule not in allowed:
+                allowed[schedule] = [
+                    schedule.allows(minute_of_week(datetime.fromtimestamp(horizon.start + i * step)))
+                    for i in range(len(horizon))
+                ]
+            cells = horizon.cells(device.required_run_duration)
+            runs.append(Run(device.entity_id, device.power_consumption, cells, allowed.get(schedule)))
+
+        started = time.perf_counter()
+        plan = plan_runs(runs, prices, grids["solar"].values if "solar" in grids else None, limit, step / 3600)
+        solve_ms = (time.perf_counter() - started) * 1000
+
+        result = {
+            "objective": objective,
+            "resolution_minutes": step // 60,
+            "site_import_limit": limit,
+            "grid_import_kwh": plan.grid_import,
+            "peak_import_w": plan.peak_import,
+            "converged": plan.converged,
+            "solve_ms": solve_ms,
+            "runs": {},
+            "unscheduled": [],
+        }
+        if objective == "cost":
+            result["estimated_total_cost"] = plan.cost
+        for run, device in zip(runs, devices):
+            begin = plan.starts[run.key]
+            if begin is None:
+                result["unscheduled"].append(device.entity_id)
+                continue
+            result["runs"][device.entity_id] = {
+                "start_time": horizon.label(begin),
+                "end_time": horizon.label(begin + run.cells),
+                "duration_minutes": device.required_run_duration,
+                "power": device.power_consumption,
+            }
         return result
+
+
+def _parsed(forecast, value_key, interpolation):
+    """Accept a ParsedForecast or a raw list of forecast points."""
+    if isinstance(forecast, ParsedForecast):
+        return forecast
+    return ParsedForecast(forecast or [], value_key, interpolation=interpolation)
+
+
+def _state_of(state):
+    return state.get("state") if state else None
+
+
+def _band(state, thresholds):
+    """Threshold band of a numeric state, or -1 when it is not a number."""
+    try:
+        return threshold_band(float(_state_of(state)), thresholds)
+    except (TypeError, ValueError):
+        return -1
@@ -0,0 +1,209 @@
+"""Asyncio-native Home Assistant API client."""
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+from circuit_breaker import AdaptiveTimeout, CircuitBreaker
+from ha_client import (
+    DEFAULT_BASE_URL,
+    HA_REQUEST_ERRORS,
+    HA_REQUEST_SECONDS,
+    HomeAssistantUnavailable,
+    endpoint_name,
+    sensor_value_from_state,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHomeAssistantClient:
+    """Non-blocking client for the Home Assistant REST API.
+
+    Used by the automation loop so state reads and device actuation can run
+    concurrently. Service calls are limited per domain so a large batch of
+    switches does not flood HA with simultaneous requests.
+    """
+
+    def __init__(
+        self,
+        token,
+        base_url=None,
+        pool_size=10,
+        connect_timeout=3.05,
+        read_timeout=10,
+        domain_concurrency=None,
+        default_domain_concurrency=10,
+        breaker=None,
+        adaptive_timeout=None,
+    ):
+        """Initialize the client."""
+        self.token = token
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.domain_concurrency = dict(domain_concurrency or {})
+        self.default_domain_concurrency = default_domain_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self.adaptive_timeout = adaptive_timeout or AdaptiveTimeout(maximum=read_timeout)
+
+        self._session = None
+        self._loop = None
+        self._semaphores = {}
+
+    def _get_session(self):
+        """Get the pooled session for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout, connector=connector)
+            self._loop = loop
+            self._semaphores = {}
+        return self._session
+
+    def _domain_semaphore(self, domain):
+        """Get the concurrency limiter for a service domain."""
+        semaphore = self._semaphores.get(domain)
+        if semaphore is None:
+            limit = self.domain_concurrency.get(domain, self.default_domain_concurrency)
+            semaphore = self._semaphores[domain] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def close(self):
+        """Close pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def is_available(self):
+        """Whether Home Assistant is currently considered reachable."""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    async def _request(self, method, path, json=None):
+        """Send a request through the circuit breaker and return the decoded body.
+
+        Service calls keep the configured read timeout, as in the sync client.
+        Raises HomeAssistantUnavailable when the circuit is open, on connection
+        errors and timeouts, and on 5xx responses.
+        """
+        if not self.breaker.allow_request():
+            raise HomeAssistantUnavailable("circuit open - Home Assistant recently unreachable")
+
+        adaptive = not path.startswith("/services/")
+        read_timeout = self.adaptive_timeout.value if adaptive else self.timeout.sock_read
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.timeout.connect, sock_read=read_timeout)
+        endpoint = endpoint_name(method, path)
+        start = time.monotonic()
+        try:
+            async with self._get_session().request(method, f"{self.base_url}{path}", json=json, timeout=timeout) as r:
+                r.raise_for_status()
+                body = await r.json() if method == "GET" else None
+        except aiohttp.ClientResponseError as e:
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            if e.status >= 500:
+                self.breaker.record_failure()
+                raise HomeAssistantUnavailable(str(e)) from e
+            self.breaker.record_success()
+            raise
+        except asyncio.TimeoutError as e:
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            if adaptive:
+                self.adaptive_timeout.observe_timeout()
+            self.breaker.record_failure()
+            raise HomeAssistantUnavailable(f"timeout after {timeout.sock_read:.1f}s") from e
+        except aiohttp.ClientError as e:
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            self.breaker.record_failure()
+            raise HomeAssistantUnavailable(str(e)) from e
+        except BaseException:
+            # A bad body or a cancellation says nothing about HA, but must not keep the probe slot
+            HA_REQUEST_ERRORS.inc(endpoint=endpoint)
+            self.breaker.release()
+            raise
+        finally:
+            HA_REQUEST_SECONDS.observe(time.monotonic() - start, endpoint=endpoint)
+
+        self.breaker.record_success()
+        if adaptive:
+            self.adaptive_timeout.observe(time.monotonic() - start)
+        return body
+
+    async def get_states(self, strict=False):
+        """Get all states from Home Assistant.
+
+        With ``strict`` any failed read raises HomeAssistantUnavailable instead
+        of returning an empty list.
+        """
+        try:
+            return await self._request("GET", "/states")
+        except HomeAssistantUnavailable:
+            if strict:
+                raise
+            logger.error("Error getting states: Home Assistant unavailable")
+            return []
+        except Exception as e:
+            if strict:
+                raise HomeAssistantUnavailable(f"states read failed: {e}") from e
+            logger.error(f"Error getting states: {e}")
+            return []
+
+    async def get_state(self, entity_id, strict=False):
+        """Get state of a specific entity.
+
+        With ``strict`` a failed read raises HomeAssistantUnavailable instead of
+        returning None; an entity HA does not know still returns None.
+        """
+        try:
+            return await self._request("GET", f"/states/{entity_id}")
+        except HomeAssistantUnavailable:
+            if strict:
+                raise
+            logger.error(f"Error getting state for {entity_id}: Home Assistant unavailable")
+            return None
+        except Exception as e:
+            not_found = isinstance(e, aiohttp.ClientResponseError) and e.status == 404
+            if strict and not not_found:
+                raise HomeAssistantUnavailable(f"state read for {entity_id} failed: {e}") from e
+            logger.error(f"Error getting state for {entity_id}: {e}")
+            return None
+
+    async def get_sensor_value(self, entity_id, strict=False):
+        """Get numeric value from a sensor."""
+        return sensor_value_from_state(await self.get_state(entity_id, strict=strict), entity_id)
+
+    async def call_service(self, domain, service, entity_id=None, service_data=None):
+        """Call a Home Assistant service."""
+        data = dict(service_data or {})
+        if entity_id:
+            data["entity_id"] = entity_id
+
+        async with self._domain_semaphore(domain):
+            try:
+                await self._request("POST", f"/services/{domain}/{service}", json=data)
+                return True
+            except Exception as e:
+                logger.error(f"Error calling service {domain}.{service}: {e}")
+                return False
+
+    async def call_service_batch(self, batch):
+        """Send a ServiceCallBatch, one concurrent request per domain and service."""
+        return await batch.execute_async(self)
+
+    async def turn_on(self, entity_id):
+        """Turn on a device."""
+        return await self.call_service(entity_id.split(".")[0], "turn_on", entity_id)
+
+    async def turn_off(self, entity_id):
+        """Turn off a device."""
+        return await self.call_service(entity_id.split(".")[0], "turn_off", entity_id)
+
+    async def set_state(self, entity_id, state_data):
+        """Set state of an entity (for publishing sensors)."""
+        try:
+            await self._request("POST", f"/states/{entity_id}", json=state_data)
+            return True
+        except Exception as e:
+            logger.error(f"Error setting state for {entity_id}: {e}")
+            return False
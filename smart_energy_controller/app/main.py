@@ -1,15 +1,24 @@
 """Main application for Smart Energy Controller addon."""
 
 import asyncio
+import atexit
 import json
 import logging
 import os
+import signal
+import sys
 import threading
 import time
 
+from circuit_breaker import AdaptiveTimeout, CircuitBreaker
 from energy_manager import EnergyManager
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request
+from ha_async_client import AsyncHomeAssistantClient
 from ha_client import HomeAssistantClient
+from ha_mirror import MirroredHomeAssistantClient
+from metrics import registry
+from scheduler import AdaptiveInterval, TriggerScheduler
+from ttl_cache import TTLCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,6 +29,8 @@ app = Flask(__name__, static_folder="static", template_folder="templates")
 ha_client = None
 energy_manager = None
 automation_task = None
+scheduler = None
+cadence = None
 
 
 def load_config():
@@ -41,7 +52,7 @@ def index():
 def get_devices():
     """Get all available devices from Home Assistant."""
     try:
-        devices = ha_client.get_devices()
+        devices = ha_client.get_devices(refresh=request.args.get("refresh") == "true")
         return jsonify({"success": True, "devices": devices})
     except Exception as e:
         logger.error(f"Error getting devices: {e}")
@@ -66,6 +77,8 @@ def add_managed_device():
         data = request.json
         energy_manager.add_device(data["entity_id"], data.get("priority", 5), data.get("power_consumption", 0))
         return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error adding device: {e}")
         return jsonify({"success": False, "error": "Failed to add device"}), 500
@@ -122,12 +135,141 @@ def toggle_automation():
         data = request.json
         enabled = data.get("enabled", True)
         energy_manager.set_automation_enabled(enabled)
+        if enabled and scheduler:
+            scheduler.notify("automation_enabled")
         return jsonify({"success": True, "enabled": enabled})
     except Exception as e:
         logger.error(f"Error toggling automation: {e}")
         return jsonify({"success": False, "error": "Failed to toggle automation"}), 500
 
 
+@app.route("/api/automation/preview")
+def preview_automation():
+    """Show what the next automation cycle would do, without switching anything."""
+    try:
+        preview = energy_manager.preview_plan()
+        return jsonify({"success": True, "preview": preview})
+    except Exception as e:
+        logger.error(f"Error previewing automation: {e}")
+        return jsonify({"success": False, "error": "Failed to preview automation"}), 500
+
+
+@app.route("/api/publisher/stats")
+def get_publisher_stats():
+    """Get counters of entity writes sent versus suppressed."""
+    try:
+        stats = energy_manager.publisher.get_stats()
+        return jsonify({"success": True, "stats": stats})
+    except Exception as e:
+        logger.error(f"Error getting publisher stats: {e}")
+        return jsonify({"success": False, "error": "Failed to retrieve publisher stats"}), 500
+
+
+@app.route("/api/ha/health")
+def get_ha_health():
+    """Get Home Assistant connection health (circuit breaker and timeouts)."""
+    try:
+        health = {
+            "available": ha_client.is_available(),
+            "circuit": ha_client.breaker.get_stats(),
+            "adaptive_timeout": ha_client.adaptive_timeout.get_stats(),
+        }
+        return jsonify({"success": True, "health": health})
+    except Exception as e:
+        logger.error(f"Error getting HA health: {e}")
+        return jsonify({"success": False, "error": "Failed to retrieve HA health"}), 500
+
+
+@app.route("/api/cache/stats")
+def get_cache_stats():
+    """Get state cache and parsed forecast cache statistics."""
+    try:
+        cache = ha_client.state_cache
+        stats = cache.get_stats() if cache is not None else None
+        return jsonify({"success": True, "stats": stats, "forecasts": energy_manager.forecasts.get_stats()})
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {e}")
+        return jsonify({"success": False, "error": "Failed to retrieve cache stats"}), 500
+
+
+@app.route("/api/history/decisions")
+def get_decision_history():
+    """Get recorded control decisions (SQLite storage only)."""
+    try:
+        if energy_manager.history is None:
+            return jsonify({"success": False, "error": "History requires storage_backend: sqlite"}), 404
+        hours = float(request.args.get("hours", 24))
+        decisions = energy_manager.history.get_decisions(
+            entity_id=request.args.get("entity_id"),
+            since=time.time() - hours * 3600,
+            limit=int(request.args.get("limit", 100)),
+        )
+        return jsonify({"success": True, "decisions": decisions})
+    except Exception as e:
+        logger.error(f"Error getting decision history: {e}")
+        return jsonify({"success": False, "error": "Failed to retrieve decision history"}), 500
+
+
+@app.route("/api/history/samples/<entity_id>")
+def get_sample_history(entity_id):
+    """Get recorded sensor values for an entity (SQLite storage only)."""
+    try:
+        if energy_manager.history is None:
+            return jsonify({"success": False, "error": "History requires storage_backend: sqlite"}), 404
+        hours = float(request.args.get("hours", 24))
+        samples = energy_manager.history.get_samples(entity_id, since=time.time() - hours * 3600)
+        return jsonify({"success": True, "entity_id": entity_id, "samples": samples})
+    except Exception as e:
+        logger.error(f"Error getting sample history: {e}")
+        return jsonify({"success": False, "error": "Failed to retrieve sample history"}), 500
+
+
+@app.route("/api/timeseries")
+def get_timeseries_index():
+    """List the signals held in the in-memory history."""
+    try:
+        store = energy_manager.timeseries
+        return jsonify({"success": True, "series": store.names(), "stats": store.get_stats()})
+    except Exception as e:
+        logger.error(f"Error listing time series: {e}")
+        return jsonify({"success": False, "error": "Failed to list time series"}), 500
+
+
+@app.route("/api/timeseries/<name>")
+def get_timeseries(name):
+    """Get a signal's recent history from the in-memory store."""
+    try:
+        hours = float(request.args.get("hours", 24))
+        start = time.time() - hours * 3600
+        result = energy_manager.timeseries.query(name, start=start, resolution=int(request.args.get("resolution", 0)))
+        if result is None:
+            return jsonify({"success": False, "error": "Unknown series"}), 404
+        resolution, timestamps, values = result
+        return jsonify(
+            {
+                "success": True,
+                "name": name,
+                "resolution": resolution,
+                "timestamps": timestamps.tolist(),
+                "values": values.tolist(),
+                "summary": energy_manager.timeseries.summary(name, start=start),
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error getting time series {name}: {e}")
+        return jsonify({"success": False, "error": "Failed to retrieve time series"}), 500
+
+
+@app.route("/api/metrics")
+def get_metrics():
+    """Get runtime metrics in Prometheus text format."""
+    try:
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {e}")
+        return jsonify({"success": False, "error": "Failed to render metrics"}), 500
+
+
 @app.route("/api/config")
 def get_config():
     """Get current configuration."""
@@ -143,7 +285,9 @@ def get_config():
 def get_device_schedule(entity_id):
     """Get optimal schedule for a device based on forecasts."""
     try:
-        schedule = energy_manager.get_device_optimal_schedule(entity_id)
+        schedule = energy_manager.get_device_optimal_schedule(
+            entity_id, non_overlapping=request.args.get("non_overlapping") == "true"
+        )
         if schedule:
             return jsonify({"success": True, "schedule": schedule})
         else:
@@ -153,33 +297,53 @@ def get_device_schedule(entity_id):
         return jsonify({"success": False, "error": "Failed to calculate schedule"}), 500
 
 
+@app.route("/api/devices/schedules")
+def get_device_schedules():
+    """Get optimal schedules for all managed devices with a run duration, in one pass."""
+    try:
+        schedules = energy_manager.get_all_device_schedules(
+            non_overlapping=request.args.get("non_overlapping") == "true"
+        )
+        return jsonify({"success": True, "schedules": schedules})
+    except Exception as e:
+        logger.error(f"Error getting device schedules: {e}")
+        return jsonify({"success": False, "error": "Failed to calculate schedules"}), 500
+
+
+@app.route("/api/devices/schedules/joint")
+def get_joint_device_schedule():
+    """Plan all managed devices' runs together under the site import limit."""
+    try:
+        plan = energy_manager.get_joint_schedule(objective=request.args.get("objective"))
+        if plan is None:
+            return jsonify({"success": False, "error": "No forecast optimization is enabled"}), 404
+        return jsonify({"success": True, "plan": plan})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error planning joint schedule: {e}")
+        return jsonify({"success": False, "error": "Failed to plan schedule"}), 500
+
+
 @app.route("/api/devices/managed/<entity_id>", methods=["PUT"])
 def update_managed_device(entity_id):
     """Update a managed device configuration."""
     try:
         data = request.json
-        device_info = energy_manager.managed_devices.get(entity_id)
-        if not device_info:
+        fields = (
+            "priority",
+            "power_consumption",
+            "schedule",
+            "allow_direct_control",
+            "auto_start_automation",
+            "required_run_duration",
+        )
+        if not energy_manager.update_device(entity_id, **{key: data[key] for key in fields if key in data}):
             return jsonify({"success": False, "error": "Device not found"}), 404
 
-        # Update device settings
-        if "priority" in data:
-            device_info["priority"] = data["priority"]
-        if "power_consumption" in data:
-            device_info["power_consumption"] = data["power_consumption"]
-        if "schedule" in data:
-            device_info["schedule"] = data["schedule"]
-        if "allow_direct_control" in data:
-            device_info["allow_direct_control"] = data["allow_direct_control"]
-        if "auto_start_automation" in data:
-            device_info["auto_start_automation"] = data["auto_start_automation"]
-        if "required_run_duration" in data:
-            device_info["required_run_duration"] = data["required_run_duration"]
-
-        energy_manager.save_managed_devices()
-        energy_manager._publish_device_entity(entity_id)
-
         return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error updating device: {e}")
         return jsonify({"success": False, "error": "Failed to update device"}), 500
@@ -212,13 +376,23 @@ def automation_loop_sync():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
-    while True:
+    # Run a cycle when a relevant entity changes, or after an interval that shortens as
+    # inputs move quickly or sit near a decision threshold
+    while scheduler.wait() is not None:
         try:
             if energy_manager and energy_manager.is_automation_enabled():
                 loop.run_until_complete(energy_manager.update_and_control())
+                scheduler.set_interval(cadence.update(energy_manager.cadence_inputs()))
+            else:
+                scheduler.set_interval(cadence.reset())
         except Exception as e:
             logger.error(f"Error in automation loop: {e}")
-        time.sleep(30)  # Run every 30 seconds
+
+
+def on_state_changed(entity_id, old_state, new_state):
+    """Schedule a cycle for state changes that could change a control decision."""
+    if energy_manager and energy_manager.is_trigger(entity_id, old_state, new_state):
+        scheduler.notify(entity_id or "resync")
 
 
 def run_automation_background():
@@ -228,9 +402,48 @@ def run_automation_background():
     logger.info("Automation loop started in background")
 
 
+def register_runtime_metrics(client, manager, cycle_scheduler):
+    """Expose publisher, cache, circuit breaker and scheduling statistics as metrics."""
+    publisher = manager.publisher
+    registry.counter("sec_publisher_writes_total", "Entity writes by outcome", ("result",)).set_function(
+        lambda: {("sent",): publisher.sent, ("suppressed",): publisher.suppressed, ("failed",): publisher.failed}
+    )
+
+    if client.state_cache is not None:
+        cache = client.state_cache
+        registry.counter("sec_state_cache_lookups_total", "State cache lookups by result", ("result",)).set_function(
+            lambda: {("hit",): cache.hits, ("miss",): cache.misses, ("coalesced",): cache.coalesced}
+        )
+        registry.gauge("sec_state_cache_entries", "Entries held in the state cache").set_function(
+            lambda: cache.get_stats()["entries"]
+        )
+
+    breaker = client.breaker
+    registry.gauge("sec_ha_circuit_open", "Whether the HA circuit breaker is open").set_function(
+        lambda: int(breaker.state == CircuitBreaker.OPEN)
+    )
+    registry.counter("sec_ha_circuit_trips_total", "Times the HA circuit breaker opened").set_function(
+        lambda: breaker.trips
+    )
+    registry.gauge("sec_ha_read_timeout_seconds", "Current adaptive HA read timeout").set_function(
+        lambda: client.adaptive_timeout.value
+    )
+
+    registry.gauge("sec_timeseries_bytes", "Memory held by the in-memory history buffers").set_function(
+        lambda: manager.timeseries.get_stats()["bytes"]
+    )
+
+    registry.gauge("sec_cycle_interval_seconds", "Current periodic automation cycle interval").set_function(
+        lambda: cycle_scheduler.interval
+    )
+    registry.gauge("sec_next_cycle_seconds", "Seconds until the next automation cycle is due").set_function(
+        cycle_scheduler.next_run_in
+    )
+
+
 def main():
     """Main entry point."""
-    global ha_client, energy_manager
+    global ha_client, energy_manager, scheduler, cadence
 
     logger.info("Starting Smart Energy Controller...")
 
@@ -240,10 +453,66 @@ def main():
 
     # Initialize Home Assistant client
     supervisor_token = os.environ.get("SUPERVISOR_TOKEN")
-    ha_client = HomeAssistantClient(supervisor_token)
+
+    # One breaker and timeout estimate shared by every client talking to HA
+    read_timeout = config.get("ha_read_timeout", 10)
+    breaker = CircuitBreaker(
+        failure_threshold=config.get("ha_failure_threshold", 5),
+        reset_timeout=config.get("ha_circuit_reset_timeout", 30),
+    )
+    adaptive_timeout = AdaptiveTimeout(maximum=read_timeout)
+
+    client_options = {
+        "pool_size": config.get("ha_pool_size", 10),
+        "max_retries": config.get("ha_max_retries", 2),
+        "connect_timeout": config.get("ha_connect_timeout", 3.05),
+        "read_timeout": read_timeout,
+        "breaker": breaker,
+        "adaptive_timeout": adaptive_timeout,
+        "device_index_max_age": config.get("device_index_max_age", 300),
+        "state_cache": TTLCache(
+            max_entries=config.get("state_cache_max_entries", 1024),
+            default_ttl=config.get("state_cache_default_ttl", 2.0),
+            ttl_rules=[(rule["pattern"], rule["ttl"]) for rule in config.get("state_cache_ttls", [])],
+        ),
+    }
+    mirror_mode = config.get("ha_client_mode", "rest") == "websocket"
+    if mirror_mode:
+        # No tracked_entities: the mirror must hold every entity to serve each cycle's
+        # get_states snapshot (and the device list) from memory instead of over REST
+        ha_client = MirroredHomeAssistantClient(supervisor_token, **client_options)
+        ha_client.start()
+    else:
+        ha_client = HomeAssistantClient(supervisor_token, **client_options)
+
+    # Non-blocking client for concurrent device actuation in the automation loop
+    async_client = AsyncHomeAssistantClient(
+        supervisor_token,
+        pool_size=client_options["pool_size"],
+        connect_timeout=client_options["connect_timeout"],
+        read_timeout=read_timeout,
+        default_domain_concurrency=config.get("ha_service_concurrency", 10),
+        breaker=breaker,
+        adaptive_timeout=adaptive_timeout,
+    )
 
     # Initialize Energy Manager
-    energy_manager = EnergyManager(ha_client, config)
+    energy_manager = EnergyManager(ha_client, config, async_client=async_client)
+
+    # Write coalesced device changes when the add-on is stopped (SIGTERM would skip atexit)
+    atexit.register(energy_manager.close)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Without the WebSocket mirror there are no change events: the periodic cadence is the
+    # only way to notice a saving session starting, so it never backs off past the old 30 s poll
+    cadence = AdaptiveInterval(
+        min_interval=config.get("automation_min_interval", 10),
+        max_interval=config.get("automation_max_interval", 300 if mirror_mode else 30),
+    )
+    scheduler = TriggerScheduler(debounce=config.get("automation_debounce", 2), max_interval=cadence.max_interval)
+    register_runtime_metrics(ha_client, energy_manager, scheduler)
+    if mirror_mode:
+        ha_client.add_listener(on_state_changed)
 
     # Start automation loop in background
     run_automation_background()
@@ -0,0 +1,105 @@
+"""Change-detecting publisher for entities written to Home Assistant."""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _as_number(value):
+    """Return value as float if it is numeric, otherwise None."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class StatePublisher:
+    """Writes entity states to Home Assistant only when they really change.
+
+    Remembers the last published state and attributes per entity and skips
+    writes that would not change anything, so the HA recorder is not flooded
+    with identical rows every cycle. Numeric states can be given a deadband,
+    and every entity is re-sent at least once per ``refresh_interval`` seconds
+    so HA recovers its values after a restart.
+    """
+
+    def __init__(self, ha_client, deadbands=None, refresh_interval=300, ignore_attributes=("timestamp",)):
+        """Initialize the publisher."""
+        self.ha_client = ha_client
+        self.deadbands = dict(deadbands or {})
+        self.refresh_interval = refresh_interval
+        self.ignore_attributes = frozenset(ignore_attributes)
+        self._published = {}  # entity_id -> (state, attributes, published_at)
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.suppressed = 0
+        self.failed = 0
+
+    def _comparable_attributes(self, attributes):
+        return {key: value for key, value in (attributes or {}).items() if key not in self.ignore_attributes}
+
+    def _is_unchanged(self, entity_id, state, attributes, now):
+        previous = self._published.get(entity_id)
+        if previous is None:
+            return False
+
+        previous_state, previous_attributes, published_at = previous
+        if self.refresh_interval and now - published_at >= self.refresh_interval:
+            return False
+        if attributes != previous_attributes:
+            return False
+        if state == previous_state:
+            return True
+
+        # Numeric states within the deadband of the last published value count as unchanged
+        deadband = self.deadbands.get(entity_id)
+        new_value, old_value = _as_number(state), _as_number(previous_state)
+        if deadband is None or new_value is None or old_value is None:
+            return False
+        return abs(new_value - old_value) < deadband
+
+    def publish(self, entity_id, state_data, force=False):
+        """Publish state_data for entity_id if it differs from what HA already has.
+
+        Returns True if the entity is up to date in HA (written or unchanged).
+        """
+        state = state_data.get("state")
+        attributes = self._comparable_attributes(state_data.get("attributes"))
+        now = time.monotonic()
+
+        with self._lock:
+            if not force and self._is_unchanged(entity_id, state, attributes, now):
+                self.suppressed += 1
+                return True
+
+        success = self.ha_client.set_state(entity_id, state_data)
+
+        with self._lock:
+            if success:
+                self.sent += 1
+                self._published[entity_id] = (state, attributes, now)
+            else:
+                self.failed += 1
+                self._published.pop(entity_id, None)
+        return success
+
+    def forget(self, entity_id):
+        """Drop the remembered state so the next publish is always sent."""
+        with self._lock:
+            self._published.pop(entity_id, None)
+
+    def get_stats(self):
+        """Get counters of writes sent versus suppressed."""
+        with self._lock:
+            total = self.sent + self.suppressed
+            return {
+                "sent": self.sent,
+                "suppressed": self.suppressed,
+                "failed": self.failed,
+                "tracked_entities": len(self._published),
+                "suppression_ratio": self.suppressed / total if total else 0.0,
+            }
@@ -0,0 +1,131 @@
+"""Place every device's run across a forecast horizon together, under a site import limit."""
+
+import time
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Dict, Optional, Sequence
+
+# Wall time for one plan; the greedy placement always completes, local search stops
+DEFAULT_TIME_BUDGET = 0.2  # seconds
+
+# Costs closer than this are ties, so float noise in window sums cannot move a run
+_EPSILON = 1e-9
+
+
+@dataclass(frozen=True)
+class Run:
+    """A device run to place: power in W, length in grid cells and, optionally, the cells it may start in."""
+
+    key: str
+    power: float
+    cells: int
+    allowed: Optional[Sequence[bool]] = None
+
+
+@dataclass(frozen=True)
+class RunPlan:
+    """Start cell per run key (None if it could not be placed), the plan's cost, import (kWh) and peak import (W)."""
+
+    starts: Dict[str, Optional[int]]
+    cost: float = 0.0
+    grid_import: float = 0.0
+    peak_import: float = 0.0
+    converged: bool = True
+
+
+def plan_runs(runs, prices, solar=None, import_limit=0, cell_hours=1.0, time_budget=DEFAULT_TIME_BUDGET):
+    """Choose a start cell for each run, minimizing the cost of the grid import the runs cause.
+
+    Each cell's import is the runs' combined power less the solar forecast
+    there (never below zero), costed at ``prices`` per kWh; prices of 1 give
+    the import in kWh, which maximizes solar self-consumption. With an
+    ``import_limit`` (W), no cell may import more than that.
+
+    Runs are placed greedily in the order given, each at its cheapest
+    feasible start given those already placed. Local search then moves one
+    run at a time to its cheapest start given all the others, until a pass
+    moves nothing or ``time_budget`` (seconds, counted from the call) runs
+    out; ``converged`` is False in that case. Runs without a power figure
+    are placed as if they drew 1 W but add no load.
+    """
+    deadline = time.perf_counter() + time_budget
+    count = len(prices)
+    solar = list(solar) if solar is not None else [0.0] * count
+    factor = cell_hours / 1000
+    load = [0.0] * count
+    starts = {}
+
+    for run in runs:
+        costs = _window_costs(run, load, solar, prices, import_limit, factor)
+        starts[run.key] = start = _cheapest(costs)
+        if start is not None:
+            _add(load, run, start, 1)
+
+    converged = False
+    while not converged:
+        converged = True
+        for run in runs:
+            if time.perf_counter() > deadline:
+                return _finish(starts, load, solar, prices, factor, False)
+            current = starts[run.key]
+            if current is not None:
+                _add(load, run, current, -1)
+            costs = _window_costs(run, load, solar, prices, import_limit, factor)
+            start = _cheapest(costs)
+            if current is not None and (start is None or costs[start] > costs[current] - _EPSILON):
+                start = current
+            if start != current:
+                starts[run.key] = start
+                converged = False
+            if start is not None:
+                _add(load, run, start, 1)
+    return _finish(starts, load, solar, prices, factor, True)
+
+
+def _window_costs(run, load, solar, prices, import_limit, factor):
+    """Added cost of starting run at each cell, or None where it does not fit or may not start."""
+    count = len(load)
+    width = run.cells
+    if width <= 0 or width > count:
+        return []
+    power = run.power if run.power > 0 else 1.0
+    limited = import_limit > 0 and run.power > 0
+    cost, over = [0.0], [0]
+    for price, drawn, generated in zip(prices, load, solar):
+        before = drawn - generated
+        after = before + power
+        cost.append(price * (max(after, 0.0) - max(before, 0.0)) * factor)
+        over.append(limited and after > import_limit)
+    cost = list(accumulate(cost))
+    over = list(accumulate(over))
+    allowed = run.allowed
+    return [
+        cost[s + width] - cost[s] if over[s + width] == over[s] and (allowed is None or allowed[s]) else None
+        for s in range(count - width + 1)
+    ]
+
+
+def _cheapest(costs):
+    """Earliest start whose cost is within float noise of the lowest, or None if none fits."""
+    feasible = [cost for cost in costs if cost is not None]
+    if not feasible:
+        return None
+    lowest = min(feasible) + _EPSILON
+    return next(s for s, cost in enumerate(costs) if cost is not None and cost <= lowest)
+
+
+def _add(load, run, start, sign):
+    if run.power > 0:
+        for c in range(start, start + run.cells):
+            load[c] += sign * run.power
+
+
+def _finish(starts, load, solar, prices, factor, converged):
+    imports = [max(drawn - generated, 0.0) for drawn, generated in zip(load, solar)]
+    return RunPlan(
+        starts=dict(starts),
+        cost=sum(price * imported for price, imported in zip(prices, imports)) * factor,
+        grid_import=sum(imports) * factor,
+        peak_import=max(imports, default=0.0),
+        converged=converged,
+    )
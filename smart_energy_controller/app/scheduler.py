@@ -0,0 +1,160 @@
+"""Event-driven scheduling of automation cycles."""
+
+import logging
+import math
+import threading
+import time
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CYCLE_TRIGGERS = registry.counter("sec_cycle_triggers_total", "Automation cycles started, by trigger", ("trigger",))
+TRIGGER_EVENTS = registry.counter("sec_trigger_events_total", "Relevant state changes received by the scheduler")
+
+
+class TriggerScheduler:
+    """Decides when the next automation cycle runs.
+
+    A cycle runs once relevant events stop arriving for ``debounce`` seconds,
+    so a burst of changes is handled by one cycle; a steady stream of events
+    still runs a cycle within ``max_delay`` seconds of the first one. Without
+    events a cycle runs every ``max_interval`` seconds as a safety net.
+    """
+
+    def __init__(self, debounce=2.0, max_interval=300.0, max_delay=None):
+        """Initialize the scheduler; the first wait() returns immediately."""
+        self.debounce = debounce
+        self.max_interval = max_interval
+        self.interval = max_interval
+        self.max_delay = max_delay if max_delay is not None else debounce * 5
+        self._condition = threading.Condition()
+        self._last_run = None
+        self._first_event = None
+        self._last_event = None
+        self._pending = set()
+        self._stopped = False
+
+    def notify(self, reason="event"):
+        """Record a relevant change; safe to call from any thread."""
+        TRIGGER_EVENTS.inc()
+        with self._condition:
+            now = time.monotonic()
+            if self._first_event is None:
+                self._first_event = now
+            self._last_event = now
+            self._pending.add(reason)
+            self._condition.notify_all()
+
+    def stop(self):
+        """Wake any waiter and make wait() return None."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def set_interval(self, seconds):
+        """Change the periodic cadence (capped at max_interval) for the next cycle."""
+        with self._condition:
+            self.interval = min(seconds, self.max_interval)
+            self._condition.notify_all()
+
+    def next_run_in(self):
+        """Seconds until the next cycle is due, for status reporting."""
+        with self._condition:
+            due, _ = self._next_due()
+        return max(0.0, due - time.monotonic())
+
+    def _next_due(self):
+        if self._last_run is None:
+            return time.monotonic(), "startup"
+        due_interval = self._last_run + self.interval
+        if self._first_event is not None:
+            due_event = min(self._last_event + self.debounce, self._first_event + self.max_delay)
+            if due_event <= due_interval:
+                return due_event, "event"
+        return due_interval, "interval"
+
+    def wait(self):
+        """Block until the next cycle is due.
+
+        Returns ``(trigger, reasons)`` where trigger is "startup", "event" or
+        "interval" and reasons are the notify() reasons coalesced into this
+        cycle, or None once stopped.
+        """
+        with self._condition:
+            while not self._stopped:
+                due, trigger = self._next_due()
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self._stopped:
+                return None
+
+            reasons = self._pending
+            self._pending = set()
+            self._first_event = None
+            self._last_event = None
+            self._last_run = time.monotonic()
+
+        CYCLE_TRIGGERS.inc(trigger=trigger)
+        if trigger == "event":
+            logger.debug(f"Automation triggered by {', '.join(sorted(reasons))}")
+        return trigger, reasons
+
+
+class AdaptiveInterval:
+    """Choose the periodic cycle interval from how fast inputs approach a threshold.
+
+    Each update takes ``{name: (value, thresholds)}`` readings. A smoothed rate
+    of change is kept per input, and the interval is a fraction (``safety``) of
+    the shortest estimated time until any input reaches its nearest threshold.
+    Inputs within ``near_fraction`` of a threshold use ``min_interval``. Stable
+    inputs, or no inputs at all, back off to ``max_interval``.
+    """
+
+    def __init__(self, min_interval=10.0, max_interval=300.0, safety=0.5, near_fraction=0.1, smoothing=0.5):
+        """Initialize with the interval bounds and tuning factors."""
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.safety = safety
+        self.near_fraction = near_fraction
+        self.smoothing = smoothing
+        self.interval = max_interval
+        self._last = {}
+        self._rates = {}
+
+    def reset(self):
+        """Forget history (for example when automation is disabled) and back off."""
+        self._last.clear()
+        self._rates.clear()
+        self.interval = self.max_interval
+        return self.interval
+
+    def update(self, readings, now=None):
+        """Record readings and return the interval until the next periodic cycle."""
+        now = time.monotonic() if now is None else now
+        interval = self.max_interval
+        for name, (value, thresholds) in readings.items():
+            if value is None or not thresholds:
+                continue
+            rate = self._rate(name, value, now)
+            nearest = min(thresholds, key=lambda threshold: abs(value - threshold))
+            distance = abs(value - nearest)
+            if distance <= abs(nearest) * self.near_fraction:
+                interval = self.min_interval
+            elif rate > 0:
+                interval = min(interval, self.safety * distance / rate)
+        self.interval = max(self.min_interval, min(self.max_interval, interval))
+        return self.interval
+
+    def _rate(self, name, value, now):
+        previous = self._last.get(name)
+        self._last[name] = (now, value)
+        if previous is None or now <= previous[0]:
+            return self._rates.get(name, 0.0)
+        instant = abs(value - previous[1]) / (now - previous[0])
+        rate = self._rates.get(name)
+        rate = instant if rate is None else self.smoothing * instant + (1 - self.smoothing) * rate
+        self._rates[name] = rate if math.isfinite(rate) else 0.0
+        return self._rates[name]
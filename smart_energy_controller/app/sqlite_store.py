@@ -0,0 +1,200 @@
+"""SQLite storage for device configuration, control decisions and sensor samples."""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from device_store import DeviceStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS devices (
+    entity_id TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    entity_id TEXT NOT NULL,
+    turn_on INTEGER NOT NULL,
+    reason TEXT,
+    success INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS decisions_entity_ts ON decisions (entity_id, ts);
+CREATE INDEX IF NOT EXISTS decisions_ts ON decisions (ts);
+CREATE TABLE IF NOT EXISTS samples (
+    entity_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (entity_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+"""
+
+PRUNE_INTERVAL = 3600  # seconds between deletions of expired history
+
+
+class SQLiteDeviceStore(DeviceStore):
+    """DeviceStore backed by an SQLite database in WAL mode.
+
+    Each device is one row, so saving a changed device writes one row rather
+    than the whole mapping. The database also keeps control decisions and
+    sampled sensor values, indexed by entity and time, for ``retention_days``.
+    The first load imports ``json_path`` (the old managed_devices.json) once.
+    """
+
+    def __init__(self, path, json_path=None, flush_interval=30.0, retention_days=30):
+        """Open (creating if needed) the database at path."""
+        super().__init__(path, flush_interval=flush_interval)
+        self.json_path = json_path
+        self.retention_days = retention_days
+        self._last_prune = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; never corrupts in WAL mode
+        self._conn.executescript(SCHEMA)
+
+    def load(self):
+        """Read all devices, importing the JSON file on first use."""
+        try:
+            with self._lock:
+                self._migrate_json()
+                rows = self._conn.execute("SELECT entity_id, config FROM devices").fetchall()
+            return {entity_id: json.loads(config) for entity_id, config in rows}
+        except Exception as e:
+            logger.error(f"Error loading managed devices: {e}")
+            return {}
+
+    def _migrate_json(self):
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        devices = {}
+        if self.json_path and os.path.exists(self.json_path):
+            with open(self.json_path, "r") as f:
+                devices = json.load(f)
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO devices (entity_id, config, updated_at) VALUES (?, ?, ?)",
+                [(entity_id, json.dumps(info), now) for entity_id, info in devices.items()],
+            )
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.now().isoformat(),)
+            )
+        if devices:
+            logger.info(f"Imported {len(devices)} managed devices from {self.json_path}")
+
+    def _persist(self, devices, dirty):
+        """Upsert changed devices and delete removed ones in one transaction."""
+        now = time.time()
+        with self._conn:
+            entity_ids = set(dirty)
+            if None in entity_ids:
+                # The mapping changed as a whole: compare every stored and current device
+                entity_ids = set(devices)
+                entity_ids.update(row[0] for row in self._conn.execute("SELECT entity_id FROM devices"))
+            for entity_id in entity_ids:
+                if entity_id in devices:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO devices (entity_id, config, updated_at) VALUES (?, ?, ?)",
+                        (entity_id, json.dumps(devices[entity_id]), now),
+                    )
+                else:
+                    self._conn.execute("DELETE FROM devices WHERE entity_id = ?", (entity_id,))
+
+    def close(self, devices=None):
+        """Write pending changes and close the database."""
+        with self._lock:
+            written = super().close(devices)
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            return written
+
+    def record_decisions(self, decisions, timestamp=None):
+        """Store (entity_id, turn_on, reason, success) control decisions."""
+        ts = time.time() if timestamp is None else timestamp
+        rows = [
+            (ts, entity_id, int(turn_on), reason, int(bool(success)))
+            for entity_id, turn_on, reason, success in decisions
+        ]
+        if not rows:
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO decisions (ts, entity_id, turn_on, reason, success) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._prune(ts)
+        except Exception as e:
+            logger.error(f"Error recording control decisions: {e}")
+
+    def record_samples(self, values, timestamp=None):
+        """Store one sample per entity from {entity_id: value}; None values are skipped."""
+        ts = time.time() if timestamp is None else timestamp
+        rows = [(entity_id, ts, float(value)) for entity_id, value in values.items() if value is not None]
+        if not rows:
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO samples (entity_id, ts, value) VALUES (?, ?, ?)", rows)
+                self._prune(ts)
+        except Exception as e:
+            logger.error(f"Error recording sensor samples: {e}")
+
+    def _prune(self, now):
+        if self._last_prune is not None and now - self._last_prune < PRUNE_INTERVAL:
+            return
+        cutoff = now - self.retention_days * 86400
+        self._conn.execute("DELETE FROM decisions WHERE ts < ?", (cutoff,))
+        self._conn.execute("DELETE FROM samples WHERE ts < ?", (cutoff,))
+        self._last_prune = now
+
+    def get_decisions(self, entity_id=None, since=None, limit=100):
+        """Return control decisions, newest first, optionally for one entity and after since."""
+        query = "SELECT ts, entity_id, turn_on, reason, success FROM decisions WHERE ts >= ?"
+        params = [since or 0]
+        if entity_id:
+            query += " AND entity_id = ?"
+            params.append(entity_id)
+        query += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                "timestamp": datetime.fromtimestamp(ts).isoformat(),
+                "entity_id": row_entity_id,
+                "action": "turned_on" if turn_on else "turned_off",
+                "reason": reason,
+                "success": bool(success),
+            }
+            for ts, row_entity_id, turn_on, reason, success in rows
+        ]
+
+    def get_samples(self, entity_id, since=None, until=None):
+        """Return an entity's sampled values between since and until, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, value FROM samples WHERE entity_id = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (entity_id, since or 0, until if until is not None else float("inf")),
+            ).fetchall()
+        return [{"timestamp": datetime.fromtimestamp(ts).isoformat(), "value": value} for ts, value in rows]
+
+    def get_stats(self):
+        """Return write statistics and table sizes."""
+        stats = super().get_stats()
+        with self._lock:
+            for table in ("devices", "decisions", "samples"):
+                stats[table] = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return stats
@@ -0,0 +1,201 @@
+"""In-memory sensor and decision history in fixed-capacity typed-array ring buffers."""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+# (bucket seconds, retention seconds) for the downsampled tiers, finest first
+DEFAULT_TIERS = ((60, 24 * 3600), (900, 30 * 86400))
+
+
+class RingBuffer:
+    """Timestamped float samples in two ``array('d')`` buffers of at most capacity items.
+
+    Appends are O(1); once full, the oldest sample is overwritten. Timestamps
+    must not decrease, so range lookups are binary searches and range queries
+    copy at most two contiguous slices.
+    """
+
+    def __init__(self, capacity):
+        """Initialize an empty buffer; storage grows to capacity and no further."""
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._times = array("d")
+        self._values = array("d")
+        self._start = 0  # physical index of the oldest sample once full
+
+    def __len__(self):
+        return len(self._times)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the sample arrays."""
+        return (len(self._times) + len(self._values)) * self._times.itemsize
+
+    def append(self, timestamp, value):
+        """Add a sample; returns False (and drops it) if older than the newest sample."""
+        if self._times and timestamp < self.last_time():
+            return False
+        if len(self._times) < self.capacity:
+            self._times.append(timestamp)
+            self._values.append(value)
+        else:
+            self._times[self._start] = timestamp
+            self._values[self._start] = value
+            self._start = (self._start + 1) % self.capacity
+        return True
+
+    def first_time(self):
+        """Timestamp of the oldest sample, or None if empty."""
+        return self._times[self._start] if self._times else None
+
+    def last_time(self):
+        """Timestamp of the newest sample, or None if empty."""
+        return self._times[self._start - 1] if self._times else None
+
+    def range(self, start=None, end=None):
+        """Return (timestamps, values) arrays for samples with start <= t <= end."""
+        # Chronological order is the part from _start on, then the part before it
+        times, values = array("d"), array("d")
+        with memoryview(self._times) as view:
+            for offset, stop in ((self._start, len(view)), (0, self._start)):
+                chunk = view[offset:stop]
+                lo = offset + (0 if start is None else bisect_left(chunk, start))
+                hi = offset + (len(chunk) if end is None else bisect_right(chunk, end))
+                chunk.release()
+                if lo < hi:
+                    times.extend(self._times[lo:hi])
+                    values.extend(self._values[lo:hi])
+        return times, values
+
+
+class _Bucket:
+    """Running mean of the samples falling into one downsampling bucket."""
+
+    __slots__ = ("start", "total", "count")
+
+    def __init__(self, start):
+        self.start = start
+        self.total = 0.0
+        self.count = 0
+
+
+class Series:
+    """One signal: a raw ring buffer plus one averaged ring buffer per tier."""
+
+    def __init__(self, raw_capacity, tiers=DEFAULT_TIERS):
+        """Initialize the buffers; a tier keeps retention / bucket points."""
+        self.raw = RingBuffer(raw_capacity)
+        self.tiers = [(bucket, RingBuffer(max(1, int(retention // bucket)))) for bucket, retention in tiers]
+        self._buckets = [None] * len(self.tiers)
+
+    @property
+    def nbytes(self):
+        """Bytes held by all of this series' buffers."""
+        return self.raw.nbytes + sum(buffer.nbytes for _, buffer in self.tiers)
+
+    def append(self, timestamp, value):
+        """Add a raw sample and fold it into each tier's current bucket."""
+        if not self.raw.append(timestamp, value):
+            return False
+        for i, (size, buffer) in enumerate(self.tiers):
+            bucket_start = timestamp - timestamp % size
+            current = self._buckets[i]
+            if current is not None and current.start != bucket_start:
+                buffer.append(current.start, current.total / current.count)
+                current = None
+            if current is None:
+                current = self._buckets[i] = _Bucket(bucket_start)
+            current.total += value
+            current.count += 1
+        return True
+
+    def buffers(self):
+        """Yield (resolution seconds, buffer) from finest to coarsest; raw has resolution 0."""
+        yield 0, self.raw
+        yield from self.tiers
+
+
+class TimeSeriesStore:
+    """Bounded in-memory history for named signals.
+
+    Every signal keeps its last ``raw_capacity`` samples plus averages per
+    tier (by default 1 minute for a day and 15 minutes for 30 days), so memory
+    is bounded per signal whatever the sampling rate. Queries are answered from
+    the finest tier that still covers the requested start.
+    """
+
+    def __init__(self, raw_capacity=2880, tiers=DEFAULT_TIERS, max_series=256):
+        """Initialize the store."""
+        self.raw_capacity = raw_capacity
+        self.tiers = tuple(tiers)
+        self.max_series = max_series
+        self._series = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def record(self, name, value, timestamp=None):
+        """Append a sample to a signal; None values and new signals beyond max_series are dropped."""
+        self.record_many({name: value}, timestamp)
+
+    def record_many(self, values, timestamp=None):
+        """Append one sample per signal from {name: value}, all at the same time."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for name, value in values.items():
+                if value is None:
+                    continue
+                series = self._series.get(name)
+                if series is None:
+                    if len(self._series) >= self.max_series:
+                        self.dropped += 1
+                        continue
+                    series = self._series[name] = Series(self.raw_capacity, self.tiers)
+                if not series.append(timestamp, float(value)):
+                    self.dropped += 1
+
+    def names(self):
+        """Return the recorded signal names."""
+        with self._lock:
+            return sorted(self._series)
+
+    def query(self, name, start=None, end=None, resolution=0):
+        """Return (resolution, timestamps, values) for a signal between start and end.
+
+        Uses the finest buffer at least ``resolution`` seconds coarse whose oldest
+        sample is no later than start (the coarsest one otherwise).
+        """
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                return None
+            candidates = [(size, buffer) for size, buffer in series.buffers() if size >= resolution and len(buffer)]
+            if not candidates:
+                return resolution, array("d"), array("d")
+            chosen = candidates[-1]
+            for size, buffer in candidates:
+                if start is None or buffer.first_time() <= start:
+                    chosen = (size, buffer)
+                    break
+            times, values = chosen[1].range(start, end)
+            return chosen[0], times, values
+
+    def summary(self, name, start=None, end=None):
+        """Return count, min, max and mean of a signal between start and end, at the finest resolution held."""
+        result = self.query(name, start, end)
+        if result is None or not result[2]:
+            return None
+        values = result[2]
+        return {"count": len(values), "min": min(values), "max": max(values), "mean": sum(values) / len(values)}
+
+    def get_stats(self):
+        """Return the number of signals, samples held and memory used."""
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "raw_samples": sum(len(series.raw) for series in self._series.values()),
+                "bytes": sum(series.nbytes for series in self._series.values()),
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,129 @@
+"""Read-through TTL cache with per-key freshness and LRU eviction."""
+
+import fnmatch
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _Inflight:
+    """A load in progress that concurrent readers of the same key wait on."""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Size-bounded read-through cache with per-key TTLs.
+
+    TTLs are chosen by the first matching glob in ``ttl_rules`` (for example
+    ``[("sensor.*_power", 2), ("sensor.*tariff*", 300)]``), falling back to
+    ``default_ttl``. A TTL of 0 disables caching for matching keys. Concurrent
+    misses for the same key are coalesced into a single load, and ``None``
+    results (failed loads) are never cached.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=2.0, ttl_rules=None):
+        """Initialize the cache."""
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttl_rules = [(pattern, float(ttl)) for pattern, ttl in (ttl_rules or [])]
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._inflight = {}
+        self._ttl_by_key = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def ttl_for(self, key):
+        """Get the TTL in seconds for a key."""
+        ttl = self._ttl_by_key.get(key)
+        if ttl is None:
+            ttl = self.default_ttl
+            for pattern, rule_ttl in self.ttl_rules:
+                if fnmatch.fnmatchcase(key, pattern):
+                    ttl = rule_ttl
+                    break
+            self._ttl_by_key[key] = ttl
+        return ttl
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss."""
+        ttl = self.ttl_for(key)
+        if ttl <= 0:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                inflight = self._inflight[key] = _Inflight()
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            inflight.event.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.value
+
+        try:
+            inflight.value = loader()
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                if inflight.error is None and inflight.value is not None:
+                    self._store(key, inflight.value, ttl)
+                del self._inflight[key]
+            inflight.event.set()
+        return inflight.value
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop a cached key."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every cached key."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Get hit/miss counters for TTL tuning."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
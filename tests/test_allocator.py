@@ -0,0 +1,76 @@
+"""Unit tests for allocator module."""
+
+import itertools
+import os
+import random
+import sys
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from allocator import allocate, priority_weight  # noqa: E402
+
+
+class TestAllocate(unittest.TestCase):
+    """Test cases for allocate."""
+
+    def test_fits_budget_by_priority(self):
+        """Test the most valuable set that fits is chosen, in item order."""
+        items = [("a", 2000, 8), ("b", 2000, 4), ("c", 1000, 4), ("d", 1000, 4)]
+        allocation = allocate(items, 3000)
+
+        self.assertEqual(allocation.chosen, ("a", "c"))
+        self.assertEqual((allocation.power, allocation.value, allocation.optimal), (3000, 12, True))
+
+    def test_beats_greedy(self):
+        """Test a single large item wins over the densest small one when it is worth more."""
+        allocation = allocate([("small", 10, 2), ("large", 1000, 100)], 1000)
+        self.assertEqual(allocation.chosen, ("large",))
+
+    def test_unpowered_items_always_fit(self):
+        """Test items without a power figure are chosen even with no surplus."""
+        allocation = allocate([("a", 0, 1), ("b", 500, 1)], -200)
+        self.assertEqual((allocation.chosen, allocation.power), (("a",), 0))
+        self.assertEqual(allocate([], 1000).chosen, ())
+
+    def test_matches_exhaustive_search(self):
+        """Test the result is optimal on random small instances."""
+        rng = random.Random(3)
+        for _ in range(100):
+            items = [
+                (i, rng.choice([0, 100, 700, 1500, 2000, 3000]), priority_weight(rng.randint(1, 10)))
+                for i in range(rng.randint(1, 10))
+            ]
+            budget = rng.randint(0, 6000)
+            best = max(
+                sum(value for _, _, value in subset)
+                for size in range(len(items) + 1)
+                for subset in itertools.combinations(items, size)
+                if sum(power for _, power, _ in subset) <= budget
+            )
+            allocation = allocate(items, budget, node_budget=10**6)
+            self.assertEqual(allocation.value, best)
+            self.assertLessEqual(allocation.power, budget)
+
+    def test_node_budget(self):
+        """Test an exhausted search still returns a set that fits, and the same set every time."""
+        rng = random.Random(1)
+        items = [(i, rng.uniform(100, 3000), priority_weight(rng.randint(1, 10))) for i in range(1000)]
+        allocation = allocate(items, 50000, node_budget=0)
+
+        self.assertFalse(allocation.optimal)
+        self.assertLessEqual(allocation.power, 50000)
+        self.assertGreater(len(allocation.chosen), 0)
+
+        searched = allocate(items, 50000)
+        self.assertGreaterEqual(searched.value, allocation.value)
+        self.assertEqual(allocate(items, 50000), searched)
+
+    def test_priority_weight(self):
+        """Test each priority step halves the weight, clamped to 1-10."""
+        self.assertEqual([priority_weight(p) for p in (0, 1, 2, 10, 12)], [512, 512, 256, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Unit tests for circuit_breaker module."""
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from circuit_breaker import AdaptiveTimeout, CircuitBreaker  # noqa: E402
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for CircuitBreaker class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, half_open_max_calls=1)
+
+    def _trip(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        """Test the circuit opens after consecutive failures and rejects requests."""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.get_stats()["rejected"], 1)
+
+    def test_success_resets_failure_count(self):
+        """Test a success in between failures keeps the circuit closed."""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    @patch("circuit_breaker.time.monotonic")
+    def test_half_open_probe_closes_circuit(self, mock_monotonic):
+        """Test a successful half-open probe closes the circuit."""
+        mock_monotonic.return_value = 100.0
+        self._trip()
+
+        mock_monotonic.return_value = 131.0
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())  # only one probe at a time
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    @patch("circuit_breaker.time.monotonic")
+    def test_failed_probe_reopens_circuit(self, mock_monotonic):
+        """Test a failed half-open probe re-opens the circuit."""
+        mock_monotonic.return_value = 100.0
+        self._trip()
+
+        mock_monotonic.return_value = 131.0
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.get_stats()["trips"], 2)
+
+    @patch("circuit_breaker.time.monotonic")
+    def test_released_probe_can_be_retaken(self, mock_monotonic):
+        """Test a probe that ended without an outcome frees its slot instead of blocking forever."""
+        mock_monotonic.return_value = 100.0
+        self._trip()
+
+        mock_monotonic.return_value = 131.0
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+class TestAdaptiveTimeout(unittest.TestCase):
+    """Test cases for AdaptiveTimeout class."""
+
+    def test_starts_at_maximum(self):
+        """Test the timeout is the maximum until latency is measured."""
+        self.assertEqual(AdaptiveTimeout(minimum=1, maximum=10).value, 10)
+
+    def test_follows_measured_latency(self):
+        """Test the timeout shrinks towards measured latency within bounds."""
+        timeout = AdaptiveTimeout(minimum=0.5, maximum=10)
+        for _ in range(50):
+            timeout.observe(0.2)
+        self.assertLess(timeout.value, 1.0)
+        self.assertGreaterEqual(timeout.value, 0.5)
+
+    def test_timeout_backs_off(self):
+        """Test a timeout doubles the estimate, capped at the maximum."""
+        timeout = AdaptiveTimeout(minimum=1, maximum=10)
+        for _ in range(50):
+            timeout.observe(0.1)
+        self.assertEqual(timeout.value, 1)
+
+        timeout.observe_timeout()
+        self.assertEqual(timeout.value, 2)
+        for _ in range(5):
+            timeout.observe_timeout()
+        self.assertEqual(timeout.value, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
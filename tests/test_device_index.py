@@ -0,0 +1,100 @@
+"""Unit tests for device_index module."""
+
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from device_index import DeviceIndex, iter_json_array  # noqa: E402
+
+
+def chunked(text, size):
+    """Split encoded text into fixed-size byte chunks."""
+    data = text.encode()
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestIterJsonArray(unittest.TestCase):
+    """Test cases for the incremental array parser."""
+
+    def test_matches_json_loads_for_any_chunk_size(self):
+        """Test elements split across chunks, including multi-byte characters, decode intact."""
+        items = [
+            {"entity_id": "switch.kettle", "attributes": {"friendly_name": "Küche ☕", "list": [1, 2, 3]}},
+            12345,
+            "text, with ] and , inside",
+            None,
+            [{"nested": True}],
+        ]
+        text = " [ " + ",\n ".join(json.dumps(item, ensure_ascii=False) for item in items) + " ] "
+
+        for size in (1, 2, 3, 7, 64, 10000):
+            self.assertEqual(list(iter_json_array(chunked(text, size))), items, size)
+
+    def test_empty_array(self):
+        """Test an empty array yields nothing."""
+        self.assertEqual(list(iter_json_array([b"[", b"]"])), [])
+
+    def test_truncated_array_raises(self):
+        """Test a response cut off mid-array is reported."""
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[{"entity_id": "switch.a"}, {"entity']))
+
+    def test_not_an_array_raises(self):
+        """Test non-array bodies are rejected."""
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'{"message": "error"}']))
+
+
+class TestDeviceIndex(unittest.TestCase):
+    """Test cases for DeviceIndex class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.index = DeviceIndex(max_age=60)
+        self.index.replace(
+            [
+                {"entity_id": "switch.a", "state": "on", "attributes": {"friendly_name": "A", "color": [1] * 50}},
+                {"entity_id": "light.b", "state": "off", "attributes": {}},
+                {"entity_id": "sensor.c", "state": "1"},
+            ]
+        )
+
+    def test_keeps_controllable_devices_only(self):
+        """Test non-controllable entities and unneeded attributes are dropped."""
+        self.assertEqual(len(self.index), 2)
+        switch = self.index.devices("switch")[0]
+        self.assertEqual(switch["name"], "A")
+        self.assertEqual(switch["attributes"], {"friendly_name": "A"})
+        self.assertEqual(self.index.devices("light")[0]["name"], "light.b")
+
+    def test_apply_updates_and_removes(self):
+        """Test single-entity updates patch the index in place."""
+        self.index.apply("switch.a", {"entity_id": "switch.a", "state": "off"})
+        self.index.apply("light.b", None)
+        self.index.apply("sensor.c", {"entity_id": "sensor.c", "state": "2"})
+
+        self.assertEqual([device["state"] for device in self.index.devices()], ["off"])
+
+    def test_dirty_tracking(self):
+        """Test only indexed domains are marked dirty and applying clears the flag."""
+        self.index.mark_dirty(["switch.a", "light.b", "sensor.c"])
+        self.index.apply("light.b", {"entity_id": "light.b", "state": "on"})
+
+        self.assertEqual(self.index.pop_dirty(), {"switch.a"})
+        self.assertEqual(self.index.pop_dirty(), set())
+
+    def test_staleness(self):
+        """Test the index reports stale once max_age has passed."""
+        self.assertTrue(DeviceIndex().is_stale())
+        self.assertFalse(self.index.is_stale())
+        with patch("device_index.time.monotonic", return_value=self.index._loaded_at + 61):
+            self.assertTrue(self.index.is_stale())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Unit tests for device_registry module."""
+
+import os
+import sys
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from device_registry import DeviceRegistry, ManagedDevice  # noqa: E402
+from schedule import compile_schedule  # noqa: E402
+
+
+class TestManagedDevice(unittest.TestCase):
+    """Test cases for ManagedDevice class."""
+
+    def test_round_trip(self):
+        """Test stored dicts parse and serialize back unchanged, including unknown keys."""
+        info = {
+            "priority": 2,
+            "power_consumption": 1500.0,
+            "enabled": True,
+            "last_controlled": None,
+            "last_heating_change": "2024-11-04T12:00:00",
+            "schedule": {"start": "08:00", "end": "22:00", "days": [0, 1]},
+            "allow_direct_control": False,
+            "auto_start_automation": "script.boost",
+            "required_run_duration": 60,
+            "notes": "kept",
+        }
+        device = ManagedDevice.from_dict("climate.heater", info)
+
+        self.assertEqual(device.to_dict(), info)
+        self.assertTrue(device.compiled_schedule.allows(8 * 60))
+        self.assertTrue(device.heating)
+        self.assertFalse(hasattr(device, "__dict__"))
+
+    def test_validation(self):
+        """Test invalid settings are rejected."""
+        for info in (
+            {"priority": "high"},
+            {"power_consumption": -5},
+            {"schedule": {"start": "8am", "end": "10:00"}},
+            {"schedule": {"days": [7]}},
+            {"schedule": "weekdays"},
+        ):
+            with self.assertRaises(ValueError):
+                ManagedDevice.from_dict("switch.a", info)
+
+    def test_legacy_schedules_load(self):
+        """Test stored schedules with one time or single-digit hours still load."""
+        registry = DeviceRegistry(
+            {
+                "switch.partial": {"schedule": {"start": "", "end": "22:00", "days": [0, 1]}},
+                "switch.short": {"schedule": {"start": "8:00", "end": "22:00"}},
+            }
+        )
+        self.assertEqual(registry.rejected, {})
+        self.assertEqual(registry.device("switch.partial").compiled_schedule, compile_schedule({"days": [0, 1]}))
+        self.assertTrue(registry.device("switch.short").compiled_schedule.allows(8 * 60))
+        self.assertEqual(registry["switch.short"]["schedule"], {"start": "8:00", "end": "22:00"})
+
+    def test_snapshot(self):
+        """Test the planner snapshot carries settings and the current state."""
+        device = ManagedDevice.from_dict("switch.a", {"priority": 3, "schedule": {"days": [5]}})
+        snapshot = device.snapshot({"state": "off"})
+        self.assertEqual((snapshot.state, snapshot.priority), ("off", 3))
+        self.assertIs(snapshot.schedule, device.compiled_schedule)
+        self.assertFalse(snapshot.heating)
+        self.assertIsNone(device.snapshot(None).state)
+
+
+class TestDeviceRegistry(unittest.TestCase):
+    """Test cases for DeviceRegistry class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.registry = DeviceRegistry(
+            {
+                "switch.c": {"priority": 8},
+                "switch.a": {"priority": 1, "allow_direct_control": False},
+                "switch.heater": {"priority": 4},
+                "switch.off": {"priority": 2, "enabled": False},
+                "switch.broken": {"priority": "x"},
+            }
+        )
+
+    def ids(self, devices):
+        return [device.entity_id for device in devices]
+
+    def test_indexes(self):
+        """Test priority order and secondary indexes; invalid entries are left out of them."""
+        self.assertEqual(self.ids(self.registry.by_priority), ["switch.a", "switch.off", "switch.heater", "switch.c"])
+        self.assertEqual(self.ids(self.registry.enabled), ["switch.a", "switch.heater", "switch.c"])
+        self.assertEqual(self.ids(self.registry.controllable), ["switch.heater", "switch.c"])
+        self.assertIsNone(self.registry.device("switch.broken"))
+
+    def test_indexes_follow_changes(self):
+        """Test add, update and remove keep the indexes current."""
+        self.registry.add(ManagedDevice("switch.b", priority=1))
+        self.registry.update("switch.c", priority=0)
+        self.registry.remove("switch.heater")
+
+        self.assertEqual(self.ids(self.registry.enabled), ["switch.c", "switch.a", "switch.b"])
+        self.assertNotIn("switch.heater", self.ids(self.registry.by_priority))
+        self.assertFalse(self.registry.remove("switch.heater"))
+        with self.assertRaises(ValueError):
+            self.registry.update("switch.c", priority="low")
+        self.assertEqual(self.registry["switch.c"]["priority"], 0)
+
+    def test_mapping_view_and_runtime_fields(self):
+        """Test the mapping yields stored dicts and runtime fields update in place."""
+        self.registry.mark_controlled("switch.c", "2024-11-04T12:00:00")
+        enabled = self.registry.enabled
+
+        self.assertEqual(self.registry["switch.c"]["last_controlled"], "2024-11-04T12:00:00")
+        self.assertIs(self.registry.enabled, enabled)
+        self.assertEqual(len(self.registry), 5)
+        self.assertEqual(dict(self.registry)["switch.off"]["enabled"], False)
+
+    def test_rejected_entries_are_kept(self):
+        """Test an invalid stored entry is saved back unchanged and becomes a device once fixed."""
+        self.assertIn("switch.broken", self.registry)
+        self.assertEqual(dict(self.registry)["switch.broken"], {"priority": "x"})
+        self.assertNotIn("switch.broken", self.ids(self.registry.by_priority))
+
+        device = self.registry.update("switch.broken", priority=3)
+        self.assertEqual(self.registry.device("switch.broken"), device)
+        self.assertEqual(self.registry.rejected, {})
+        self.assertIn("switch.broken", self.ids(self.registry.controllable))
+
+        self.registry = DeviceRegistry({"switch.broken": {"priority": "x"}})
+        self.assertTrue(self.registry.remove("switch.broken"))
+        self.assertEqual(len(self.registry), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Unit tests for device_store module."""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from device_store import DeviceStore, write_json_atomic  # noqa: E402
+
+
+class TestDeviceStore(unittest.TestCase):
+    """Test cases for DeviceStore class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "managed_devices.json")
+        self.store = DeviceStore(self.path, flush_interval=0.1)
+        self.devices = {"switch.a": {"priority": 1, "last_controlled": None}}
+
+    def tearDown(self):
+        """Clean up the temporary directory."""
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_load_missing_and_round_trip(self):
+        """Test a missing file loads as empty and saved devices load back."""
+        self.assertEqual(self.store.load(), {})
+
+        self.store.mark_dirty()
+        self.assertTrue(self.store.save(self.devices, force=True))
+
+        self.assertEqual(DeviceStore(self.path).load(), self.devices)
+        self.assertEqual(os.listdir(self.directory), ["managed_devices.json"])
+
+    def test_clean_save_does_not_write(self):
+        """Test nothing is written when no device changed."""
+        self.assertFalse(self.store.save(self.devices))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_writes_are_coalesced(self):
+        """Test changes within the flush interval are written once by the timer."""
+        self.store.mark_dirty()
+        self.store.save(self.devices, force=True)
+
+        for value in ("t1", "t2", "t3"):
+            self.devices["switch.a"]["last_controlled"] = value
+            self.store.mark_dirty("switch.a")
+            self.assertFalse(self.store.save(self.devices))
+
+        self.assertIsNone(self.read()["switch.a"]["last_controlled"])
+        deadline = time.monotonic() + 2
+        while self.store.dirty and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self.read()["switch.a"]["last_controlled"], "t3")
+        self.assertEqual(self.store.get_stats()["writes"], 2)
+
+    def test_close_flushes_pending(self):
+        """Test close() writes changes still waiting for the flush interval."""
+        self.store.mark_dirty()
+        self.store.save(self.devices, force=True)
+        self.devices["switch.b"] = {"priority": 2}
+        self.store.mark_dirty("switch.b")
+        self.store.save(self.devices)
+
+        self.assertTrue(self.store.close())
+        self.assertIn("switch.b", self.read())
+        self.assertFalse(self.store.dirty)
+
+    def test_failed_write_keeps_old_file(self):
+        """Test an error while writing leaves the previous file intact and stays dirty."""
+        self.store.mark_dirty()
+        self.store.save(self.devices, force=True)
+
+        self.store.mark_dirty("switch.a")
+        with patch("device_store.json.dump", side_effect=ValueError("boom")):
+            self.assertFalse(self.store.save({"switch.a": {}}, force=True))
+
+        self.assertEqual(self.read(), self.devices)
+        self.assertTrue(self.store.dirty)
+        self.assertEqual(os.listdir(self.directory), ["managed_devices.json"])
+        self.assertEqual(self.store.get_stats()["failures"], 1)
+
+    def test_write_json_atomic_creates_directory(self):
+        """Test the target directory is created if missing."""
+        path = os.path.join(self.directory, "nested", "file.json")
+        write_json_atomic(path, [1, 2])
+        with open(path) as f:
+            self.assertEqual(json.load(f), [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,18 @@
 """Unit tests for energy_manager module."""
 
+import asyncio
 import os
+import shutil
 import sys
+import tempfile
 import unittest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock, patch
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
 
-from energy_manager import EnergyManager  # noqa: E402
+from energy_manager import CONTROL_DECISIONS, CYCLE_PHASE_SECONDS, EnergyManager  # noqa: E402
+from ha_client import HomeAssistantUnavailable  # noqa: E402
 
 
 class TestEnergyManager(unittest.TestCase):
@@ -64,6 +68,25 @@ class TestEnergyManager(unittest.TestCase):
 
         self.assertNotIn("switch.test", self.manager.managed_devices)
 
+    def test_update_device(self):
+        """Test settings changes are validated, saved and reorder the control list."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.a", priority=2)
+        self.manager.add_device("switch.b", priority=5)
+
+        self.assertTrue(self.manager.update_device("switch.b", priority=1))
+        self.assertEqual(
+            [device.entity_id for device in self.manager.managed_devices.enabled], ["switch.b", "switch.a"]
+        )
+        self.manager.save_managed_devices.assert_called_with("switch.b")
+
+        with self.assertRaises(ValueError):
+            self.manager.update_device("switch.a", schedule={"start": "25:00"})
+        with self.assertRaises(ValueError):
+            self.manager.update_device("switch.a", schedule={"start": "", "end": "22:00"})
+        self.assertFalse(self.manager.update_device("switch.missing", priority=1))
+
     def test_calculate_cop(self):
         """Test COP calculation."""
         cop = self.manager.calculate_cop(10.0, 2.0)
@@ -122,6 +145,240 @@ class TestEnergyManager(unittest.TestCase):
         self.assertIn("automation_enabled", status)
         self.assertIn("managed_device_count", status)
 
+    def test_update_and_control_uses_single_snapshot(self):
+        """Test one automation cycle reads state with a single bulk request."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.a", priority=1)
+        self.manager.add_device("switch.b", priority=2)
+        self.mock_ha_client.get_states = Mock(
+            return_value=[
+                {"entity_id": "sensor.solar", "state": "1500"},
+                {"entity_id": "sensor.cost", "state": "0.20"},
+                {"entity_id": "sensor.gas", "state": "0.05"},
+                {"entity_id": "switch.a", "state": "off"},
+                {"entity_id": "switch.b", "state": "on"},
+            ]
+        )
+        self.mock_ha_client.call_service = Mock(return_value=True)
+
+        asyncio.run(self.manager.update_and_control())
+
+        self.mock_ha_client.get_states.assert_called_once()
+        self.mock_ha_client.get_state.assert_not_called()
+        self.mock_ha_client.get_sensor_value.assert_not_called()
+        self.mock_ha_client.call_service.assert_called_once_with("switch", "turn_on", "switch.a")
+
+    def test_cycle_records_phase_metrics(self):
+        """Test a cycle records each phase duration and counts decisions by reason."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.a", priority=1)
+        self.mock_ha_client.get_states = Mock(
+            return_value=[{"entity_id": "sensor.solar", "state": "1500"}, {"entity_id": "switch.a", "state": "off"}]
+        )
+        self.mock_ha_client.call_service = Mock(return_value=True)
+        phases = ("read", "publish", "decide", "actuate")
+        counts_before = {phase: CYCLE_PHASE_SECONDS.get_count(phase=phase) for phase in phases}
+        decisions_before = CONTROL_DECISIONS.get(reason="solar_excess")
+
+        asyncio.run(self.manager.update_and_control())
+
+        for phase in phases:
+            self.assertEqual(CYCLE_PHASE_SECONDS.get_count(phase=phase), counts_before[phase] + 1, phase)
+        self.assertEqual(CONTROL_DECISIONS.get(reason="solar_excess"), decisions_before + 1)
+
+    def test_saving_session_sends_one_call_per_domain(self):
+        """Test a saving-session shed switches all devices in one batched call per domain."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        for i in range(20):
+            self.manager.add_device(f"switch.device_{i}", priority=5)
+        self.manager.add_device("light.lamp", priority=5)
+        self.manager.add_device("switch.essential", priority=1)
+        self.mock_ha_client.get_states = Mock(
+            return_value=[{"entity_id": entity_id, "state": "on"} for entity_id in self.manager.managed_devices]
+        )
+        self.manager.async_client = Mock()
+        self.manager.async_client.call_service = AsyncMock(return_value=True)
+        self.manager.async_client.call_service_batch = lambda batch: batch.execute_async(self.manager.async_client)
+
+        async def shed():
+            with self.manager.state_snapshot():
+                await self.manager.handle_saving_session()
+
+        asyncio.run(shed())
+
+        calls = self.manager.async_client.call_service.await_args_list
+        self.assertEqual(len(calls), 2)
+        switch_call = next(call for call in calls if call.args[0] == "switch")
+        self.assertEqual(switch_call.args[1], "turn_off")
+        self.assertEqual(len(switch_call.args[2]), 20)
+        self.assertIsNone(self.manager.managed_devices["switch.essential"]["last_controlled"])
+        self.assertIsNotNone(self.manager.managed_devices["switch.device_0"]["last_controlled"])
+
+    def test_smart_control_tracks_success_per_entity(self):
+        """Test only successfully switched devices are marked and published."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager._publish_control_decision = Mock()
+        self.manager.add_device("switch.a", priority=1)
+        self.manager.add_device("light.b", priority=2)
+        self.mock_ha_client.get_states = Mock(
+            return_value=[{"entity_id": "switch.a", "state": "off"}, {"entity_id": "light.b", "state": "off"}]
+        )
+        self.mock_ha_client.call_service = Mock(side_effect=lambda domain, *args: domain == "switch")
+
+        async def control():
+            with self.manager.state_snapshot():
+                await self.manager.handle_smart_control(2000, 0.1)
+
+        asyncio.run(control())
+
+        self.assertEqual(self.mock_ha_client.call_service.call_count, 2)
+        self.assertIsNotNone(self.manager.managed_devices["switch.a"]["last_controlled"])
+        self.assertIsNone(self.manager.managed_devices["light.b"]["last_controlled"])
+        self.manager._publish_control_decision.assert_called_once_with("switch.a", True, "solar_excess")
+        self.assertEqual(self.manager.store._dirty, {"switch.a"})
+        self.manager.save_managed_devices.assert_called_with(deferred=True)
+
+    def test_cycle_records_history(self):
+        """Test a cycle records inputs and decisions in memory and, with SQLite, on disk."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.config.update({"storage_backend": "sqlite", "persist_flush_interval": 0})
+        with patch("energy_manager.MANAGED_DEVICES_DB", os.path.join(directory, "smart_energy.db")):
+            manager = EnergyManager(self.mock_ha_client, self.config)
+        self.addCleanup(manager.close)
+        manager._publish_device_entity = Mock()
+        manager._publish_control_decision = Mock()
+        manager.add_device("switch.a", priority=1)
+        self.mock_ha_client.get_states = Mock(
+            return_value=[{"entity_id": "sensor.solar", "state": "1500"}, {"entity_id": "switch.a", "state": "off"}]
+        )
+        self.mock_ha_client.call_service = Mock(return_value=True)
+
+        asyncio.run(manager.update_and_control())
+
+        self.assertEqual(manager.store.load(), manager.managed_devices)
+        self.assertEqual(manager.history.get_decisions()[0]["reason"], "solar_excess")
+        self.assertEqual(manager.history.get_samples("sensor.solar")[0]["value"], 1500.0)
+        self.assertEqual(list(manager.timeseries.query("sensor.solar")[2]), [1500.0])
+        self.assertEqual(list(manager.timeseries.query("decision:switch.a")[2]), [1.0])
+
+    def test_cycle_skipped_when_ha_unavailable(self):
+        """Test the controller skips the cycle instead of acting on fake zero readings."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.a", priority=9)
+        self.mock_ha_client.get_states = Mock(side_effect=HomeAssistantUnavailable("circuit open"))
+        self.mock_ha_client.call_service = Mock(return_value=True)
+
+        asyncio.run(self.manager.update_and_control())
+
+        self.mock_ha_client.call_service.assert_not_called()
+        self.mock_ha_client.set_state.assert_not_called()
+
+    def test_preview_plan_does_not_switch(self):
+        """Test the dry-run preview plans from current state without touching devices."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.a", priority=1)
+        self.mock_ha_client.get_states = Mock(
+            return_value=[{"entity_id": "sensor.solar", "state": "1500"}, {"entity_id": "switch.a", "state": "off"}]
+        )
+
+        preview = self.manager.preview_plan()
+
+        self.assertEqual(preview["snapshot"]["solar_generation"], 1500.0)
+        self.assertEqual(
+            preview["plan"]["actions"], [{"entity_id": "switch.a", "turn_on": True, "reason": "solar_excess"}]
+        )
+        self.mock_ha_client.call_service.assert_not_called()
+        self.mock_ha_client.set_state.assert_not_called()
+
+    def test_cadence_inputs(self):
+        """Test the adaptive interval sees last cycle's readings only when devices are managed."""
+        self.assertEqual(self.manager.cadence_inputs(), {})
+        self.manager.last_control = self.manager.build_control_snapshot(solar_generation=900, electricity_cost=0.2)
+        self.assertEqual(self.manager.cadence_inputs(), {})
+
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.a")
+        inputs = self.manager.cadence_inputs()
+        self.assertEqual(inputs["solar"], (900, (500, 1000)))
+        self.assertEqual(inputs["cost"], (0.2, (0.25, 0.30)))
+        self.assertNotIn("surplus", inputs)
+
+        self.manager.add_device("switch.b", power_consumption=800)
+        self.mock_ha_client.get_state = Mock(return_value={"state": "off"})
+        self.manager.last_control = self.manager.build_control_snapshot(solar_generation=1500, electricity_cost=0.2)
+        self.assertEqual(self.manager.cadence_inputs()["surplus"], (500, (800,)))
+
+    def test_is_trigger(self):
+        """Test only changes that could alter a decision trigger a cycle."""
+        self.config["saving_session_sensors"] = ["binary_sensor.saving"]
+        manager = EnergyManager(self.mock_ha_client, self.config)
+        manager.save_managed_devices = Mock()
+        manager._publish_device_entity = Mock()
+        manager.add_device("switch.a")
+
+        def state(value):
+            return {"state": value}
+
+        # Solar moving within a band does not matter; crossing 1000 W does
+        self.assertFalse(manager.is_trigger("sensor.solar", state("1100"), state("1900")))
+        self.assertTrue(manager.is_trigger("sensor.solar", state("900"), state("1100")))
+        self.assertTrue(manager.is_trigger("sensor.cost", state("0.20"), state("unavailable")))
+        self.assertTrue(manager.is_trigger("binary_sensor.saving", state("off"), state("on")))
+        self.assertFalse(manager.is_trigger("binary_sensor.saving", state("on"), state("active")))
+        self.assertFalse(manager.is_trigger("sensor.unrelated", state("1"), state("2")))
+        self.assertTrue(manager.is_trigger(None, None, None))
+
+        # Managed devices: a manual switch counts, the controller's own recent switch does not
+        self.assertTrue(manager.is_trigger("switch.a", state("off"), state("on")))
+        self.assertFalse(manager.is_trigger("switch.a", state("on"), state("on")))
+        manager._mark_controlled(["switch.a"])
+        self.assertFalse(manager.is_trigger("switch.a", state("on"), state("off")))
+
+    def test_surplus_triggers(self):
+        """Test solar and house load changes trigger once the surplus crosses the smallest device that could start."""
+        self.config["house_load_sensor"] = "sensor.load"
+        manager = EnergyManager(self.mock_ha_client, self.config)
+        manager.save_managed_devices = Mock()
+        manager._publish_device_entity = Mock()
+        manager.add_device("switch.kettle", power_consumption=2000)
+        manager.add_device("switch.pump", power_consumption=600)
+        self.mock_ha_client.get_state = Mock(return_value={"state": "off"})
+        self.mock_ha_client.get_sensor_value = Mock(return_value=1000.0)
+
+        def state(value):
+            return {"state": value}
+
+        self.assertFalse(manager.is_trigger("sensor.load", state("900"), state("1500")))  # no cycle yet
+        manager.last_control = manager.build_control_snapshot(solar_generation=1500, electricity_cost=0.2)
+
+        # Surplus 500 W: the 600 W pump fits once it rises past 600 W, whichever input moves it
+        self.assertFalse(manager.is_trigger("sensor.solar", state("1500"), state("1550")))
+        self.assertTrue(manager.is_trigger("sensor.solar", state("1500"), state("1700")))
+        self.assertTrue(manager.is_trigger("sensor.load", state("1000"), state("800")))
+        self.assertFalse(manager.is_trigger("sensor.load", state("1000"), state("1400")))
+        self.assertTrue(manager.is_trigger("sensor.load", state("1000"), state("unavailable")))
+
+    def test_state_snapshot_scope(self):
+        """Test reads only resolve against the snapshot inside the block."""
+        self.mock_ha_client.get_states = Mock(return_value=[{"entity_id": "sensor.solar", "state": "900"}])
+        self.mock_ha_client.get_sensor_value = Mock(return_value=100.0)
+
+        with self.manager.state_snapshot():
+            self.assertEqual(self.manager.get_solar_generation(), 900.0)
+            with self.manager.state_snapshot():
+                self.assertEqual(self.manager.get_solar_generation(), 900.0)
+        self.mock_ha_client.get_states.assert_called_once()
+
+        self.assertEqual(self.manager.get_solar_generation(), 100.0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,125 @@
+"""Unit tests for forecast module."""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from forecast import LINEAR, ForecastCache, ParsedForecast  # noqa: E402
+
+POINTS = [
+    {"timestamp": "2024-11-04T10:00:00", "power": 1000},
+    {"timestamp": "2024-11-04T10:30:00+00:00", "power": "1500.5"},
+    {"timestamp": "not a time", "power": 1},
+    {"timestamp": "2024-11-04T11:00:00"},
+]
+
+
+def state(points=POINTS, last_updated="2024-11-04T09:00:00+00:00"):
+    """A forecast sensor state."""
+    return {"state": "ok", "attributes": {"forecast": points}, "last_updated": last_updated}
+
+
+class TestParsedForecast(unittest.TestCase):
+    """Test cases for ParsedForecast class."""
+
+    def test_columns(self):
+        """Test points are parsed into epoch times, values and ISO labels; malformed ones are skipped."""
+        with self.assertLogs("forecast", level="WARNING"):
+            parsed = ParsedForecast(POINTS, "power")
+
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual(list(parsed.values), [1000.0, 1500.5])
+        self.assertEqual(parsed.times[0], datetime(2024, 11, 4, 10).timestamp())
+        self.assertEqual(parsed.labels, ["2024-11-04T10:00:00", "2024-11-04T10:30:00+00:00"])
+        self.assertEqual(parsed.skipped, 2)
+        self.assertIs(parsed.points, POINTS)
+
+
+def points(minutes, values, key="power"):
+    """Points at the given minutes after 2024-11-04T10:00Z."""
+    return [{"timestamp": f"2024-11-04T{10 + m // 60}:{m % 60:02d}:00+00:00", key: v} for m, v in zip(minutes, values)]
+
+
+class TestForecastGrid(unittest.TestCase):
+    """Test cases for resampling onto a ForecastGrid."""
+
+    def test_step_prices_are_held(self):
+        """Test half-hourly prices give two equal quarter-hour cells each, labelled in the forecast's timezone."""
+        grid = ParsedForecast(points([0, 30], [0.2, 0.1], "cost"), "cost").on_grid(900)
+
+        self.assertEqual(list(grid.values), [0.2, 0.2, 0.1, 0.1])
+        self.assertEqual(grid.label(1), "2024-11-04T10:15:00+00:00")
+        self.assertEqual(grid.cells(60), 4)
+        self.assertEqual(grid.cells(1), 1)
+
+    def test_window_spans_real_time(self):
+        """Test a 60 minute run over half-hourly points is two cells, not 60 samples."""
+        grid = ParsedForecast(points([0, 30, 60, 90], [0.3, 0.1, 0.1, 0.3], "cost"), "cost").on_grid(1800)
+        self.assertEqual(grid.finder.best(grid.cells(60), count=1, highest=False), [(1, 0.1)])
+
+    def test_linear_keeps_energy(self):
+        """Test interpolated solar keeps the energy under the curve whatever the resolution."""
+        parsed = ParsedForecast(points([0, 60, 120], [0, 1200, 0]), "power", interpolation=LINEAR)
+        quarters = parsed.on_grid(900)
+
+        self.assertEqual(list(quarters.values[:4]), [150.0, 450.0, 750.0, 1050.0])
+        for step in (300, 900, 3600):
+            grid = parsed.on_grid(step)
+            self.assertAlmostEqual(sum(grid.values) * step, sum(quarters.values) * 900)
+        self.assertIs(parsed.on_grid(900), quarters)
+
+    def test_irregular_points(self):
+        """Test unevenly spaced, unordered points are averaged by the time each value covers."""
+        grid = ParsedForecast(points([45, 0, 10, 60], [4, 1, 2, 4], "cost"), "cost").on_grid(1800)
+
+        # [10:00, 10:30): 1 for 10 min, 2 for 20 min; [10:30, 11:00): 2 for 15 min, 4 for 15 min
+        self.assertAlmostEqual(grid.values[0], (10 + 40) / 30)
+        self.assertAlmostEqual(grid.values[1], 3)
+        self.assertEqual(grid.label(0), "2024-11-04T10:00:00+00:00")
+
+    def test_empty(self):
+        """Test a forecast without points gives an empty grid."""
+        grid = ParsedForecast([], "power").on_grid(900)
+        self.assertEqual(len(grid), 0)
+        self.assertEqual(grid.finder.best(1), [])
+
+
+class TestForecastCache(unittest.TestCase):
+    """Test cases for ForecastCache class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.cache = ForecastCache()
+
+    def test_reparses_only_on_change(self):
+        """Test a forecast is reused until last_updated changes."""
+        first = self.cache.get("sensor.solcast", state(POINTS[:2]), "power")
+        self.assertIs(self.cache.get("sensor.solcast", state(POINTS[:2]), "power"), first)
+
+        changed = self.cache.get("sensor.solcast", state(POINTS[:1], "2024-11-04T09:30:00+00:00"), "power")
+        self.assertIsNot(changed, first)
+        self.assertEqual(len(changed), 1)
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["forecasts"]["sensor.solcast"]["points"], 1)
+
+    def test_without_last_updated_or_forecast(self):
+        """Test states without last_updated are always parsed and states without a forecast give None."""
+        bare = {"attributes": {"forecast": POINTS[:1]}}
+        self.assertIsNot(self.cache.get("sensor.a", bare, "power"), self.cache.get("sensor.a", bare, "power"))
+        self.assertIsNone(self.cache.get("sensor.a", None, "power"))
+        self.assertIsNone(self.cache.get("sensor.a", {"attributes": {}}, "power"))
+
+    def test_invalidate(self):
+        """Test invalidation drops a sensor's parsed forecast."""
+        first = self.cache.get("sensor.a", state(POINTS[:1]), "power")
+        self.cache.invalidate("sensor.a")
+        self.assertIsNot(self.cache.get("sensor.a", state(POINTS[:1]), "power"), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
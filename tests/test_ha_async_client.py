@@ -0,0 +1,133 @@
+"""Unit tests for ha_async_client module."""
+
+import asyncio
+import os
+import sys
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from circuit_breaker import CircuitBreaker  # noqa: E402
+from ha_async_client import AsyncHomeAssistantClient  # noqa: E402
+from ha_client import HomeAssistantUnavailable, ServiceCallBatch  # noqa: E402
+
+
+class TestAsyncHomeAssistantClient(unittest.IsolatedAsyncioTestCase):
+    """Test cases for AsyncHomeAssistantClient class."""
+
+    async def asyncSetUp(self):
+        """Start a local stand-in HA server."""
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.service_calls = []
+
+        async def get_state(request):
+            entity_id = request.match_info["entity_id"]
+            if entity_id == "sensor.missing":
+                raise web.HTTPNotFound()
+            if entity_id == "sensor.forbidden":
+                raise web.HTTPForbidden()
+            if entity_id == "sensor.garbled":
+                return web.Response(text="{not json", content_type="application/json")
+            return web.json_response({"entity_id": entity_id, "state": "42.5"})
+
+        async def call_service(request):
+            domain = request.match_info["domain"]
+            self.service_calls.append((domain, request.match_info["service"], await request.json()))
+            self.in_flight[domain] = self.in_flight.get(domain, 0) + 1
+            self.max_in_flight[domain] = max(self.max_in_flight.get(domain, 0), self.in_flight[domain])
+            await asyncio.sleep(0.02)
+            self.in_flight[domain] -= 1
+            return web.json_response([])
+
+        app = web.Application()
+        app.router.add_get("/api/states/{entity_id}", get_state)
+        app.router.add_post("/api/services/{domain}/{service}", call_service)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.client = AsyncHomeAssistantClient(
+            "test_token", base_url=str(self.server.make_url("/api")), domain_concurrency={"light": 2}
+        )
+
+    async def asyncTearDown(self):
+        """Stop the server and close the client."""
+        await self.client.close()
+        await self.server.close()
+
+    async def test_get_state(self):
+        """Test getting single state."""
+        state = await self.client.get_state("switch.test")
+        self.assertEqual(state["entity_id"], "switch.test")
+
+    async def test_get_sensor_value(self):
+        """Test getting sensor value."""
+        self.assertEqual(await self.client.get_sensor_value("sensor.power"), 42.5)
+        self.assertEqual(await self.client.get_sensor_value("sensor.missing"), 0.0)
+
+    async def test_turn_on_and_off(self):
+        """Test turning devices on and off."""
+        self.assertTrue(await self.client.turn_on("switch.test"))
+        self.assertTrue(await self.client.turn_off("switch.test"))
+        self.assertEqual(
+            [(domain, service) for domain, service, _ in self.service_calls],
+            [("switch", "turn_on"), ("switch", "turn_off")],
+        )
+        self.assertEqual(self.service_calls[0][2], {"entity_id": "switch.test"})
+
+    async def test_concurrent_calls_respect_domain_limit(self):
+        """Test service calls run concurrently but within the per-domain limit."""
+        results = await asyncio.gather(
+            *[self.client.turn_off(f"switch.device_{i}") for i in range(6)],
+            *[self.client.turn_off(f"light.lamp_{i}") for i in range(6)],
+        )
+
+        self.assertTrue(all(results))
+        self.assertEqual(self.max_in_flight["switch"], 6)
+        self.assertEqual(self.max_in_flight["light"], 2)
+
+    async def test_call_service_batch(self):
+        """Test a batch sends one request per domain and service."""
+        batch = ServiceCallBatch()
+        for i in range(5):
+            batch.turn_off(f"switch.device_{i}")
+        batch.turn_on("light.lamp")
+
+        results = await self.client.call_service_batch(batch)
+
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(results.values()))
+        self.assertEqual(len(self.service_calls), 2)
+        switch_call = next(call for call in self.service_calls if call[0] == "switch")
+        self.assertEqual(len(switch_call[2]["entity_id"]), 5)
+
+    async def test_bad_body_releases_half_open_probe(self):
+        """Test a probe whose body cannot be decoded does not leave the breaker stuck half-open."""
+        self.client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.client.breaker.record_failure()
+
+        self.assertIsNone(await self.client.get_state("sensor.garbled"))
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual((await self.client.get_state("switch.test"))["entity_id"], "switch.test")
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_strict_read_raises_on_failed_read(self):
+        """Test strict reads raise on a 4xx or unreadable body but not on an unknown entity."""
+        for entity_id in ("sensor.forbidden", "sensor.garbled"):
+            with self.assertRaises(HomeAssistantUnavailable):
+                await self.client.get_state(entity_id, strict=True)
+        self.assertIsNone(await self.client.get_state("sensor.missing", strict=True))
+        with self.assertRaises(HomeAssistantUnavailable):
+            await self.client.get_states(strict=True)
+
+    async def test_service_error_returns_false(self):
+        """Test failed service calls are reported, not raised."""
+        await self.server.close()
+        self.assertFalse(await self.client.turn_on("switch.test"))
+
+
+if __name__ == "__main__":
+    unittest.main()
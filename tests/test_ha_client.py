@@ -1,14 +1,27 @@
 """Unit tests for ha_client module."""
 
+import json
 import os
 import sys
 import unittest
 from unittest.mock import Mock, patch
 
+import requests
+from urllib3.exceptions import ConnectTimeoutError, ReadTimeoutError
+
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
 
-from ha_client import HomeAssistantClient  # noqa: E402
+from ha_client import (  # noqa: E402
+    HA_REQUEST_ERRORS,
+    HA_REQUEST_SECONDS,
+    HomeAssistantClient,
+    HomeAssistantUnavailable,
+    ServiceCallBatch,
+    StateSnapshot,
+    endpoint_name,
+)
+from ttl_cache import TTLCache  # noqa: E402
 
 
 class TestHomeAssistantClient(unittest.TestCase):
@@ -24,7 +37,32 @@ class TestHomeAssistantClient(unittest.TestCase):
         self.assertEqual(self.client.base_url, "http://supervisor/core/api")
         self.assertIn("Authorization", self.client.headers)
 
-    @patch("ha_client.requests.get")
+    def test_pooled_session(self):
+        """Test requests share one pooled session with retries and split timeouts."""
+        client = HomeAssistantClient("test_token", pool_size=4, max_retries=3, connect_timeout=2, read_timeout=7)
+        adapter = client.session.get_adapter("http://supervisor/core/api")
+
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(adapter.max_retries.allowed_methods, frozenset({"GET"}))
+        self.assertEqual(client.timeout, (2, 7))
+        self.assertEqual(client.session.headers["Authorization"], "Bearer test_token")
+
+    def test_posts_only_retried_on_connect_errors(self):
+        """Test a POST that may have reached HA is never resent, while GETs retry reads too."""
+        retry = self.client.session.get_adapter("http://supervisor/core/api").max_retries
+
+        self.assertEqual(retry.increment(method="POST", error=ConnectTimeoutError()).connect, 1)
+        with self.assertRaises(ReadTimeoutError):
+            retry.increment(method="POST", error=ReadTimeoutError(None, "/services/script/turn_on", "timed out"))
+        self.assertEqual(retry.increment(method="GET", error=ReadTimeoutError(None, "/states", "timed out")).read, 1)
+
+    def test_custom_base_url(self):
+        """Test base URL can point at a local server."""
+        client = HomeAssistantClient("test_token", base_url="http://127.0.0.1:8123/api/")
+        self.assertEqual(client.base_url, "http://127.0.0.1:8123/api")
+
+    @patch("ha_client.requests.Session.get")
     def test_get_states(self, mock_get):
         """Test getting states."""
         mock_response = Mock()
@@ -36,7 +74,7 @@ class TestHomeAssistantClient(unittest.TestCase):
         self.assertEqual(len(states), 1)
         self.assertEqual(states[0]["entity_id"], "switch.test")
 
-    @patch("ha_client.requests.get")
+    @patch("ha_client.requests.Session.get")
     def test_get_state(self, mock_get):
         """Test getting single state."""
         mock_response = Mock()
@@ -48,14 +86,22 @@ class TestHomeAssistantClient(unittest.TestCase):
         self.assertEqual(state["entity_id"], "switch.test")
         self.assertEqual(state["state"], "on")
 
-    @patch("ha_client.requests.get")
+    @patch("ha_client.requests.Session.get")
     def test_get_devices(self, mock_get):
         """Test getting devices."""
+        body = json.dumps(
+            [
+                {
+                    "entity_id": "switch.test",
+                    "state": "on",
+                    "attributes": {"friendly_name": "Test Switch", "effect_list": ["x"] * 100},
+                },
+                {"entity_id": "sensor.temperature", "state": "20", "attributes": {}},
+            ]
+        ).encode()
         mock_response = Mock()
-        mock_response.json.return_value = [
-            {"entity_id": "switch.test", "state": "on", "attributes": {"friendly_name": "Test Switch"}},
-            {"entity_id": "sensor.temperature", "state": "20", "attributes": {}},
-        ]
+        # Stream in small chunks so entities are split across reads
+        mock_response.iter_content.return_value = [body[i : i + 7] for i in range(0, len(body), 7)]
         mock_response.raise_for_status = Mock()
         mock_get.return_value = mock_response
 
@@ -63,8 +109,49 @@ class TestHomeAssistantClient(unittest.TestCase):
         # Should only return controllable devices (switch, light, button)
         self.assertEqual(len(devices), 1)
         self.assertEqual(devices[0]["entity_id"], "switch.test")
+        self.assertEqual(devices[0]["name"], "Test Switch")
+        self.assertEqual(devices[0]["attributes"], {"friendly_name": "Test Switch"})
+        self.assertTrue(mock_get.call_args.kwargs["stream"])
+        mock_response.close.assert_called_once()
+
+    @patch("ha_client.requests.Session.post")
+    @patch("ha_client.requests.Session.get")
+    def test_get_devices_uses_index(self, mock_get, mock_post):
+        """Test the device list is cached and only switched devices are re-read."""
+        listing = Mock()
+        listing.iter_content.return_value = [b'[{"entity_id": "switch.a", "state": "off"}, ']
+        listing.iter_content.return_value.append(b'{"entity_id": "light.b", "state": "off"}]')
+        single = Mock()
+        single.json.return_value = {"entity_id": "switch.a", "state": "on"}
+        mock_get.side_effect = [listing, single]
+
+        self.assertEqual(len(self.client.get_devices()), 2)
+        self.client.turn_on("switch.a")
+        devices = {device["entity_id"]: device for device in self.client.get_devices()}
+
+        self.assertEqual(devices["switch.a"]["state"], "on")
+        self.assertEqual(devices["light.b"]["state"], "off")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertTrue(mock_get.call_args.args[0].endswith("/states/switch.a"))
+
+    @patch("ha_client.requests.Session.get")
+    def test_failed_refresh_keeps_unread_devices_dirty(self, mock_get):
+        """Test a server error while re-reading switched devices leaves all of them to be re-read."""
+        listing = Mock()
+        listing.iter_content.return_value = [b'[{"entity_id": "switch.a", "state": "off"}, ']
+        listing.iter_content.return_value.append(b'{"entity_id": "switch.b", "state": "off"}]')
+        mock_get.return_value = listing
+        self.client.get_devices()
 
-    @patch("ha_client.requests.post")
+        error = requests.HTTPError(response=Mock(status_code=500))
+        self.client._fetch_state = Mock(side_effect=error)
+        self.client.invalidate(["switch.a", "switch.b"])
+        with self.assertRaises(requests.HTTPError):
+            self.client._refresh_dirty_devices()
+
+        self.assertEqual(self.client.device_index.pop_dirty(), {"switch.a", "switch.b"})
+
+    @patch("ha_client.requests.Session.post")
     def test_call_service(self, mock_post):
         """Test calling a service."""
         mock_response = Mock()
@@ -75,7 +162,21 @@ class TestHomeAssistantClient(unittest.TestCase):
         self.assertTrue(result)
         mock_post.assert_called_once()
 
-    @patch("ha_client.requests.post")
+    @patch("ha_client.requests.Session.post")
+    @patch("ha_client.requests.Session.get")
+    def test_service_calls_keep_configured_read_timeout(self, mock_get, mock_post):
+        """Test fast reads shorten the read timeout but service calls, which wait for the service, do not."""
+        mock_get.return_value = Mock(json=Mock(return_value={}))
+        for _ in range(5):
+            self.client.get_state("sensor.fast")
+        self.assertEqual(self.client.adaptive_timeout.value, 2.0)
+
+        mock_post.side_effect = requests.Timeout("slow script")
+        self.assertFalse(self.client.call_service("script", "turn_on", "script.slow"))
+        self.assertEqual(mock_post.call_args.kwargs["timeout"], (3.05, 10))
+        self.assertEqual(self.client.adaptive_timeout.value, 2.0)
+
+    @patch("ha_client.requests.Session.post")
     def test_turn_on(self, mock_post):
         """Test turning on a device."""
         mock_response = Mock()
@@ -85,7 +186,7 @@ class TestHomeAssistantClient(unittest.TestCase):
         result = self.client.turn_on("switch.test")
         self.assertTrue(result)
 
-    @patch("ha_client.requests.post")
+    @patch("ha_client.requests.Session.post")
     def test_turn_off(self, mock_post):
         """Test turning off a device."""
         mock_response = Mock()
@@ -95,7 +196,7 @@ class TestHomeAssistantClient(unittest.TestCase):
         result = self.client.turn_off("switch.test")
         self.assertTrue(result)
 
-    @patch("ha_client.requests.get")
+    @patch("ha_client.requests.Session.get")
     def test_get_sensor_value(self, mock_get):
         """Test getting sensor value."""
         mock_response = Mock()
@@ -106,6 +207,153 @@ class TestHomeAssistantClient(unittest.TestCase):
         value = self.client.get_sensor_value("sensor.test")
         self.assertEqual(value, 42.5)
 
+    @patch("ha_client.requests.Session.get")
+    def test_breaker_fails_fast_after_errors(self, mock_get):
+        """Test repeated connection errors open the circuit and stop sending requests."""
+        mock_get.side_effect = requests.ConnectionError("connection refused")
+        client = HomeAssistantClient("test_token")
+
+        for _ in range(client.breaker.failure_threshold):
+            self.assertEqual(client.get_sensor_value("sensor.solar"), 0.0)
+        self.assertFalse(client.is_available())
+
+        calls_before = mock_get.call_count
+        self.assertIsNone(client.get_state("sensor.solar"))
+        self.assertEqual(mock_get.call_count, calls_before)
+
+    @patch("ha_client.requests.Session.get")
+    def test_strict_reads_raise_when_unavailable(self, mock_get):
+        """Test strict reads distinguish an unreachable HA from a 0 reading."""
+        mock_get.side_effect = requests.Timeout("read timed out")
+
+        with self.assertRaises(HomeAssistantUnavailable):
+            self.client.get_sensor_value("sensor.solar", strict=True)
+        with self.assertRaises(HomeAssistantUnavailable):
+            self.client.get_states(strict=True)
+
+    @patch("ha_client.requests.Session.get")
+    def test_strict_reads_raise_on_rejected_or_garbled_reads(self, mock_get):
+        """Test strict reads raise on a 4xx or an unreadable body instead of returning nothing."""
+        rejected = requests.Response()
+        rejected.status_code = 401
+        garbled = Mock(json=Mock(side_effect=ValueError("Expecting value")))
+
+        for response in (rejected, garbled):
+            mock_get.return_value = response
+            with self.assertRaises(HomeAssistantUnavailable):
+                self.client.get_states(strict=True)
+            with self.assertRaises(HomeAssistantUnavailable):
+                self.client.get_state("sensor.solar", strict=True)
+            self.assertEqual(self.client.get_states(), [])
+            self.assertIsNone(self.client.get_state("sensor.solar"))
+
+    @patch("ha_client.requests.Session.post")
+    @patch("ha_client.requests.Session.get")
+    def test_request_latency_recorded_per_endpoint(self, mock_get, mock_post):
+        """Test request latency and errors are recorded against the HA endpoint."""
+        mock_get.return_value = Mock(json=Mock(return_value={"state": "1"}))
+        mock_post.side_effect = requests.ConnectionError("connection refused")
+        endpoints = ("get_state", "call_service")
+        counts_before = {endpoint: HA_REQUEST_SECONDS.get_count(endpoint=endpoint) for endpoint in endpoints}
+        errors_before = HA_REQUEST_ERRORS.get(endpoint="call_service")
+
+        self.client.get_state("sensor.solar")
+        self.client.turn_on("switch.test")
+
+        for endpoint in endpoints:
+            self.assertEqual(HA_REQUEST_SECONDS.get_count(endpoint=endpoint), counts_before[endpoint] + 1)
+        self.assertEqual(HA_REQUEST_ERRORS.get(endpoint="call_service"), errors_before + 1)
+        self.assertEqual(endpoint_name("POST", "/states/sensor.x"), "set_state")
+        self.assertEqual(endpoint_name("GET", "/states"), "get_states")
+
+    @patch("ha_client.requests.Session.get")
+    def test_not_found_is_not_an_outage(self, mock_get):
+        """Test 4xx responses do not count against the circuit."""
+        response = requests.Response()
+        response.status_code = 404
+        mock_get.return_value = response
+
+        for _ in range(10):
+            self.assertIsNone(self.client.get_state("sensor.missing", strict=True))
+        self.assertTrue(self.client.is_available())
+
+    @patch("ha_client.requests.Session.post")
+    @patch("ha_client.requests.Session.get")
+    def test_state_cache(self, mock_get, mock_post):
+        """Test sensor reads are served from the cache until a write invalidates them."""
+        mock_get.return_value.json.return_value = {"entity_id": "sensor.test", "state": "42.5"}
+        client = HomeAssistantClient("test_token", state_cache=TTLCache(default_ttl=60))
+
+        self.assertEqual(client.get_sensor_value("sensor.test"), 42.5)
+        self.assertEqual(client.get_sensor_value("sensor.test"), 42.5)
+        self.assertEqual(mock_get.call_count, 1)
+
+        client.set_state("sensor.test", {"state": "1"})
+        client.get_sensor_value("sensor.test")
+        self.assertEqual(mock_get.call_count, 2)
+
+
+class TestStateSnapshot(unittest.TestCase):
+    """Test cases for StateSnapshot class."""
+
+    def test_snapshot_lookups(self):
+        """Test state and sensor lookups against a bulk snapshot."""
+        client = Mock()
+        client.get_states.return_value = [
+            {"entity_id": "sensor.solar", "state": "1200.5"},
+            {"entity_id": "sensor.broken", "state": "unavailable"},
+            {"entity_id": "switch.test", "state": "on"},
+        ]
+
+        snapshot = StateSnapshot.from_client(client)
+
+        self.assertEqual(len(snapshot), 3)
+        self.assertIn("switch.test", snapshot)
+        self.assertEqual(snapshot.get_state("switch.test")["state"], "on")
+        self.assertIsNone(snapshot.get_state("switch.missing"))
+        self.assertEqual(snapshot.get_sensor_value("sensor.solar"), 1200.5)
+        self.assertEqual(snapshot.get_sensor_value("sensor.broken"), 0.0)
+        self.assertEqual(snapshot.get_sensor_value("sensor.missing"), 0.0)
+
+
+class TestServiceCallBatch(unittest.TestCase):
+    """Test cases for ServiceCallBatch class."""
+
+    def test_groups_by_domain_and_service(self):
+        """Test actions are grouped into one call per domain and service."""
+        batch = ServiceCallBatch()
+        batch.turn_off("switch.a")
+        batch.turn_off("switch.b")
+        batch.turn_off("switch.b")
+        batch.turn_on("switch.c")
+        batch.turn_off("light.d")
+
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(
+            batch.groups(),
+            {
+                ("switch", "turn_off"): ["switch.a", "switch.b"],
+                ("switch", "turn_on"): ["switch.c"],
+                ("light", "turn_off"): ["light.d"],
+            },
+        )
+
+    def test_execute_reports_per_entity_results(self):
+        """Test each entity gets the outcome of its group's call."""
+        client = Mock()
+        client.call_service = Mock(side_effect=lambda domain, service, entity_id: domain == "switch")
+        batch = ServiceCallBatch()
+        batch.turn_off("switch.a")
+        batch.turn_off("switch.b")
+        batch.turn_off("light.c")
+
+        results = batch.execute(client)
+
+        self.assertEqual(results, {"switch.a": True, "switch.b": True, "light.c": False})
+        client.call_service.assert_any_call("switch", "turn_off", ["switch.a", "switch.b"])
+        client.call_service.assert_any_call("light", "turn_off", "light.c")
+        self.assertEqual(client.call_service.call_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,269 @@
+"""Unit tests for ha_mirror module."""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from aiohttp import web
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from ha_mirror import MirroredHomeAssistantClient, websocket_url_for  # noqa: E402
+
+
+class FakeWebSocketServer:
+    """Local stand-in for the Home Assistant WebSocket API."""
+
+    def __init__(self, states, token="test_token", fail_sync=False):
+        self.states = {state["entity_id"]: state for state in states}
+        self.token = token
+        self.fail_sync = fail_sync
+        self.connections = []
+        self.connection_count = 0
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.started.wait(5)
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_get("/api/websocket", self._handle)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.started.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/api/websocket"
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connection_count += 1
+
+        await ws.send_json({"type": "auth_required"})
+        auth = await ws.receive_json()
+        if auth.get("access_token") != self.token:
+            await ws.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "auth_ok"})
+
+        subscription_id = None
+        self.connections.append((ws, lambda: subscription_id))
+        async for msg in ws:
+            message = msg.json()
+            if message["type"] == "subscribe_events":
+                subscription_id = message["id"]
+                await ws.send_json({"id": message["id"], "type": "result", "success": True, "result": None})
+            elif message["type"] == "get_states" and self.fail_sync:
+                error = {"code": "unknown_error", "message": "Unknown error"}
+                await ws.send_json({"id": message["id"], "type": "result", "success": False, "error": error})
+            elif message["type"] == "get_states":
+                states = list(self.states.values())
+                await ws.send_json({"id": message["id"], "type": "result", "success": True, "result": states})
+        return ws
+
+    def change_state(self, entity_id, state):
+        """Update an entity and broadcast a state_changed event."""
+        new_state = {"entity_id": entity_id, "state": state, "attributes": {}}
+        old_state = self.states.get(entity_id)
+        self.states[entity_id] = new_state
+
+        async def broadcast():
+            for ws, subscription_id in self.connections:
+                if not ws.closed and subscription_id() is not None:
+                    await ws.send_json(
+                        {
+                            "id": subscription_id(),
+                            "type": "event",
+                            "event": {
+                                "event_type": "state_changed",
+                                "data": {"entity_id": entity_id, "new_state": new_state, "old_state": old_state},
+                            },
+                        }
+                    )
+
+        asyncio.run_coroutine_threadsafe(broadcast(), self.loop).result(5)
+
+    def drop_connections(self):
+        """Close every client connection, as when HA Core restarts."""
+
+        async def close_all():
+            for ws, _ in self.connections:
+                await ws.close()
+            self.connections = []
+
+        asyncio.run_coroutine_threadsafe(close_all(), self.loop).result(5)
+
+
+def wait_for(condition, timeout=5):
+    """Poll until condition() is true."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestMirroredHomeAssistantClient(unittest.TestCase):
+    """Test cases for MirroredHomeAssistantClient class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.server = FakeWebSocketServer(
+            [
+                {"entity_id": "sensor.solar", "state": "1500", "attributes": {}},
+                {"entity_id": "switch.heater", "state": "off", "attributes": {}},
+            ]
+        ).start()
+        self.client = MirroredHomeAssistantClient(
+            "test_token", ws_url=self.server.url, reconnect_min_delay=0.05, reconnect_max_delay=0.1
+        )
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.client.close()
+        self.server.stop()
+
+    def test_websocket_url_for(self):
+        """Test WebSocket URL derivation from the REST base URL."""
+        self.assertEqual(websocket_url_for(None), "ws://supervisor/core/websocket")
+        self.assertEqual(websocket_url_for("http://ha.local:8123/api"), "ws://ha.local:8123/api/websocket")
+        self.assertEqual(websocket_url_for("https://ha.local/api/"), "wss://ha.local/api/websocket")
+
+    def test_initial_sync_serves_reads_from_memory(self):
+        """Test reads are answered from the mirror after the initial sync."""
+        self.client.start()
+        self.assertTrue(self.client.wait_until_synced(5))
+
+        with patch("ha_client.requests.Session.get") as mock_get:
+            self.assertEqual(self.client.get_sensor_value("sensor.solar"), 1500.0)
+            self.assertEqual(self.client.get_state("switch.heater")["state"], "off")
+            self.assertIsNone(self.client.get_state("switch.missing"))
+            self.assertEqual(len(self.client.get_states()), 2)
+            mock_get.assert_not_called()
+
+    def test_state_changed_events_update_mirror(self):
+        """Test state_changed events keep the mirror current."""
+        self.client.start()
+        self.assertTrue(self.client.wait_until_synced(5))
+
+        self.server.change_state("sensor.solar", "2500")
+        self.assertTrue(wait_for(lambda: self.client.get_sensor_value("sensor.solar") == 2500.0))
+
+    def test_device_list_follows_events(self):
+        """Test the device list is served from the event-fed index without REST reads."""
+        self.client.tracked_entities = {"sensor.solar"}
+        self.client.start()
+        self.assertTrue(self.client.wait_until_synced(5))
+
+        self.server.change_state("switch.heater", "on")
+        with patch("ha_client.requests.Session.get") as mock_get:
+            self.assertTrue(wait_for(lambda: self.client.get_devices()[0]["state"] == "on"))
+            self.assertEqual([device["entity_id"] for device in self.client.get_devices()], ["switch.heater"])
+            mock_get.assert_not_called()
+
+    def test_listeners_receive_changes(self):
+        """Test listeners are told about the sync and each state change."""
+        changes = []
+        self.client.add_listener(lambda entity_id, old, new: changes.append((entity_id, new and new["state"])))
+        self.client.start()
+        self.assertTrue(self.client.wait_until_synced(5))
+
+        self.server.change_state("sensor.solar", "2500")
+
+        self.assertTrue(wait_for(lambda: ("sensor.solar", "2500") in changes))
+        self.assertEqual(changes[0], (None, None))
+
+    def test_reconnect_and_resync(self):
+        """Test the mirror reconnects and resyncs after the connection drops."""
+        self.client.start()
+        self.assertTrue(self.client.wait_until_synced(5))
+
+        # Change state while no event is delivered, so only a resync can pick it up
+        self.server.states["switch.heater"] = {"entity_id": "switch.heater", "state": "on", "attributes": {}}
+        self.server.drop_connections()
+
+        self.assertTrue(wait_for(lambda: self.server.connection_count >= 2))
+        self.assertTrue(self.client.wait_until_synced(5))
+        self.assertTrue(wait_for(lambda: self.client.get_state("switch.heater")["state"] == "on"))
+        self.assertGreaterEqual(self.client.reconnect_count, 1)
+
+    def test_tracked_entities_filter(self):
+        """Test only tracked entities are mirrored; others fall back to REST."""
+        self.client.tracked_entities = {"sensor.solar"}
+        self.client.start()
+        self.assertTrue(self.client.wait_until_synced(5))
+
+        with patch("ha_client.requests.Session.get") as mock_get:
+            mock_get.return_value.json.return_value = {"entity_id": "switch.heater", "state": "off"}
+            self.assertEqual(self.client.get_sensor_value("sensor.solar"), 1500.0)
+            self.client.get_state("switch.heater")
+            mock_get.assert_called_once()
+
+    def test_falls_back_to_rest_before_sync(self):
+        """Test reads use REST until the mirror is synced."""
+        with patch("ha_client.requests.Session.get") as mock_get:
+            mock_get.return_value.json.return_value = {"entity_id": "sensor.solar", "state": "42"}
+            self.assertEqual(self.client.get_sensor_value("sensor.solar"), 42.0)
+            mock_get.assert_called_once()
+
+    def test_snapshot_over_default_message_limit(self):
+        """Test a get_states result larger than aiohttp's 4 MB default message size still syncs."""
+        attributes = {"friendly_name": "Sensor", "notes": "x" * 1000}
+        states = [{"entity_id": f"sensor.s{i}", "state": str(i), "attributes": attributes} for i in range(5000)]
+        server = FakeWebSocketServer(states).start()
+        client = MirroredHomeAssistantClient("test_token", ws_url=server.url)
+        try:
+            client.start()
+            self.assertTrue(client.wait_until_synced(10))
+            self.assertEqual(len(client.get_states()), 5000)
+            self.assertEqual(client.reconnect_count, 0)
+        finally:
+            client.close()
+            server.stop()
+
+    def test_failed_sync_backs_off(self):
+        """Test reconnects keep backing off while the sync fails, even though authentication succeeds."""
+        self.server.fail_sync = True
+        self.client.reconnect_max_delay = 1.0
+        self.client.start()
+
+        time.sleep(0.6)
+        self.assertFalse(self.client.is_synced)
+        # Delays of 0.05, 0.1, 0.2 and 0.4 s allow four connections; a reset after auth allows ten
+        self.assertGreaterEqual(self.server.connection_count, 2)
+        self.assertLessEqual(self.server.connection_count, 6)
+
+    def test_invalid_token_does_not_sync(self):
+        """Test authentication failures leave the mirror unsynced."""
+        self.client.token = "wrong_token"
+        self.client.start()
+        self.assertFalse(self.client.wait_until_synced(0.3))
+        self.assertGreaterEqual(self.server.connection_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
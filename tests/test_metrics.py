@@ -0,0 +1,74 @@
+"""Unit tests for metrics module."""
+
+import os
+import sys
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from metrics import MetricsRegistry  # noqa: E402
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for MetricsRegistry and its metric types."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.registry = MetricsRegistry()
+
+    def test_counter_by_label(self):
+        """Test counters are tracked per label value."""
+        counter = self.registry.counter("decisions_total", "Decisions", ("reason",))
+        counter.inc(reason="solar_excess")
+        counter.inc(2, reason="high_cost")
+        counter.inc(reason="solar_excess")
+
+        self.assertEqual(counter.get(reason="solar_excess"), 2)
+        self.assertEqual(counter.get(reason="high_cost"), 2)
+        text = self.registry.render()
+        self.assertIn("# TYPE decisions_total counter", text)
+        self.assertIn('decisions_total{reason="solar_excess"} 2', text)
+
+    def test_registry_returns_existing_metric(self):
+        """Test asking for the same name twice returns one metric."""
+        first = self.registry.counter("requests_total", "Requests")
+        self.assertIs(self.registry.counter("requests_total", "Requests"), first)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram rendering with cumulative buckets, sum and count."""
+        histogram = self.registry.histogram("latency_seconds", "Latency", ("endpoint",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, endpoint="get_state")
+        histogram.observe(0.5, endpoint="get_state")
+        histogram.observe(5, endpoint="get_state")
+
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{endpoint="get_state",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{endpoint="get_state",le="1.0"} 2', text)
+        self.assertIn('latency_seconds_bucket{endpoint="get_state",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_sum{endpoint="get_state"} 5.55', text)
+        self.assertIn('latency_seconds_count{endpoint="get_state"} 3', text)
+
+    def test_histogram_time(self):
+        """Test timing a block records one observation."""
+        histogram = self.registry.histogram("phase_seconds", "Phase", ("phase",))
+        with histogram.time(phase="read"):
+            pass
+        self.assertEqual(histogram.get_count(phase="read"), 1)
+        self.assertEqual(histogram.get_count(phase="decide"), 0)
+
+    def test_callback_metric(self):
+        """Test metrics backed by a callback are read at render time."""
+        values = {"open": 0}
+        self.registry.gauge("circuit_open", "Circuit open").set_function(lambda: values["open"])
+        values["open"] = 1
+        self.assertIn("circuit_open 1", self.registry.render())
+
+    def test_label_values_are_escaped(self):
+        """Test quotes in label values are escaped."""
+        self.registry.gauge("g", "Gauge", ("name",)).set(1, name='a"b')
+        self.assertIn('g{name="a\\"b"} 1', self.registry.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,22 @@
 """Unit tests for new energy manager features."""
 
+import asyncio
 import os
 import sys
 import unittest
 from datetime import datetime, timedelta
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
 
 from energy_manager import EnergyManager  # noqa: E402
+from planner import MODE_SMART, Plan, PlannedAction, device_allowed, heating_change_allowed  # noqa: E402
+
+
+def forecast_state(points, last_updated="2024-11-04T00:00:00+00:00"):
+    """An HA state for a forecast sensor holding points."""
+    return {"state": "ok", "attributes": {"forecast": points}, "last_updated": last_updated}
 
 
 class TestEnergyManagerNewFeatures(unittest.TestCase):
@@ -82,14 +89,8 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
 
         self.manager.add_device("switch.test", schedule=schedule, allow_direct_control=True)
 
-        device_info = self.manager.managed_devices["switch.test"]
-
-        # Mock datetime to be within schedule
-        with patch("energy_manager.datetime") as mock_datetime:
-            mock_datetime.now.return_value = datetime(2024, 11, 4, 10, 0)  # Monday 10:00
-            mock_datetime.fromisoformat = datetime.fromisoformat
-            can_control = self.manager._can_control_device("switch.test", device_info)
-            self.assertTrue(can_control)
+        device = self.manager.managed_devices.device("switch.test").snapshot()
+        self.assertTrue(device_allowed(device, datetime(2024, 11, 4, 10, 0)))  # Monday 10:00
 
     def test_can_control_device_outside_schedule(self):
         """Test device cannot be controlled outside schedule."""
@@ -100,27 +101,17 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
 
         self.manager.add_device("switch.test", schedule=schedule, allow_direct_control=True)
 
-        device_info = self.manager.managed_devices["switch.test"]
-
-        # Mock datetime to be outside schedule (weekend)
-        with patch("energy_manager.datetime") as mock_datetime:
-            mock_datetime.now.return_value = datetime(2024, 11, 3, 10, 0)  # Sunday 10:00
-            mock_datetime.fromisoformat = datetime.fromisoformat
-            can_control = self.manager._can_control_device("switch.test", device_info)
-            self.assertFalse(can_control)
+        device = self.manager.managed_devices.device("switch.test").snapshot()
+        self.assertFalse(device_allowed(device, datetime(2024, 11, 3, 10, 0)))  # Sunday 10:00
 
     def test_heating_min_change_interval(self):
         """Test minimum change interval for heating devices."""
-        device_info = {"last_heating_change": (datetime.now() - timedelta(seconds=600)).isoformat()}
+        now = datetime.now()
+        interval = self.config["heating_min_change_interval"]
 
         # 600 seconds elapsed, min interval 900 - should not allow change
-        can_change = self.manager._can_change_heating(device_info)
-        self.assertFalse(can_change)
-
-        # Mock old change time
-        device_info["last_heating_change"] = (datetime.now() - timedelta(seconds=1000)).isoformat()
-        can_change = self.manager._can_change_heating(device_info)
-        self.assertTrue(can_change)
+        self.assertFalse(heating_change_allowed((now - timedelta(seconds=600)).isoformat(), now, interval))
+        self.assertTrue(heating_change_allowed((now - timedelta(seconds=1000)).isoformat(), now, interval))
 
     def test_calculate_optimal_solar_slots(self):
         """Test solar forecast optimization."""
@@ -187,9 +178,12 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
         # Add device with required run duration
         self.manager.add_device("switch.test", required_run_duration=60)
 
-        # Mock forecast data
-        self.manager.get_solar_forecast = Mock(return_value=[{"timestamp": "2024-11-04T12:00:00", "power": 3000}])
-        self.manager.get_cost_forecast = Mock(return_value=[{"timestamp": "2024-11-04T02:00:00", "cost_per_kwh": 0.10}])
+        # Mock forecast sensors
+        states = {
+            "sensor.solar_forecast": forecast_state([{"timestamp": "2024-11-04T12:00:00", "power": 3000}]),
+            "sensor.electricity_forecast": forecast_state([{"timestamp": "2024-11-04T02:00:00", "cost_per_kwh": 0.10}]),
+        }
+        self.mock_ha_client.get_state = Mock(side_effect=states.get)
 
         schedule = self.manager.get_device_optimal_schedule("switch.test")
 
@@ -198,6 +192,79 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
         self.assertIn("optimal_solar_slots", schedule)
         self.assertIn("cheapest_cost_slots", schedule)
 
+    def test_get_all_device_schedules(self):
+        """Test schedules for every device with a run duration come from one forecast read."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.dishwasher", required_run_duration=120)
+        self.manager.add_device("switch.washer", priority=1, required_run_duration=120)
+        self.manager.add_device("switch.lamp")
+
+        forecast = [
+            {"timestamp": f"2024-11-04T0{hour}:00:00", "cost_per_kwh": cost}
+            for hour, cost in enumerate([0.3, 0.1, 0.1, 0.2, 0.3])
+        ]
+        states = {"sensor.electricity_forecast": forecast_state(forecast)}
+        self.mock_ha_client.get_state = Mock(side_effect=states.get)
+
+        schedules = self.manager.get_all_device_schedules()
+
+        self.assertEqual(list(schedules), ["switch.washer", "switch.dishwasher"])
+        self.assertEqual(schedules["switch.washer"]["cheapest_cost_slots"][0]["start_time"], "2024-11-04T01:00:00")
+        self.assertNotIn("optimal_solar_slots", schedules["switch.washer"])
+        self.assertEqual(self.mock_ha_client.get_state.call_count, 2)  # each forecast sensor read once
+
+    def test_get_joint_schedule(self):
+        """Test devices are planned together: the import limit keeps them out of each other's slot."""
+        self.manager.save_managed_devices = Mock()
+        self.manager._publish_device_entity = Mock()
+        self.manager.add_device("switch.washer", priority=1, power_consumption=2000, required_run_duration=60)
+        self.manager.add_device("switch.dishwasher", power_consumption=2000, required_run_duration=60)
+        self.manager.add_device("switch.dryer", power_consumption=4000, required_run_duration=30)
+        self.config["site_import_limit"] = 3000
+
+        forecast = [
+            {"timestamp": f"2024-11-04T0{hour}:00:00", "cost_per_kwh": cost}
+            for hour, cost in enumerate([0.3, 0.1, 0.1, 0.2, 0.3])
+        ]
+        states = {"sensor.electricity_forecast": forecast_state(forecast)}
+        self.mock_ha_client.get_state = Mock(side_effect=states.get)
+
+        plan = self.manager.get_joint_schedule(now=datetime(2024, 11, 4, 0, 20))
+
+        self.assertEqual(plan["objective"], "cost")
+        self.assertEqual(plan["runs"]["switch.washer"]["start_time"], "2024-11-04T01:00:00")
+        self.assertEqual(plan["runs"]["switch.dishwasher"]["start_time"], "2024-11-04T02:00:00")
+        self.assertEqual(plan["runs"]["switch.dishwasher"]["end_time"], "2024-11-04T03:00:00")
+        self.assertEqual(plan["unscheduled"], ["switch.dryer"])
+        self.assertAlmostEqual(plan["estimated_total_cost"], 0.4)
+        self.assertEqual(plan["peak_import_w"], 2000)
+
+        # Runs may not start before now, and the solar objective needs the solar forecast
+        later = self.manager.get_joint_schedule(now=datetime(2024, 11, 4, 2, 10))
+        self.assertEqual(later["runs"]["switch.washer"]["start_time"], "2024-11-04T02:00:00")
+        with self.assertRaises(ValueError):
+            self.manager.get_joint_schedule(objective="solar")
+
+        # A disabled device is left out and frees its cells for the others
+        self.manager.update_device("switch.washer", enabled=False)
+        plan = self.manager.get_joint_schedule(now=datetime(2024, 11, 4, 0, 20))
+        self.assertNotIn("switch.washer", plan["runs"])
+        self.assertEqual(plan["runs"]["switch.dishwasher"]["start_time"], "2024-11-04T01:00:00")
+
+    def test_parsed_forecast_is_shared_until_sensor_changes(self):
+        """Test the forecast is parsed once per sensor update and shared by its readers."""
+        state = forecast_state([{"timestamp": "2024-11-04T02:00:00", "cost_per_kwh": 0.10}])
+        self.mock_ha_client.get_state = Mock(return_value=state)
+
+        parsed = self.manager.get_parsed_forecast("cost")
+        self.assertIs(self.manager.get_parsed_forecast("cost"), parsed)
+        self.assertEqual(self.manager.get_cost_forecast(), state["attributes"]["forecast"])
+        self.assertEqual(list(parsed.values), [0.10])
+
+        self.mock_ha_client.get_state = Mock(return_value={**state, "last_updated": "2024-11-04T01:00:00+00:00"})
+        self.assertIsNot(self.manager.get_parsed_forecast("cost"), parsed)
+
     def test_control_device_triggers_automation(self):
         """Test that controlling a device triggers configured automation."""
         self.manager.save_managed_devices = Mock()
@@ -206,17 +273,17 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
         # Add device with auto-start automation
         self.manager.add_device("switch.test", auto_start_automation="automation.start_washing")
 
-        self.mock_ha_client.turn_on = Mock(return_value=True)
         self.mock_ha_client.call_service = Mock(return_value=True)
         self.manager._publish_control_decision = Mock()
 
-        self.manager._control_device("switch.test", True, "test_reason")
+        plan = Plan(MODE_SMART, actions=(PlannedAction("switch.test", True, "test_reason"),))
+        results = asyncio.run(self.manager.apply_plan(plan))
 
-        # Verify automation was triggered
-        self.mock_ha_client.call_service.assert_called_once()
-        call_args = self.mock_ha_client.call_service.call_args
-        self.assertEqual(call_args[0][0], "automation")
-        self.assertEqual(call_args[0][1], "trigger")
+        # The device is switched in the batch, then its automation is triggered
+        self.assertEqual(results, {"switch.test": True})
+        calls = [call.args[:2] for call in self.mock_ha_client.call_service.call_args_list]
+        self.assertEqual(calls, [("switch", "turn_on"), ("automation", "trigger")])
+        self.assertIsNotNone(self.manager.managed_devices.device("switch.test").last_controlled)
 
     def test_publish_control_decision(self):
         """Test publishing control decisions to HA."""
@@ -250,6 +317,23 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
         slots = self.manager.calculate_optimal_solar_slots(forecast_data, 0)
         self.assertEqual(slots, [])
 
+        forecast_data = [{"timestamp": f"2024-11-04T{hour:02d}:00:00", "cost_per_kwh": 0.2} for hour in range(4)]
+        self.assertEqual(self.manager.calculate_cheapest_cost_slots(forecast_data, 0), [])
+        self.assertEqual(self.manager.calculate_cheapest_cost_slots(forecast_data, -30), [])
+
+    def test_slots_end_within_forecast(self):
+        """Test every slot offered runs its full duration inside the forecast."""
+        forecast_data = [
+            {"timestamp": f"2024-11-04T{hour:02d}:00:00", "cost_per_kwh": cost}
+            for hour, cost in enumerate([0.3, 0.2, 0.25, 0.05])
+        ]
+        slots = self.manager.calculate_cheapest_cost_slots(forecast_data, 120)
+
+        # Sixteen quarter-hour cells hold nine two-hour runs, the last starting at 02:00
+        self.assertEqual(len(slots), 9)
+        self.assertEqual(slots[0]["start_time"], "2024-11-04T02:00:00")
+        self.assertEqual(max(slot["start_time"] for slot in slots), "2024-11-04T02:00:00")
+
     def test_battery_level_retrieval(self):
         """Test getting battery level."""
         # Enable battery management
@@ -278,6 +362,15 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
 
         self.assertEqual(power, 500.0)
 
+    def test_house_load_retrieval(self):
+        """Test getting household consumption, None when not configured."""
+        self.assertIsNone(self.manager.get_house_load())
+
+        self.manager.config["house_load_sensor"] = "sensor.house_load"
+        self.mock_ha_client.get_sensor_value = Mock(return_value=1200.0)
+        self.assertEqual(self.manager.get_house_load(), 1200.0)
+        self.mock_ha_client.get_sensor_value.assert_called_with("sensor.house_load")
+
     def test_status_includes_battery_when_enabled(self):
         """Test status includes battery info when enabled."""
         self.manager.config["enable_battery_management"] = True
@@ -333,6 +426,18 @@ class TestEnergyManagerNewFeatures(unittest.TestCase):
         self.assertIn("sensor.sec_electricity_cost", sensor_ids)
         self.assertIn("sensor.sec_automation_status", sensor_ids)
 
+    def test_publish_system_sensors_skips_unchanged(self):
+        """Test a second cycle with unchanged values writes nothing."""
+        self.mock_ha_client.get_sensor_value = Mock(return_value=0.25)
+        self.mock_ha_client.set_state = Mock(return_value=True)
+
+        self.manager.publish_system_sensors()
+        first_cycle_writes = self.mock_ha_client.set_state.call_count
+        self.manager.publish_system_sensors()
+
+        self.assertEqual(self.mock_ha_client.set_state.call_count, first_cycle_writes)
+        self.assertEqual(self.manager.publisher.get_stats()["suppressed"], first_cycle_writes)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,185 @@
+"""Unit tests for planner module."""
+
+import dataclasses
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from planner import (  # noqa: E402
+    ControlSnapshot,
+    DeviceSnapshot,
+    PlannedAction,
+    available_surplus,
+    next_allowed_window,
+    plan_actions,
+)
+from schedule import compile_schedule  # noqa: E402
+
+MONDAY_NOON = datetime(2024, 11, 4, 12, 0)
+
+
+def device(entity_id, state, priority=5, **kwargs):
+    """Build a device snapshot."""
+    return DeviceSnapshot(entity_id=entity_id, state=state, priority=priority, **kwargs)
+
+
+class TestPlanner(unittest.TestCase):
+    """Test cases for the pure planning functions."""
+
+    def snapshot(self, devices, **kwargs):
+        """Build a control snapshot with quiet defaults, devices in priority order like the registry."""
+        values = {"now": MONDAY_NOON, "solar_generation": 0.0, "electricity_cost": 0.1}
+        values.update(kwargs)
+        return ControlSnapshot(devices=tuple(sorted(devices, key=lambda device: device.priority)), **values)
+
+    def test_solar_excess_turns_on_in_priority_order(self):
+        """Test devices that are off are turned on, highest priority first."""
+        plan = plan_actions(
+            self.snapshot(
+                [device("switch.b", "off", 3), device("switch.a", "off", 1), device("switch.c", "on", 2)],
+                solar_generation=1500,
+            )
+        )
+
+        self.assertEqual(plan.mode, "smart")
+        self.assertEqual(
+            plan.actions,
+            (PlannedAction("switch.a", True, "solar_excess"), PlannedAction("switch.b", True, "solar_excess")),
+        )
+
+    def test_battery_near_full_lowers_solar_threshold(self):
+        """Test a charging battery above 80% enables devices from 500 W."""
+        devices = [device("switch.a", "off")]
+        self.assertEqual(plan_actions(self.snapshot(devices, solar_generation=700)).actions, ())
+
+        plan = plan_actions(self.snapshot(devices, solar_generation=700, battery_level=90, battery_power=100))
+        self.assertEqual(len(plan.actions), 1)
+
+    def test_solar_excess_fits_power_budget(self):
+        """Test only devices that fit the surplus together are started, preferring higher priority."""
+        devices = [
+            device("switch.a", "off", 1, power=2000),
+            device("switch.b", "off", 2, power=2000),
+            device("switch.c", "off", 3, power=900),
+            device("switch.d", "off", 9),
+        ]
+        plan = plan_actions(self.snapshot(devices, solar_generation=4000))
+
+        self.assertEqual([action.entity_id for action in plan.actions], ["switch.a", "switch.c", "switch.d"])
+        self.assertEqual(plan.skipped, (("switch.b", "needs 2000W, surplus 3000W"),))
+
+    def test_surplus_from_house_load_and_battery(self):
+        """Test the surplus is solar minus house load, reserving battery charging unless near full."""
+        devices = [device("switch.a", "off", power=1500)]
+        charging = {"solar_generation": 4000, "house_load": 2000, "battery_power": 1000}
+
+        self.assertEqual(available_surplus(self.snapshot(devices, **charging), False), 1000)
+        self.assertEqual(plan_actions(self.snapshot(devices, battery_level=60, **charging)).actions, ())
+        plan = plan_actions(self.snapshot(devices, battery_level=90, **charging))
+        self.assertEqual(len(plan.actions), 1)
+
+    def test_surplus_without_house_load_across_cycles(self):
+        """Test devices started in one cycle count against the surplus in the next, even before HA shows them on."""
+        devices = [device("switch.a", "off", 1, power=1500), device("switch.b", "off", 2, power=1500)]
+        first = plan_actions(self.snapshot(devices, solar_generation=3000))
+        self.assertEqual([action.entity_id for action in first.actions], ["switch.a"])
+
+        started = MONDAY_NOON.isoformat()
+        pending = [dataclasses.replace(devices[0], last_controlled=started), devices[1]]
+        later = MONDAY_NOON + timedelta(seconds=5)
+        plan = plan_actions(self.snapshot(pending, now=later, solar_generation=3000))
+        self.assertEqual(plan.actions, ())
+        self.assertEqual(plan.skipped[0], ("switch.a", "switched moments ago"))
+
+        running = [dataclasses.replace(pending[0], state="on"), devices[1]]
+        later = MONDAY_NOON + timedelta(minutes=1)
+        self.assertEqual(available_surplus(self.snapshot(running, now=later, solar_generation=3000), False), 500)
+        self.assertEqual(plan_actions(self.snapshot(running, now=later, solar_generation=3000)).actions, ())
+        plan = plan_actions(self.snapshot(running, now=later, solar_generation=4000))
+        self.assertEqual(plan.actions, (PlannedAction("switch.b", True, "solar_excess"),))
+
+    def test_high_cost_turns_off_low_priority(self):
+        """Test only priority > 5 devices are shed at high cost, with a lower threshold on battery."""
+        devices = [device("switch.low", "on", 8), device("switch.high", "on", 2)]
+        self.assertEqual(plan_actions(self.snapshot(devices, electricity_cost=0.28)).actions, ())
+
+        plan = plan_actions(self.snapshot(devices, electricity_cost=0.28, battery_level=60))
+        self.assertEqual(plan.actions, (PlannedAction("switch.low", False, "high_cost"),))
+
+    def test_schedule_and_direct_control(self):
+        """Test devices outside their schedule or without direct control are left alone."""
+        plan = plan_actions(
+            self.snapshot(
+                [
+                    device("switch.weekend", "off", schedule=compile_schedule({"days": [5, 6]})),
+                    device("switch.morning", "off", schedule=compile_schedule({"start": "06:00", "end": "09:00"})),
+                    device("switch.manual", "off", allow_direct_control=False),
+                    device(
+                        "switch.ok", "off", schedule=compile_schedule({"start": "10:00", "end": "14:00", "days": [0]})
+                    ),
+                ],
+                solar_generation=2000,
+            )
+        )
+
+        self.assertEqual([action.entity_id for action in plan.actions], ["switch.ok"])
+
+    def test_heating_interval_skips_device(self):
+        """Test a recently changed heating device is held back and reported."""
+        recent = (MONDAY_NOON - timedelta(seconds=300)).isoformat()
+        plan = plan_actions(
+            self.snapshot(
+                [device("switch.heater", "off", last_heating_change=recent), device("switch.fan", "off")],
+                solar_generation=2000,
+            )
+        )
+
+        self.assertEqual([action.entity_id for action in plan.actions], ["switch.fan"])
+        self.assertEqual(plan.skipped[0][0], "switch.heater")
+
+    def test_sessions_take_precedence(self):
+        """Test saving sessions shed load and free sessions turn everything on."""
+        devices = [device("switch.a", "on", 5), device("switch.b", "off", 5), device("switch.c", "on", 2)]
+
+        saving = plan_actions(self.snapshot(devices, is_saving_session=True, is_free_session=True))
+        self.assertEqual(saving.actions, (PlannedAction("switch.a", False, "saving_session"),))
+
+        free = plan_actions(self.snapshot(devices, is_free_session=True, solar_generation=5000))
+        self.assertEqual(free.actions, (PlannedAction("switch.b", True, "free_session"),))
+
+    def test_snapshot_is_immutable_and_plan_deterministic(self):
+        """Test snapshots cannot be modified and planning twice gives the same plan."""
+        snapshot = self.snapshot([device("switch.a", "off")], solar_generation=1500)
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            snapshot.solar_generation = 0
+        self.assertEqual(plan_actions(snapshot), plan_actions(snapshot))
+
+    def test_from_config(self):
+        """Test building a device snapshot from the managed-device config."""
+        snapshot = DeviceSnapshot.from_config(
+            "switch.a",
+            {"priority": 2, "enabled": True, "schedule": {"start": "08:00", "end": "22:00", "days": [0, 1]}},
+            {"state": "off"},
+        )
+        self.assertEqual(snapshot.state, "off")
+        self.assertTrue(snapshot.schedule.allows(0 * 1440 + 8 * 60))
+        self.assertFalse(snapshot.schedule.allows(2 * 1440 + 8 * 60))
+        self.assertTrue(snapshot.allow_direct_control)
+
+    def test_next_allowed_window(self):
+        """Test looking ahead to the next window a device may be switched in."""
+        overnight = device("switch.dryer", "off", schedule=compile_schedule({"start": "22:00", "end": "06:00"}))
+        self.assertEqual(
+            next_allowed_window(overnight, MONDAY_NOON),
+            (datetime(2024, 11, 4, 22, 0), datetime(2024, 11, 5, 6, 1)),
+        )
+        self.assertEqual(next_allowed_window(device("switch.a", "off"), MONDAY_NOON), (MONDAY_NOON, None))
+        self.assertIsNone(next_allowed_window(device("switch.a", "off", allow_direct_control=False), MONDAY_NOON))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Unit tests for publisher module."""
+
+import os
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from publisher import StatePublisher  # noqa: E402
+
+
+class TestStatePublisher(unittest.TestCase):
+    """Test cases for StatePublisher class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.mock_ha_client = Mock()
+        self.mock_ha_client.set_state = Mock(return_value=True)
+        self.publisher = StatePublisher(
+            self.mock_ha_client, deadbands={"sensor.sec_solar_generation": 25}, refresh_interval=300
+        )
+
+    def _solar(self, value):
+        return {"state": value, "attributes": {"unit_of_measurement": "W"}}
+
+    def test_unchanged_state_is_suppressed(self):
+        """Test identical writes are only sent once."""
+        self.publisher.publish("sensor.sec_gas_cost", {"state": 0.05, "attributes": {}})
+        self.publisher.publish("sensor.sec_gas_cost", {"state": 0.05, "attributes": {}})
+
+        self.assertEqual(self.mock_ha_client.set_state.call_count, 1)
+        self.assertEqual(self.publisher.get_stats()["sent"], 1)
+        self.assertEqual(self.publisher.get_stats()["suppressed"], 1)
+
+    def test_changed_state_or_attributes_are_sent(self):
+        """Test real changes are written."""
+        self.publisher.publish("sensor.sec_gas_cost", {"state": 0.05, "attributes": {}})
+        self.publisher.publish("sensor.sec_gas_cost", {"state": 0.06, "attributes": {}})
+        self.publisher.publish("sensor.sec_gas_cost", {"state": 0.06, "attributes": {"extra": 1}})
+
+        self.assertEqual(self.mock_ha_client.set_state.call_count, 3)
+
+    def test_deadband_compares_against_last_published_value(self):
+        """Test small numeric changes are suppressed without drifting."""
+        entity_id = "sensor.sec_solar_generation"
+        for value in (1000.0, 1010.0, 1020.0, 1030.0):
+            self.publisher.publish(entity_id, self._solar(value))
+
+        published = [call[0][1]["state"] for call in self.mock_ha_client.set_state.call_args_list]
+        self.assertEqual(published, [1000.0, 1030.0])
+
+    def test_ignored_attributes_do_not_trigger_writes(self):
+        """Test volatile attributes such as timestamps are ignored."""
+        self.publisher.publish("sensor.sec_x_decision", {"state": "on", "attributes": {"timestamp": "1"}})
+        self.publisher.publish("sensor.sec_x_decision", {"state": "on", "attributes": {"timestamp": "2"}})
+
+        self.assertEqual(self.mock_ha_client.set_state.call_count, 1)
+
+    def test_refresh_interval_forces_write(self):
+        """Test unchanged entities are re-sent after the refresh interval."""
+        with patch("publisher.time.monotonic", side_effect=[0.0, 100.0, 301.0]):
+            for _ in range(3):
+                self.publisher.publish("sensor.sec_gas_cost", {"state": 0.05, "attributes": {}})
+
+        self.assertEqual(self.mock_ha_client.set_state.call_count, 2)
+
+    def test_failed_write_is_retried(self):
+        """Test a failed write is not remembered as published."""
+        self.mock_ha_client.set_state = Mock(side_effect=[False, True])
+
+        self.assertFalse(self.publisher.publish("sensor.sec_gas_cost", {"state": 0.05, "attributes": {}}))
+        self.assertTrue(self.publisher.publish("sensor.sec_gas_cost", {"state": 0.05, "attributes": {}}))
+        self.assertEqual(self.publisher.get_stats()["failed"], 1)
+
+    def test_force_and_forget(self):
+        """Test force and forget bypass change detection."""
+        state_data = {"state": 0.05, "attributes": {}}
+        self.publisher.publish("sensor.sec_gas_cost", state_data)
+        self.publisher.publish("sensor.sec_gas_cost", state_data, force=True)
+        self.publisher.forget("sensor.sec_gas_cost")
+        self.publisher.publish("sensor.sec_gas_cost", state_data)
+
+        self.assertEqual(self.mock_ha_client.set_state.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Unit tests for run_planner module."""
+
+import itertools
+import os
+import random
+import sys
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from run_planner import Run, plan_runs  # noqa: E402
+
+
+def plan_cost(runs, starts, prices, solar, import_limit=0):
+    """Cost of the grid import of runs at the given starts (one-hour cells), or None if it exceeds import_limit."""
+    load = [0.0] * len(prices)
+    for run, start in zip(runs, starts):
+        for c in range(start, start + run.cells):
+            load[c] += run.power
+    imports = [max(drawn - generated, 0) for drawn, generated in zip(load, solar)]
+    if import_limit and max(imports) > import_limit:
+        return None
+    return sum(price * imported for price, imported in zip(prices, imports)) / 1000
+
+
+class TestPlanRuns(unittest.TestCase):
+    """Test cases for plan_runs."""
+
+    def test_runs_share_the_cheapest_cells_without_a_limit(self):
+        """Test runs all take the cheapest window when the site can import them together."""
+        runs = [Run("dishwasher", 1000, 2), Run("washer", 2000, 2)]
+        plan = plan_runs(runs, [0.3, 0.1, 0.1, 0.3])
+
+        self.assertEqual(plan.starts, {"dishwasher": 1, "washer": 1})
+        self.assertAlmostEqual(plan.cost, 0.6)
+        self.assertEqual((plan.peak_import, plan.converged), (3000, True))
+
+    def test_import_limit_spreads_runs(self):
+        """Test runs that would exceed the import limit together are moved apart, or left out."""
+        runs = [Run("ev", 3000, 2), Run("washer", 2000, 1), Run("dryer", 4000, 1)]
+        plan = plan_runs(runs, [0.3, 0.1, 0.1, 0.2], import_limit=3500)
+
+        self.assertEqual(plan.starts, {"ev": 1, "washer": 3, "dryer": None})
+        self.assertLessEqual(plan.peak_import, 3500)
+
+    def test_solar_self_consumption(self):
+        """Test with unit prices runs fill the solar forecast instead of importing."""
+        runs = [Run("a", 1000, 2), Run("b", 1000, 2)]
+        plan = plan_runs(runs, [1.0] * 7, solar=[0, 0, 1000, 1000, 1000, 1000, 0], cell_hours=0.5)
+
+        self.assertEqual(plan.starts, {"a": 2, "b": 4})
+        self.assertEqual((plan.cost, plan.grid_import), (0, 0))
+
+    def test_allowed_starts(self):
+        """Test runs only start in the cells they are allowed to."""
+        runs = [Run("a", 1000, 1, allowed=[True, True, False, False])]
+        self.assertEqual(plan_runs(runs, [0.3, 0.2, 0.1, 0.1]).starts, {"a": 1})
+
+    def test_local_search_improves_greedy(self):
+        """Test a run placed early moves when later runs take the solar it was using."""
+        runs = [Run("a", 1000, 1), Run("b", 1000, 2), Run("c", 500, 2)]
+        prices, solar = [3, 4, 4, 1], [500, 0, 1000, 500]
+        greedy = plan_runs(runs, prices, solar, time_budget=0)
+        plan = plan_runs(runs, prices, solar)
+
+        self.assertEqual(greedy.starts["a"], 2)
+        self.assertFalse(greedy.converged)
+        self.assertEqual(plan.starts, {"a": 3, "b": 2, "c": 0})
+        self.assertAlmostEqual(plan.cost, 3.5)
+
+    def test_close_to_exhaustive_search(self):
+        """Test plans respect the limit and cost no more than greedy, and usually match the optimum."""
+        rng = random.Random(5)
+        optimal = 0
+        for _ in range(100):
+            count = rng.randint(3, 6)
+            prices = [rng.randint(1, 5) for _ in range(count)]
+            solar = [rng.choice([0, 500, 1000]) for _ in range(count)]
+            runs = [Run(key, rng.choice([500, 1000, 2000]), rng.randint(1, 2)) for key in "abc"]
+            plan = plan_runs(runs, prices, solar, import_limit=2500)
+            greedy = plan_runs(runs, prices, solar, import_limit=2500, time_budget=0)
+
+            self.assertLessEqual(plan.peak_import, 2500)
+            if None in plan.starts.values():
+                continue
+            self.assertLessEqual(plan.cost, greedy.cost + 1e-9)
+            self.assertAlmostEqual(plan.cost, plan_cost(runs, plan.starts.values(), prices, solar))
+            costs = (
+                plan_cost(runs, starts, prices, solar, 2500)
+                for starts in itertools.product(*(range(count - run.cells + 1) for run in runs))
+            )
+            best = min(cost for cost in costs if cost is not None)
+            optimal += plan.cost <= best + 1e-9
+        self.assertGreater(optimal, 80)
+
+    def test_unplaceable_runs(self):
+        """Test runs longer than the horizon are left out and empty inputs give an empty plan."""
+        self.assertEqual(plan_runs([Run("a", 1000, 5)], [0.1, 0.2]).starts, {"a": None})
+        self.assertEqual(plan_runs([], []).starts, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
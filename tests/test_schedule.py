@@ -0,0 +1,149 @@
+"""Unit tests for schedule module."""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from schedule import MINUTES_PER_DAY, MINUTES_PER_WEEK, CompiledSchedule, compile_schedule, minute_of_week  # noqa: E402
+
+
+def at(day, clock):
+    """Minute of the week for a day (0 = Monday) and HH:MM."""
+    hours, minutes = map(int, clock.split(":"))
+    return day * MINUTES_PER_DAY + hours * 60 + minutes
+
+
+class TestCompileSchedule(unittest.TestCase):
+    """Test cases for compile_schedule."""
+
+    def test_legacy_window(self):
+        """Test a single window with inclusive start and end on the given days."""
+        schedule = compile_schedule({"start": "08:00", "end": "22:00", "days": [0, 1, 2, 3, 4]})
+
+        self.assertTrue(schedule.allows(at(0, "08:00")))
+        self.assertTrue(schedule.allows(at(4, "22:00")))
+        self.assertFalse(schedule.allows(at(0, "22:01")))
+        self.assertFalse(schedule.allows(at(0, "07:59")))
+        self.assertFalse(schedule.allows(at(5, "12:00")))
+
+    def test_days_only_and_unrestricted(self):
+        """Test whole-day schedules and schedules that restrict nothing."""
+        weekend = compile_schedule({"days": [5, 6]})
+        self.assertTrue(weekend.allows(at(5, "00:00")) and weekend.allows(at(6, "23:59")))
+        self.assertFalse(weekend.allows(at(4, "23:59")))
+
+        for schedule in (None, {}, {"start": None, "end": None, "days": []}):
+            self.assertIsNone(compile_schedule(schedule))
+
+    def test_overnight_and_week_wrap(self):
+        """Test an overnight window runs into the next day, Sunday's into Monday."""
+        schedule = compile_schedule({"start": "22:00", "end": "06:00", "days": [2, 6]})
+
+        self.assertTrue(schedule.allows(at(2, "23:30")))
+        self.assertTrue(schedule.allows(at(3, "06:00")))
+        self.assertFalse(schedule.allows(at(3, "06:01")))
+        self.assertTrue(schedule.allows(at(0, "03:00")))
+        self.assertFalse(schedule.allows(at(2, "03:00")))
+
+    def test_multiple_windows(self):
+        """Test several windows with different days are combined."""
+        schedule = compile_schedule(
+            {
+                "windows": [
+                    {"start": "06:00", "end": "08:00", "days": [0, 1, 2, 3, 4]},
+                    {"start": "17:00", "end": "19:00", "days": [0, 1, 2, 3, 4]},
+                    {"start": "10:00", "end": "16:00", "days": [5]},
+                ]
+            }
+        )
+
+        self.assertTrue(schedule.allows(at(1, "07:00")))
+        self.assertTrue(schedule.allows(at(1, "18:00")))
+        self.assertFalse(schedule.allows(at(1, "12:00")))
+        self.assertTrue(schedule.allows(at(5, "12:00")))
+        self.assertFalse(schedule.allows(at(5, "07:00")))
+
+    def test_invalid(self):
+        """Test malformed schedules raise ValueError."""
+        for schedule in (
+            "weekdays",
+            {"start": "8am", "end": "10:00"},
+            {"days": [7]},
+            {"days": ["mon"]},
+            {"windows": "always"},
+            {"windows": [{"start": "24:00", "end": "01:00"}]},
+        ):
+            with self.assertRaises(ValueError):
+                compile_schedule(schedule)
+
+    def test_stored_forms(self):
+        """Test single-digit hours and windows with one time, as older versions stored them."""
+        self.assertEqual(
+            compile_schedule({"start": "8:00", "end": "22:00"}), compile_schedule({"start": "08:00", "end": "22:00"})
+        )
+        for partial in ({"start": "", "end": "22:00"}, {"start": "08:00"}):
+            self.assertEqual(compile_schedule(partial), compile_schedule({"days": list(range(7))}))
+            with self.assertRaises(ValueError):
+                compile_schedule(partial, strict=True)
+        weekdays = compile_schedule({"start": "", "end": "22:00", "days": [0, 1, 2, 3, 4]})
+        self.assertEqual(weekdays, compile_schedule({"days": [0, 1, 2, 3, 4]}))
+
+    def test_equality(self):
+        """Test schedules compiled from equivalent forms compare equal."""
+        legacy = compile_schedule({"start": "08:00", "end": "09:00"})
+        windows = compile_schedule({"windows": [{"start": "08:00", "end": "09:00", "days": list(range(7))}]})
+        self.assertEqual(legacy, windows)
+        self.assertEqual(hash(legacy), hash(windows))
+
+
+class TestLookAhead(unittest.TestCase):
+    """Test cases for the next allowed window queries."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.schedule = compile_schedule(
+            {
+                "windows": [
+                    {"start": "22:00", "end": "06:00", "days": [6]},
+                    {"start": "12:00", "end": "13:00", "days": [2]},
+                ]
+            }
+        )
+
+    def test_window_at(self):
+        """Test the containing window is returned, otherwise the next one."""
+        self.assertEqual(self.schedule.window_at(at(0, "03:00")), (at(6, "22:00") - MINUTES_PER_WEEK, at(0, "06:01")))
+        self.assertEqual(self.schedule.window_at(at(1, "00:00")), (at(2, "12:00"), at(2, "13:01")))
+        self.assertEqual(self.schedule.window_at(at(6, "23:00")), (at(6, "22:00"), MINUTES_PER_WEEK + at(0, "06:01")))
+        self.assertIsNone(CompiledSchedule(bytes(MINUTES_PER_WEEK // 8)).window_at(0))
+
+    def test_minutes_until_allowed(self):
+        """Test the wait until the schedule next allows control."""
+        self.assertEqual(self.schedule.minutes_until_allowed(at(2, "12:30")), 0)
+        self.assertEqual(self.schedule.minutes_until_allowed(at(2, "11:00")), 60)
+        self.assertEqual(self.schedule.minutes_until_allowed(at(2, "14:00")), at(6, "22:00") - at(2, "14:00"))
+
+    def test_next_window(self):
+        """Test windows are reported as datetimes, wrapping into the next week."""
+        friday = datetime(2024, 11, 8, 9, 30, 15)
+        self.assertEqual(minute_of_week(friday), at(4, "09:30"))
+        self.assertEqual(
+            self.schedule.next_window(friday), (datetime(2024, 11, 10, 22, 0), datetime(2024, 11, 11, 6, 1))
+        )
+
+        monday_early = datetime(2024, 11, 11, 2, 0)
+        self.assertEqual(
+            self.schedule.next_window(monday_early), (datetime(2024, 11, 10, 22, 0), datetime(2024, 11, 11, 6, 1))
+        )
+        self.assertEqual(
+            self.schedule.next_window(datetime(2024, 11, 13, 13, 1)),
+            (datetime(2024, 11, 17, 22, 0), datetime(2024, 11, 18, 6, 1)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
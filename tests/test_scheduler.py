@@ -0,0 +1,138 @@
+"""Unit tests for scheduler module."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from scheduler import AdaptiveInterval, TriggerScheduler  # noqa: E402
+
+
+class TestTriggerScheduler(unittest.TestCase):
+    """Test cases for TriggerScheduler class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.scheduler = TriggerScheduler(debounce=0.05, max_interval=0.5, max_delay=0.2)
+        self.assertEqual(self.scheduler.wait()[0], "startup")
+
+    def test_burst_coalesced_into_one_cycle(self):
+        """Test a burst of changes runs a single cycle after the debounce window."""
+        start = time.monotonic()
+        for entity_id in ("sensor.solar", "sensor.cost", "sensor.solar"):
+            self.scheduler.notify(entity_id)
+
+        trigger, reasons = self.scheduler.wait()
+
+        self.assertEqual(trigger, "event")
+        self.assertEqual(reasons, {"sensor.solar", "sensor.cost"})
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_event_from_another_thread_wakes_waiter(self):
+        """Test notify() from another thread shortens the wait."""
+        timer = threading.Timer(0.05, self.scheduler.notify, args=("sensor.session",))
+        timer.start()
+        start = time.monotonic()
+
+        trigger, _ = self.scheduler.wait()
+
+        self.assertEqual(trigger, "event")
+        self.assertLess(time.monotonic() - start, 0.4)
+        timer.join()
+
+    def test_continuous_events_capped_by_max_delay(self):
+        """Test a steady stream of events still runs a cycle within max_delay."""
+        stop = threading.Event()
+
+        def chatter():
+            while not stop.is_set():
+                self.scheduler.notify("sensor.solar")
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=chatter)
+        thread.start()
+        start = time.monotonic()
+        try:
+            trigger, _ = self.scheduler.wait()
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertEqual(trigger, "event")
+        self.assertLess(time.monotonic() - start, 0.45)
+
+    def test_interval_safety_net(self):
+        """Test a cycle runs after max_interval without any events."""
+        start = time.monotonic()
+        trigger, reasons = self.scheduler.wait()
+
+        self.assertEqual(trigger, "interval")
+        self.assertEqual(reasons, set())
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+
+    def test_set_interval_shortens_periodic_wait(self):
+        """Test a shorter interval takes effect for the current wait, capped at max_interval."""
+        self.scheduler.set_interval(0.05)
+        start = time.monotonic()
+        self.assertEqual(self.scheduler.wait()[0], "interval")
+        self.assertLess(time.monotonic() - start, 0.3)
+
+        self.scheduler.set_interval(10)
+        self.assertEqual(self.scheduler.interval, 0.5)
+        self.assertLessEqual(self.scheduler.next_run_in(), 0.5)
+
+    def test_stop(self):
+        """Test stop() releases a waiting thread."""
+        threading.Timer(0.05, self.scheduler.stop).start()
+        self.assertIsNone(self.scheduler.wait())
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+    """Test cases for AdaptiveInterval class."""
+
+    SOLAR = (500, 1000)
+    COST = (0.25, 0.30)
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.cadence = AdaptiveInterval(min_interval=10, max_interval=300)
+
+    def test_stable_inputs_back_off(self):
+        """Test unchanging readings far from thresholds use the maximum interval."""
+        for now in (0, 30, 60):
+            interval = self.cadence.update({"solar": (2500, self.SOLAR), "cost": (0.15, self.COST)}, now=now)
+        self.assertEqual(interval, 300)
+        self.assertEqual(self.cadence.update({}), 300)
+
+    def test_near_threshold_uses_minimum(self):
+        """Test a reading within 10% of a threshold uses the minimum interval."""
+        self.assertEqual(self.cadence.update({"solar": (950, self.SOLAR)}, now=0), 10)
+        self.assertEqual(self.cadence.update({"cost": (0.29, self.COST)}, now=0), 10)
+
+    def test_fast_change_shortens_interval(self):
+        """Test the interval is a fraction of the time until the nearest threshold is reached."""
+        self.cadence.update({"solar": (2000, self.SOLAR)}, now=0)
+        # Falling 10 W/s, 800 W above 1000 W: ~80 s away, so half of that
+        interval = self.cadence.update({"solar": (1800, self.SOLAR)}, now=20)
+        self.assertAlmostEqual(interval, 40)
+
+        # A slow drift barely moves the cadence off the maximum
+        slow = AdaptiveInterval(min_interval=10, max_interval=300)
+        slow.update({"solar": (3000, self.SOLAR)}, now=0)
+        self.assertEqual(slow.update({"solar": (2990, self.SOLAR)}, now=60), 300)
+
+    def test_missing_readings_and_reset(self):
+        """Test None readings are ignored and reset() backs off."""
+        self.assertEqual(self.cadence.update({"battery_level": (None, (50, 80))}, now=0), 300)
+        self.cadence.update({"solar": (950, self.SOLAR)}, now=0)
+        self.assertEqual(self.cadence.reset(), 300)
+        self.assertEqual(self.cadence.interval, 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
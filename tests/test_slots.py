@@ -0,0 +1,114 @@
+"""Unit tests for slots module."""
+
+import os
+import random
+import sys
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from slots import SlotFinder, np, top_windows, window_means  # noqa: E402
+
+
+def naive_means(values, width):
+    """Window means computed the way the slot endpoints used to, for comparison."""
+    return [sum(values[i : i + width]) / len(values[i : i + width]) for i in range(len(values))]
+
+
+class TestWindowMeans(unittest.TestCase):
+    """Test cases for window_means."""
+
+    def test_matches_direct_sums(self):
+        """Test prefix-sum means equal direct sums, including windows cut short at the end."""
+        rng = random.Random(2)
+        values = [rng.uniform(0, 4000) for _ in range(50)]
+        for width in (1, 3, 7, 60):
+            for fast, slow in zip(window_means(values, width), naive_means(values, width)):
+                self.assertAlmostEqual(fast, slow, places=6)
+
+        self.assertEqual(window_means([1, 2, 3], 2), [1.5, 2.5, 3.0])
+
+
+class TestTopWindows(unittest.TestCase):
+    """Test cases for top_windows."""
+
+    def test_top_k_keeps_index_order_on_ties(self):
+        """Test the best windows come first and ties keep index order."""
+        means = [1, 5, 3, 5, 0]
+        self.assertEqual(top_windows(means, 3), [1, 3, 2])
+        self.assertEqual(top_windows(means, 2, highest=False), [4, 0])
+        self.assertEqual(top_windows(means, 0), [])
+
+    def test_separation(self):
+        """Test windows closer than the separation to a better one are skipped."""
+        means = [1, 2, 9, 8, 7, 1, 6]
+        self.assertEqual(top_windows(means, 3, separation=2), [2, 4, 6])
+        self.assertEqual(top_windows(means, 10, highest=False, separation=3), [0, 5])
+
+
+class TestSlotFinder(unittest.TestCase):
+    """Test cases for SlotFinder class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        rng = random.Random(9)
+        self.values = [rng.choice([0.1, 0.15, 0.2, 0.3]) for _ in range(300)]
+
+    def test_widths_are_cached(self):
+        """Test window means are computed once per width."""
+        finder = SlotFinder(self.values, use_numpy=False)
+        self.assertIs(finder.means(30), finder.means(30))
+        self.assertEqual(len(finder.means(30)), len(self.values) - 1)
+
+    def test_matches_exhaustive_ranking(self):
+        """Test the result equals sorting every window and keeping the top ten."""
+        rng = random.Random(5)
+        values = [rng.randint(0, 30) / 100 for _ in range(200)]
+        means = naive_means(values, 12)[:-1]
+        expected = sorted(range(len(means)), key=lambda i: means[i])[:10]
+
+        slots = SlotFinder(values).best(12, highest=False)
+        self.assertEqual([i for i, _ in slots], expected)
+
+    def test_non_overlapping(self):
+        """Test non-overlapping slots are at least one window apart."""
+        values = [0, 1, 5, 6, 5, 1, 0, 4, 4, 0]
+        starts = [i for i, _ in SlotFinder(values).best(3, non_overlapping=True)]
+
+        self.assertEqual(starts[0], 2)
+        self.assertTrue(all(abs(a - b) >= 3 for a in starts for b in starts if a != b))
+
+    def test_edge_cases(self):
+        """Test empty input, zero width and a single sample give no slots."""
+        self.assertEqual(SlotFinder([]).best(5), [])
+        self.assertEqual(SlotFinder([1, 2]).best(0), [])
+        self.assertEqual(SlotFinder([1]).best(5), [])
+
+    @unittest.skipIf(np is None, "NumPy not installed")
+    def test_full_windows(self):
+        """Test full windows only start where the whole width fits, with the same results either way."""
+        values = [3, 1, 2, 0]
+        for use_numpy in (False, True):
+            finder = SlotFinder(values, use_numpy=use_numpy, full_windows=True)
+            self.assertEqual(len(finder.means(2)), 3)
+            self.assertEqual([i for i, _ in finder.best(2, highest=False)], [2, 1, 0])
+            self.assertEqual(finder.best(1, count=1, highest=False), [(3, 0)])
+            self.assertEqual(finder.best(5), [])
+
+    def test_numpy_matches_pure_python(self):
+        """Test the vectorized path picks the same slots, ties included."""
+        pure = SlotFinder(self.values, use_numpy=False)
+        vectorized = SlotFinder(self.values, use_numpy=True)
+        for width in (1, 4, 30, 500):
+            for highest in (True, False):
+                for non_overlapping in (False, True):
+                    expected = pure.best(width, highest=highest, non_overlapping=non_overlapping)
+                    result = vectorized.best(width, highest=highest, non_overlapping=non_overlapping)
+                    self.assertEqual([i for i, _ in result], [i for i, _ in expected])
+                    for (_, a), (_, b) in zip(result, expected):
+                        self.assertAlmostEqual(a, b, places=9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Unit tests for sqlite_store module."""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from sqlite_store import SQLiteDeviceStore  # noqa: E402
+
+
+class TestSQLiteDeviceStore(unittest.TestCase):
+    """Test cases for SQLiteDeviceStore class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "smart_energy.db")
+        self.json_path = os.path.join(self.directory, "managed_devices.json")
+        self.store = SQLiteDeviceStore(self.db_path, json_path=self.json_path, flush_interval=0)
+
+    def tearDown(self):
+        """Clean up the temporary directory."""
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.store.close()
+        self.store = SQLiteDeviceStore(self.db_path, json_path=self.json_path, flush_interval=0)
+        return self.store.load()
+
+    def test_wal_mode(self):
+        """Test the database is opened in WAL mode."""
+        mode = self.store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_migrates_json_once(self):
+        """Test the JSON file is imported on first load only."""
+        self.store.close()
+        with open(self.json_path, "w") as f:
+            json.dump({"switch.a": {"priority": 1}, "switch.b": {"priority": 2}}, f)
+        os.remove(self.db_path)
+        self.store = SQLiteDeviceStore(self.db_path, json_path=self.json_path)
+
+        self.assertEqual(self.store.load(), {"switch.a": {"priority": 1}, "switch.b": {"priority": 2}})
+
+        self.store.mark_dirty("switch.b")
+        self.store.save({"switch.a": {"priority": 1}}, force=True)
+        self.assertEqual(self.reopen(), {"switch.a": {"priority": 1}})
+
+    def test_saving_one_device_writes_one_row(self):
+        """Test only dirty devices are written, and removed devices are deleted."""
+        devices = {f"switch.d{i}": {"priority": i} for i in range(50)}
+        self.store.load()
+        self.store.mark_dirty()
+        self.store.save(devices, force=True)
+
+        statements = []
+        self.store._conn.set_trace_callback(statements.append)
+        devices["switch.d7"]["priority"] = 1
+        self.store.mark_dirty("switch.d7")
+        self.store.save(devices)
+        self.store._conn.set_trace_callback(None)
+
+        writes = [sql for sql in statements if sql.startswith(("INSERT", "DELETE"))]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.reopen()["switch.d7"], {"priority": 1})
+
+    def test_whole_mapping_save_deletes_missing(self):
+        """Test a save without entity ids also removes devices no longer present."""
+        self.store.load()
+        self.store.mark_dirty()
+        self.store.save({"switch.a": {}, "switch.b": {}}, force=True)
+        self.store.mark_dirty()
+        self.store.save({"switch.b": {}}, force=True)
+
+        self.assertEqual(self.reopen(), {"switch.b": {}})
+
+    def test_decision_history(self):
+        """Test decisions are queried by entity and time, newest first."""
+        self.store.record_decisions([("switch.a", True, "solar_excess", True)], timestamp=1000)
+        self.store.record_decisions(
+            [("switch.a", False, "high_cost", True), ("switch.b", False, "high_cost", False)], timestamp=2000
+        )
+
+        decisions = self.store.get_decisions(entity_id="switch.a")
+        self.assertEqual([d["reason"] for d in decisions], ["high_cost", "solar_excess"])
+        self.assertEqual(decisions[1]["action"], "turned_on")
+
+        recent = self.store.get_decisions(since=1500)
+        self.assertEqual({d["entity_id"] for d in recent}, {"switch.a", "switch.b"})
+        self.assertFalse([d for d in recent if d["entity_id"] == "switch.b"][0]["success"])
+
+    def test_samples_and_retention(self):
+        """Test samples are returned in time order and old history is pruned."""
+        self.store.record_samples({"sensor.solar": 100, "sensor.cost": None}, timestamp=1000)
+        self.store.record_samples({"sensor.solar": 200}, timestamp=2000)
+        self.assertEqual([s["value"] for s in self.store.get_samples("sensor.solar")], [100, 200])
+        self.assertEqual(self.store.get_samples("sensor.cost"), [])
+        self.assertEqual(len(self.store.get_samples("sensor.solar", since=1500, until=2500)), 1)
+
+        self.store._last_prune = None
+        self.store.record_samples({"sensor.solar": 300}, timestamp=2000 + 31 * 86400)
+        self.assertEqual([s["value"] for s in self.store.get_samples("sensor.solar")], [300])
+
+    def test_indexes(self):
+        """Test history lookups by entity and time use an index."""
+        plan = self.store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM decisions WHERE entity_id = ? AND ts >= ?", ("switch.a", 0)
+        ).fetchall()
+        self.assertIn("decisions_entity_ts", str(plan))
+
+
+if __name__ == "__main__":
+    unittest.main()
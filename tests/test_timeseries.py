@@ -0,0 +1,98 @@
+"""Unit tests for timeseries module."""
+
+import os
+import sys
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from timeseries import RingBuffer, TimeSeriesStore  # noqa: E402
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Test cases for RingBuffer class."""
+
+    def test_wraps_at_capacity(self):
+        """Test the oldest samples are overwritten and order is kept."""
+        buffer = RingBuffer(5)
+        for i in range(8):
+            buffer.append(i, i * 10)
+
+        times, values = buffer.range()
+        self.assertEqual(list(times), [3, 4, 5, 6, 7])
+        self.assertEqual(list(values), [30, 40, 50, 60, 70])
+        self.assertEqual((buffer.first_time(), buffer.last_time()), (3, 7))
+        self.assertEqual(buffer.nbytes, 5 * 2 * 8)
+
+    def test_range_across_wrap(self):
+        """Test range bounds are found on both sides of the wrap point."""
+        buffer = RingBuffer(4)
+        for i in range(6):
+            buffer.append(i, i)
+
+        self.assertEqual(list(buffer.range(3, 4)[0]), [3, 4])
+        self.assertEqual(list(buffer.range(start=5)[0]), [5])
+        self.assertEqual(list(buffer.range(end=2.5)[0]), [2])
+        self.assertEqual(list(buffer.range(10, 20)[0]), [])
+
+    def test_rejects_out_of_order(self):
+        """Test samples older than the newest are dropped."""
+        buffer = RingBuffer(3)
+        self.assertTrue(buffer.append(10, 1))
+        self.assertFalse(buffer.append(5, 2))
+        self.assertEqual(len(buffer), 1)
+
+
+class TestTimeSeriesStore(unittest.TestCase):
+    """Test cases for TimeSeriesStore class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.store = TimeSeriesStore(raw_capacity=10, tiers=((60, 600), (900, 9000)))
+
+    def test_downsampling_tiers(self):
+        """Test samples are averaged into completed 1-minute and 15-minute buckets."""
+        for t in range(0, 1800, 10):
+            self.store.record("sensor.solar", t, timestamp=t)
+
+        resolution, times, values = self.store.query("sensor.solar", resolution=60)
+        self.assertEqual(resolution, 60)
+        self.assertEqual(len(times), 10)  # retention 600 s / 60 s
+        self.assertEqual(values[-1], sum(range(1680, 1740, 10)) / 6)
+
+        resolution, times, values = self.store.query("sensor.solar", resolution=900)
+        self.assertEqual((resolution, list(times)), (900, [0]))
+        self.assertEqual(values[0], sum(range(0, 900, 10)) / 90)
+
+    def test_query_picks_finest_covering_tier(self):
+        """Test older ranges fall back to coarser tiers."""
+        for t in range(0, 1800, 10):
+            self.store.record("sensor.solar", 1.0, timestamp=t)
+
+        self.assertEqual(self.store.query("sensor.solar", start=1750)[0], 0)
+        self.assertEqual(self.store.query("sensor.solar", start=1200)[0], 60)
+        self.assertEqual(self.store.query("sensor.solar", start=0)[0], 900)
+        self.assertIsNone(self.store.query("sensor.missing"))
+
+    def test_summary_and_stats(self):
+        """Test range summaries and memory accounting."""
+        self.store.record_many({"sensor.cost": 0.2, "sensor.none": None}, timestamp=1)
+        self.store.record_many({"sensor.cost": 0.4}, timestamp=2)
+
+        summary = self.store.summary("sensor.cost")
+        self.assertEqual((summary["count"], summary["min"], summary["max"]), (2, 0.2, 0.4))
+        self.assertAlmostEqual(summary["mean"], 0.3)
+        stats = self.store.get_stats()
+        self.assertEqual((stats["series"], stats["raw_samples"], stats["bytes"]), (1, 2, 2 * 2 * 8))
+
+    def test_series_limit(self):
+        """Test new signals beyond max_series are dropped."""
+        store = TimeSeriesStore(max_series=1)
+        store.record_many({"a": 1, "b": 2}, timestamp=1)
+        self.assertEqual(store.names(), ["a"])
+        self.assertEqual(store.get_stats()["dropped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Unit tests for ttl_cache module."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from ttl_cache import TTLCache  # noqa: E402
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test cases for TTLCache class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.cache = TTLCache(
+            max_entries=3,
+            default_ttl=5,
+            ttl_rules=[("sensor.*_power", 2), ("sensor.*tariff*", 300), ("sensor.live", 0)],
+        )
+
+    def test_hit_after_miss(self):
+        """Test a second read is served from the cache."""
+        loader = Mock(return_value={"state": "1"})
+
+        self.assertEqual(self.cache.get_or_load("sensor.a", loader), {"state": "1"})
+        self.assertEqual(self.cache.get_or_load("sensor.a", loader), {"state": "1"})
+
+        loader.assert_called_once()
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_ttl_rules(self):
+        """Test per-entity TTLs come from the first matching pattern."""
+        self.assertEqual(self.cache.ttl_for("sensor.house_power"), 2)
+        self.assertEqual(self.cache.ttl_for("sensor.octopus_tariff_rate"), 300)
+        self.assertEqual(self.cache.ttl_for("switch.heater"), 5)
+
+    @patch("ttl_cache.time.monotonic")
+    def test_entries_expire(self, mock_monotonic):
+        """Test entries are reloaded once their TTL has passed."""
+        loader = Mock(return_value={"state": "1"})
+        mock_monotonic.return_value = 0.0
+        self.cache.get_or_load("sensor.house_power", loader)
+        self.cache.get_or_load("sensor.octopus_tariff", loader)
+
+        mock_monotonic.return_value = 3.0
+        self.cache.get_or_load("sensor.house_power", loader)
+        self.cache.get_or_load("sensor.octopus_tariff", loader)
+
+        self.assertEqual(loader.call_count, 3)
+
+    def test_zero_ttl_bypasses_cache(self):
+        """Test a TTL of 0 disables caching."""
+        loader = Mock(return_value={"state": "1"})
+        self.cache.get_or_load("sensor.live", loader)
+        self.cache.get_or_load("sensor.live", loader)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_failed_loads_are_not_cached(self):
+        """Test None results and errors are not cached."""
+        self.assertIsNone(self.cache.get_or_load("sensor.a", Mock(return_value=None)))
+        with self.assertRaises(ConnectionError):
+            self.cache.get_or_load("sensor.a", Mock(side_effect=ConnectionError()))
+        self.assertEqual(self.cache.get_stats()["entries"], 0)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted when full."""
+        for key in ("a", "b", "c"):
+            self.cache.get_or_load(key, Mock(return_value=key))
+        self.cache.get_or_load("a", Mock())  # refresh "a"
+        self.cache.get_or_load("d", Mock(return_value="d"))
+
+        loader = Mock(return_value="b")
+        self.cache.get_or_load("b", loader)
+        loader.assert_called_once()
+        self.assertEqual(self.cache.get_stats()["evictions"], 2)
+
+    def test_concurrent_misses_coalesce(self):
+        """Test concurrent misses for one key trigger a single load."""
+        release = threading.Event()
+        loader = Mock(side_effect=lambda: release.wait(5) and {"state": "1"})
+        results = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_load("sensor.a", loader)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in range(500):
+            if self.cache.get_stats()["coalesced"] == 4:
+                break
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        loader.assert_called_once()
+        self.assertEqual(results, [{"state": "1"}] * 5)
+
+    def test_invalidate(self):
+        """Test invalidated keys are reloaded."""
+        loader = Mock(return_value={"state": "1"})
+        self.cache.get_or_load("sensor.a", loader)
+        self.cache.invalidate("sensor.a")
+        self.cache.get_or_load("sensor.a", loader)
+        self.assertEqual(loader.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()